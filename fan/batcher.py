@@ -0,0 +1,101 @@
+from typing import Any, Dict, List
+import threading
+import time
+import numpy
+
+import fan.globals
+from fan.inference_manager import run_inference_session
+from fan.typing import BatchInputs, BatchPayload
+
+BATCH_QUEUES : Dict[int, List[BatchPayload]] = {}
+BATCH_CALLERS : Dict[int, int] = {}
+THREAD_CONDITION : threading.Condition = threading.Condition()
+
+
+def has_dynamic_batch(inference_session : Any) -> bool:
+	return all(not isinstance(session_input.shape[0], int) for session_input in inference_session.get_inputs() if session_input.shape)
+
+
+def has_batch_peers() -> bool:
+	return fan.globals.execution_pool != 'process' and (fan.globals.execution_thread_count or 1) > 1
+
+
+def count_batch_rows(batch_inputs : BatchInputs) -> int:
+	return len(next(iter(batch_inputs.values())))
+
+
+def run_in_batches(inference_session : Any, batch_inputs : BatchInputs, batch_size : int) -> numpy.ndarray[Any, Any]:
+	row_total = count_batch_rows(batch_inputs)
+	if not has_dynamic_batch(inference_session):
+		batch_size = 1
+	batch_size = max(batch_size, 1)
+	batch_outputs = []
+	for start in range(0, row_total, batch_size):
+		chunk_inputs = { name: value[start:start + batch_size] for name, value in batch_inputs.items() }
+		batch_outputs.append(run_inference_session(inference_session, chunk_inputs)[0])
+	return numpy.concatenate(batch_outputs)
+
+
+def collect_and_run(inference_session : Any, batch_inputs : BatchInputs, batch_size : int, batch_latency : float) -> numpy.ndarray[Any, Any]:
+	if batch_size < 2 or batch_latency <= 0 or not has_dynamic_batch(inference_session) or not has_batch_peers():
+		return run_in_batches(inference_session, batch_inputs, batch_size)
+	session_key = id(inference_session)
+	with THREAD_CONDITION:
+		caller_total = BATCH_CALLERS.get(session_key, 0)
+		BATCH_CALLERS[session_key] = caller_total + 1
+	try:
+		if caller_total == 0:
+			return run_in_batches(inference_session, batch_inputs, batch_size)
+		return collect_batch(inference_session, batch_inputs, batch_size, batch_latency)
+	finally:
+		with THREAD_CONDITION:
+			BATCH_CALLERS[session_key] -= 1
+
+
+def collect_batch(inference_session : Any, batch_inputs : BatchInputs, batch_size : int, batch_latency : float) -> numpy.ndarray[Any, Any]:
+	session_key = id(inference_session)
+	payload : BatchPayload =\
+	{
+		'inputs': batch_inputs,
+		'outputs': None,
+		'exception': None,
+		'taken': False
+	}
+	deadline = time.monotonic() + batch_latency
+	with THREAD_CONDITION:
+		BATCH_QUEUES.setdefault(session_key, []).append(payload)
+		THREAD_CONDITION.notify_all()
+		while not payload['taken']:
+			batch_queue = BATCH_QUEUES.get(session_key)
+			if sum(count_batch_rows(batch_payload['inputs']) for batch_payload in batch_queue) >= batch_size or time.monotonic() >= deadline:
+				BATCH_QUEUES[session_key] = []
+				for batch_payload in batch_queue:
+					batch_payload['taken'] = True
+				break
+			THREAD_CONDITION.wait(max(deadline - time.monotonic(), 0))
+		else:
+			while payload['outputs'] is None and payload['exception'] is None:
+				THREAD_CONDITION.wait()
+			if payload['exception']:
+				raise payload['exception']
+			return payload['outputs']
+	run_batch_queue(inference_session, batch_queue, batch_size)
+	if payload['exception']:
+		raise payload['exception']
+	return payload['outputs']
+
+
+def run_batch_queue(inference_session : Any, batch_queue : List[BatchPayload], batch_size : int) -> None:
+	try:
+		batch_inputs = { name: numpy.concatenate([ batch_payload['inputs'][name] for batch_payload in batch_queue ]) for name in batch_queue[0]['inputs'] }
+		batch_outputs = run_in_batches(inference_session, batch_inputs, batch_size)
+		start = 0
+		for batch_payload in batch_queue:
+			end = start + count_batch_rows(batch_payload['inputs'])
+			batch_payload['outputs'] = batch_outputs[start:end]
+			start = end
+	except Exception as exception:
+		for batch_payload in batch_queue:
+			batch_payload['exception'] = exception
+	with THREAD_CONDITION:
+		THREAD_CONDITION.notify_all()
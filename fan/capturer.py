@@ -1,17 +1,40 @@
-from typing import Optional
+from typing import Iterator, List, Optional, Tuple
+from collections import OrderedDict
+import bisect
+import os
+import threading
 import cv2
+import numpy
 
-from fan.typing import Frame
+from fan.typing import Frame, VideoCapture
+from fan.ffmpeg import open_packets_reader, open_sample_frames_decoder
+from fan.vision import detect_video_resolution
+
+VIDEO_CAPTURES : 'OrderedDict[str, VideoCapture]' = OrderedDict()
+VIDEO_FRAMES : 'OrderedDict[Tuple[str, int], Frame]' = OrderedDict()
+VIDEO_CAPTURE_LIMIT = 2
+VIDEO_FRAME_LIMIT = 16
+VIDEO_GRAB_LIMIT = 48
+THREAD_LOCK : threading.RLock = threading.RLock()
 
 
 def get_video_frame(video_path : str, frame_number : int = 0) -> Optional[Frame]:
-	capture = cv2.VideoCapture(video_path)
-	frame_total = capture.get(cv2.CAP_PROP_FRAME_COUNT)
-	capture.set(cv2.CAP_PROP_POS_FRAMES, min(frame_total, frame_number - 1))
-	has_frame, frame = capture.read()
-	capture.release()
-	if has_frame:
-		return frame
+	if video_path and os.path.isfile(video_path):
+		video_key = create_video_key(video_path)
+		frame_index = max(frame_number - 1, 0)
+		prepare_keyframe_indices(video_path, video_key, frame_index)
+		with THREAD_LOCK:
+			if (video_key, frame_index) in VIDEO_FRAMES:
+				VIDEO_FRAMES.move_to_end((video_key, frame_index))
+				return VIDEO_FRAMES[(video_key, frame_index)].copy()
+			video_capture = get_video_capture(video_path, video_key)
+			if video_capture and frame_index < video_capture.get('frame_total'):
+				frame = read_video_capture(video_capture, frame_index)
+				if frame is not None:
+					VIDEO_FRAMES[(video_key, frame_index)] = frame
+					while len(VIDEO_FRAMES) > VIDEO_FRAME_LIMIT:
+						VIDEO_FRAMES.popitem(last = False)
+					return frame.copy()
 	return None
 
 
@@ -20,3 +43,109 @@ def get_video_frame_total(video_path : str) -> int:
 	video_frame_total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
 	capture.release()
 	return video_frame_total
+
+
+def read_video_frames(video_path : str, frame_start : int, frame_end : int, frame_step : int) -> Iterator[Tuple[int, Frame]]:
+	video_resolution = detect_video_resolution(video_path)
+	if video_resolution and frame_end > frame_start and frame_step > 0:
+		width, height = video_resolution
+		frame_size = width * height * 3
+		process = open_sample_frames_decoder(video_path, frame_start, frame_end, frame_step)
+		try:
+			for frame_number in range(frame_start, frame_end, frame_step):
+				frame_buffer = process.stdout.read(frame_size)
+				if len(frame_buffer) < frame_size:
+					break
+				yield frame_number, numpy.frombuffer(frame_buffer, dtype = numpy.uint8).reshape(height, width, 3)
+		finally:
+			process.kill()
+			process.stdout.close()
+			process.wait()
+
+
+def get_video_capture(video_path : str, video_key : str) -> Optional[VideoCapture]:
+	if video_key in VIDEO_CAPTURES:
+		VIDEO_CAPTURES.move_to_end(video_key)
+		return VIDEO_CAPTURES[video_key]
+	video_capture = cv2.VideoCapture(video_path)
+	if not video_capture.isOpened():
+		return None
+	VIDEO_CAPTURES[video_key] =\
+	{
+		'video_capture': video_capture,
+		'frame_total': int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+		'frame_position': 0,
+		'keyframe_indices': None
+	}
+	while len(VIDEO_CAPTURES) > VIDEO_CAPTURE_LIMIT:
+		_, expired_capture = VIDEO_CAPTURES.popitem(last = False)
+		expired_capture.get('video_capture').release()
+	return VIDEO_CAPTURES[video_key]
+
+
+def clear_video_captures() -> None:
+	with THREAD_LOCK:
+		for video_capture in VIDEO_CAPTURES.values():
+			video_capture.get('video_capture').release()
+		VIDEO_CAPTURES.clear()
+		VIDEO_FRAMES.clear()
+
+
+def read_video_capture(video_capture : VideoCapture, frame_index : int) -> Optional[Frame]:
+	capture = video_capture.get('video_capture')
+	frame_position = video_capture.get('frame_position')
+	if not should_grab_frames(video_capture, frame_index):
+		capture.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+		frame_position = frame_index
+	while frame_position < frame_index and capture.grab():
+		frame_position += 1
+	has_frame, frame = capture.read() if frame_position == frame_index else (False, None)
+	video_capture['frame_position'] = frame_index + 1 if has_frame else -1
+	if has_frame:
+		return frame
+	return None
+
+
+def prepare_keyframe_indices(video_path : str, video_key : str, frame_index : int) -> None:
+	with THREAD_LOCK:
+		video_capture = get_video_capture(video_path, video_key)
+		if not video_capture or video_capture.get('keyframe_indices') is not None or (video_key, frame_index) in VIDEO_FRAMES:
+			return
+		frame_position = video_capture.get('frame_position')
+		if frame_position < 0 or frame_index - frame_position <= 1:
+			return
+	keyframe_indices = detect_keyframe_indices(video_path)
+	with THREAD_LOCK:
+		video_capture['keyframe_indices'] = keyframe_indices
+
+
+def should_grab_frames(video_capture : VideoCapture, frame_index : int) -> bool:
+	frame_position = video_capture.get('frame_position')
+	if frame_position < 0 or frame_index < frame_position:
+		return False
+	if frame_index - frame_position <= 1:
+		return True
+	keyframe_indices = video_capture.get('keyframe_indices')
+	if keyframe_indices:
+		keyframe_index = keyframe_indices[max(bisect.bisect_right(keyframe_indices, frame_index) - 1, 0)]
+		return keyframe_index <= frame_position
+	return frame_index - frame_position <= VIDEO_GRAB_LIMIT
+
+
+def detect_keyframe_indices(video_path : str) -> List[int]:
+	packets = []
+	process = open_packets_reader(video_path)
+	for line in process.stdout.read().decode().splitlines():
+		if not line.startswith('#'):
+			packet = [ value.strip() for value in line.split(',') ]
+			if len(packet) > 5 and packet[2].lstrip('-').isdigit():
+				packet_flags = int(packet[6][2:], 16) if len(packet) > 6 and packet[6].startswith('F=') else 1
+				packets.append((int(packet[2]), packet_flags & 1))
+	process.wait()
+	packets.sort()
+	return [ packet_index for packet_index, (_, is_keyframe) in enumerate(packets) if is_keyframe ]
+
+
+def create_video_key(video_path : str) -> str:
+	video_stat = os.stat(video_path)
+	return os.path.abspath(video_path) + ':' + str(video_stat.st_mtime_ns) + ':' + str(video_stat.st_size)
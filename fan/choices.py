@@ -1,6 +1,6 @@
 from typing import List
 
-from fan.typing import FaceSelectorMode, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, FaceMaskType, FaceMaskRegion, TempFrameFormat, OutputVideoEncoder
+from fan.typing import FaceSelectorMode, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, FaceMaskType, FaceMaskRegion, TempFrameFormat, OutputVideoEncoder, VideoPipeline, ExecutionPool
 from fan.common_helper import create_range
 
 face_analyser_orders : List[FaceAnalyserOrder] = [ 'left-right', 'right-left', 'top-bottom', 'bottom-top', 'small-large', 'large-small', 'best-worst', 'worst-best' ]
@@ -12,12 +12,16 @@ face_selector_modes : List[FaceSelectorMode] = [ 'reference', 'one', 'many' ]
 face_mask_types : List[FaceMaskType] = [ 'box', 'occlusion', 'region' ]
 face_mask_regions : List[FaceMaskRegion] = [ 'skin', 'left-eyebrow', 'right-eyebrow', 'left-eye', 'right-eye', 'eye-glasses', 'nose', 'mouth', 'upper-lip', 'lower-lip' ]
 temp_frame_formats : List[TempFrameFormat] = [ 'jpg', 'png' ]
+video_pipelines : List[VideoPipeline] = [ 'disk', 'pipe' ]
+execution_pools : List[ExecutionPool] = [ 'thread', 'process' ]
 output_video_encoders : List[OutputVideoEncoder] = [ 'libx264', 'libx265', 'libvpx-vp9', 'h264_nvenc', 'hevc_nvenc' ]
 
 execution_thread_count_range : List[float] = create_range(1, 128, 1)
 execution_queue_count_range : List[float] = create_range(1, 32, 1)
 max_memory_range : List[float] = create_range(0, 128, 1)
 face_detector_score_range : List[float] = create_range(0.0, 1.0, 0.05)
+face_detector_batch_size_range : List[float] = create_range(1, 32, 1)
+face_tracker_interval_range : List[float] = create_range(1, 60, 1)
 face_mask_blur_range : List[float] = create_range(0.0, 1.0, 0.05)
 face_mask_padding_range : List[float] = create_range(0, 100, 1)
 reference_face_distance_range : List[float] = create_range(0.0, 1.5, 0.05)
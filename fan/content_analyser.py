@@ -3,15 +3,16 @@ from functools import lru_cache
 import threading
 import cv2
 import numpy
-import onnxruntime
 from tqdm import tqdm
 
 import fan.globals
-from fan import wording
+from fan import logger, wording
 from fan.typing import Frame, ModelValue
-from fan.vision import get_video_frame, count_video_frame_total, read_image, detect_fps
+from fan.capturer import read_video_frames
+from fan.vision import count_video_frame_total, read_image, detect_fps
 from fan.filesystem import resolve_relative_path
 from fan.download import conditional_download
+from fan.inference_manager import get_inference_session
 
 CONTENT_ANALYSER = None
 THREAD_LOCK : threading.Lock = threading.Lock()
@@ -34,7 +35,7 @@ def get_content_analyser() -> Any:
 	with THREAD_LOCK:
 		if CONTENT_ANALYSER is None:
 			model_path = MODELS.get('open_nsfw').get('path')
-			CONTENT_ANALYSER = onnxruntime.InferenceSession(model_path, providers = fan.globals.execution_providers)
+			CONTENT_ANALYSER = get_inference_session(model_path)
 	return CONTENT_ANALYSER
 
 
@@ -92,13 +93,18 @@ def analyse_video(video_path : str, start_frame : int, end_frame : int) -> bool:
 	frame_range = range(start_frame or 0, end_frame or video_frame_total)
 	rate = 0.0
 	counter = 0
+	frame_total = 0
 	with tqdm(total = len(frame_range), desc = wording.get('analysing'), unit = 'frame', ascii = ' =', disable = fan.globals.log_level in [ 'warn', 'error' ]) as progress:
-		for frame_number in frame_range:
-			if frame_number % int(fps) == 0:
-				frame = get_video_frame(video_path, frame_number)
-				if analyse_frame(frame):
-					counter += 1
+		frame_start = frame_range.start + (-frame_range.start % int(fps))
+		for frame_number, frame in read_video_frames(video_path, frame_start, frame_range.stop, int(fps)):
+			if analyse_frame(frame):
+				counter += 1
+			frame_total += 1
 			rate = counter * int(fps) / len(frame_range) * 100
-			progress.update()
+			progress.update(frame_number + 1 - frame_range.start - progress.n)
 			progress.set_postfix(rate = rate)
+		progress.update(len(frame_range) - progress.n)
+	if frame_start < frame_range.stop and frame_total == 0:
+		logger.error(wording.get('analysing_video_failed'), __name__.upper())
+		return True
 	return rate > MAX_RATE
@@ -14,11 +14,13 @@ from argparse import ArgumentParser, HelpFormatter
 import fan.choices
 import fan.globals
 from fan.face_analyser import get_one_face, get_average_face
-from fan.face_store import get_reference_faces, append_reference_face
-from fan.vision import get_video_frame, detect_fps, read_image, read_static_images
+from fan.face_store import get_reference_faces, append_reference_face, get_face_store_statistics
+from fan.inference_manager import log_inference_session_statistics
+from fan.capturer import get_video_frame
+from fan.vision import detect_fps, read_image, read_static_images
 from fan import face_analyser, face_masker, content_analyser, metadata, logger, wording
 from fan.content_analyser import analyse_image, analyse_video
-from fan.processors.frame.core import get_frame_processors_modules, load_frame_processor_module
+from fan.processors.frame.core import get_frame_processors_modules, load_frame_processor_module, multi_process_frames, multi_process_pipe, process_chain_frames
 from fan.common_helper import create_metavar
 from fan.execution_helper import encode_execution_providers, decode_execution_providers
 from fan.normalizer import normalize_output_path, normalize_padding
@@ -27,7 +29,6 @@ from fan.ffmpeg import extract_frames, compress_image, merge_video, restore_audi
 
 onnxruntime.set_default_logger_severity(3)
 warnings.filterwarnings('ignore', category = UserWarning, module = 'gradio')
-warnings.filterwarnings('ignore', category = UserWarning, module = 'torchvision')
 
 if platform.system().lower() == 'darwin':
 	ssl._create_default_https_context = ssl._create_unverified_context
@@ -52,6 +53,7 @@ def cli() -> None:
 	group_execution.add_argument('--execution-providers', help = wording.get('execution_providers_help').format(choices = ', '.join(execution_providers)), default = [ 'cpu' ], choices = execution_providers, nargs = '+', metavar = 'EXECUTION_PROVIDERS')
 	group_execution.add_argument('--execution-thread-count', help = wording.get('execution_thread_count_help'), type = int, default = 4, choices = fan.choices.execution_thread_count_range, metavar = create_metavar(fan.choices.execution_thread_count_range))
 	group_execution.add_argument('--execution-queue-count', help = wording.get('execution_queue_count_help'), type = int, default = 1, choices = fan.choices.execution_queue_count_range, metavar = create_metavar(fan.choices.execution_queue_count_range))
+	group_execution.add_argument('--execution-pool', help = wording.get('execution_pool_help'), default = 'thread', choices = fan.choices.execution_pools)
 	group_execution.add_argument('--max-memory', help = wording.get('max_memory_help'), type = int, choices = fan.choices.max_memory_range, metavar = create_metavar(fan.choices.max_memory_range))
 	# face analyser
 	group_face_analyser = program.add_argument_group('face analyser')
@@ -61,6 +63,10 @@ def cli() -> None:
 	group_face_analyser.add_argument('--face-detector-model', help = wording.get('face_detector_model_help'), default = 'retinaface', choices = fan.choices.face_detector_models)
 	group_face_analyser.add_argument('--face-detector-size', help = wording.get('face_detector_size_help'), default = '640x640', choices = fan.choices.face_detector_sizes)
 	group_face_analyser.add_argument('--face-detector-score', help = wording.get('face_detector_score_help'), type = float, default = 0.5, choices = fan.choices.face_detector_score_range, metavar = create_metavar(fan.choices.face_detector_score_range))
+	group_face_analyser.add_argument('--face-detector-batch-size', help = wording.get('face_detector_batch_size_help'), type = int, default = 1, choices = fan.choices.face_detector_batch_size_range, metavar = create_metavar(fan.choices.face_detector_batch_size_range))
+	group_face_analyser.add_argument('--face-detector-adaptive', help = wording.get('face_detector_adaptive_help'), action = 'store_true')
+	group_face_analyser.add_argument('--face-tracker-interval', help = wording.get('face_tracker_interval_help'), type = int, default = 1, choices = fan.choices.face_tracker_interval_range, metavar = create_metavar(fan.choices.face_tracker_interval_range))
+	group_face_analyser.add_argument('--face-analyser-cache', help = wording.get('face_analyser_cache_help'), action = 'store_true')
 	# face selector
 	group_face_selector = program.add_argument_group('face selector')
 	group_face_selector.add_argument('--face-selector-mode', help = wording.get('face_selector_mode_help'), default = 'reference', choices = fan.choices.face_selector_modes)
@@ -80,6 +86,7 @@ def cli() -> None:
 	group_frame_extraction.add_argument('--temp-frame-format', help = wording.get('temp_frame_format_help'), default = 'jpg', choices = fan.choices.temp_frame_formats)
 	group_frame_extraction.add_argument('--temp-frame-quality', help = wording.get('temp_frame_quality_help'), type = int, default = 100, choices = fan.choices.temp_frame_quality_range, metavar = create_metavar(fan.choices.temp_frame_quality_range))
 	group_frame_extraction.add_argument('--keep-temp', help = wording.get('keep_temp_help'), action = 'store_true')
+	group_frame_extraction.add_argument('--video-pipeline', help = wording.get('video_pipeline_help'), default = 'disk', choices = fan.choices.video_pipelines)
 	# output creation
 	group_output_creation = program.add_argument_group('output creation')
 	group_output_creation.add_argument('--output-image-quality', help = wording.get('output_image_quality_help'), type = int, default = 80, choices = fan.choices.output_image_quality_range, metavar = create_metavar(fan.choices.output_image_quality_range))
@@ -92,6 +99,7 @@ def cli() -> None:
 	program = ArgumentParser(parents = [ program ], formatter_class = program.formatter_class, add_help = True)
 	group_frame_processors = program.add_argument_group('frame processors')
 	group_frame_processors.add_argument('--frame-processors', help = wording.get('frame_processors_help').format(choices = ', '.join(available_frame_processors)), default = [ 'face_swapper' ], nargs = '+')
+	group_frame_processors.add_argument('--fuse-frame-processors', help = wording.get('fuse_frame_processors_help'), action = 'store_true')
 	for frame_processor in available_frame_processors:
 		frame_processor_module = load_frame_processor_module(frame_processor)
 		frame_processor_module.register_args(group_frame_processors)
@@ -115,6 +123,7 @@ def apply_args(program : ArgumentParser) -> None:
 	fan.globals.execution_providers = decode_execution_providers(args.execution_providers)
 	fan.globals.execution_thread_count = args.execution_thread_count
 	fan.globals.execution_queue_count = args.execution_queue_count
+	fan.globals.execution_pool = args.execution_pool
 	fan.globals.max_memory = args.max_memory
 	# face analyser
 	fan.globals.face_analyser_order = args.face_analyser_order
@@ -123,6 +132,10 @@ def apply_args(program : ArgumentParser) -> None:
 	fan.globals.face_detector_model = args.face_detector_model
 	fan.globals.face_detector_size = args.face_detector_size
 	fan.globals.face_detector_score = args.face_detector_score
+	fan.globals.face_detector_batch_size = args.face_detector_batch_size
+	fan.globals.face_detector_adaptive = args.face_detector_adaptive
+	fan.globals.face_tracker_interval = args.face_tracker_interval
+	fan.globals.face_analyser_cache = args.face_analyser_cache
 	# face selector
 	fan.globals.face_selector_mode = args.face_selector_mode
 	fan.globals.reference_face_position = args.reference_face_position
@@ -139,6 +152,7 @@ def apply_args(program : ArgumentParser) -> None:
 	fan.globals.temp_frame_format = args.temp_frame_format
 	fan.globals.temp_frame_quality = args.temp_frame_quality
 	fan.globals.keep_temp = args.keep_temp
+	fan.globals.video_pipeline = args.video_pipeline
 	# output creation
 	fan.globals.output_image_quality = args.output_image_quality
 	fan.globals.output_video_encoder = args.output_video_encoder
@@ -148,6 +162,7 @@ def apply_args(program : ArgumentParser) -> None:
 	# frame processors
 	available_frame_processors = list_module_names('fan/processors/frame/modules')
 	fan.globals.frame_processors = args.frame_processors
+	fan.globals.fuse_frame_processors = args.fuse_frame_processors
 	for frame_processor in available_frame_processors:
 		frame_processor_module = load_frame_processor_module(frame_processor)
 		frame_processor_module.apply_args(program)
@@ -262,24 +277,40 @@ def process_video() -> None:
 	# create temp
 	logger.info(wording.get('creating_temp'), __name__.upper())
 	create_temp(fan.globals.target_path)
-	# extract frames
-	logger.info(wording.get('extracting_frames_fps').format(fps = fps), __name__.upper())
-	extract_frames(fan.globals.target_path, fps)
-	# process frame
-	temp_frame_paths = get_temp_frame_paths(fan.globals.target_path)
-	if temp_frame_paths:
+	if fan.globals.video_pipeline == 'pipe':
+		# pipe frames
+		logger.info(wording.get('piping_frames_fps').format(fps = fps), __name__.upper())
+		if not multi_process_pipe(fan.globals.source_paths, fan.globals.target_path, fps):
+			logger.error(wording.get('piping_frames_failed'), __name__.upper())
+			return
 		for frame_processor_module in get_frame_processors_modules(fan.globals.frame_processors):
-			logger.info(wording.get('processing'), frame_processor_module.NAME)
-			frame_processor_module.process_video(fan.globals.source_paths, temp_frame_paths)
 			frame_processor_module.post_process()
 	else:
-		logger.error(wording.get('temp_frames_not_found'), __name__.upper())
-		return
-	# merge video
-	logger.info(wording.get('merging_video_fps').format(fps = fps), __name__.upper())
-	if not merge_video(fan.globals.target_path, fps):
-		logger.error(wording.get('merging_video_failed'), __name__.upper())
-		return
+		# extract frames
+		logger.info(wording.get('extracting_frames_fps').format(fps = fps), __name__.upper())
+		extract_frames(fan.globals.target_path, fps)
+		# process frame
+		temp_frame_paths = get_temp_frame_paths(fan.globals.target_path)
+		if temp_frame_paths and fan.globals.fuse_frame_processors:
+			logger.info(wording.get('processing'), __name__.upper())
+			multi_process_frames(fan.globals.source_paths, temp_frame_paths, process_chain_frames)
+			for frame_processor_module in get_frame_processors_modules(fan.globals.frame_processors):
+				frame_processor_module.post_process()
+		elif temp_frame_paths:
+			for frame_processor_module in get_frame_processors_modules(fan.globals.frame_processors):
+				logger.info(wording.get('processing'), frame_processor_module.NAME)
+				frame_processor_module.process_video(fan.globals.source_paths, temp_frame_paths)
+				frame_processor_module.post_process()
+		else:
+			logger.error(wording.get('temp_frames_not_found'), __name__.upper())
+			return
+		# merge video
+		logger.info(wording.get('merging_video_fps').format(fps = fps), __name__.upper())
+		if not merge_video(fan.globals.target_path, fps):
+			logger.error(wording.get('merging_video_failed'), __name__.upper())
+			return
+	logger.debug(wording.get('face_store_statistics').format(**get_face_store_statistics()), __name__.upper())
+	log_inference_session_statistics()
 	# handle audio
 	if fan.globals.skip_audio:
 		logger.info(wording.get('skipping_audio'), __name__.upper())
@@ -1,20 +1,38 @@
-from typing import Any, Optional, List, Tuple
+from typing import Any, Dict, Optional, List, Tuple
+from collections import OrderedDict
 import threading
 import cv2
 import numpy
-import onnxruntime
 
 import fan.globals
+from fan.processors.frame import globals as frame_processors_globals
 from fan.download import conditional_download
+from fan.inference_manager import get_inference_session, run_inference_session
 from fan.face_store import get_static_faces, set_static_faces
-from fan.face_helper import warp_face, create_static_anchors, distance_to_kps, distance_to_bbox, apply_nms
+from fan.face_cache import get_cached_faces, set_cached_faces, clear_face_cache
+from fan.batcher import has_dynamic_batch, run_in_batches
+from fan.face_helper import warp_face, create_static_anchors, distance_to_kps, distance_to_bbox, apply_nms, transform_bbox
 from fan.filesystem import resolve_relative_path
-from fan.typing import Frame, Face, FaceSet, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, ModelSet, Bbox, Kps, Score, Embedding
+from fan.typing import Frame, Face, FaceSet, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, ModelSet, Bbox, Bboxes, Kps, Kpss, Score, Scores, Embedding, Resolution, ReferenceIndex, TrackerState, AdaptiveState
 from fan.vision import resize_frame_dimension
 
 FACE_ANALYSER = None
-THREAD_SEMAPHORE : threading.Semaphore = threading.Semaphore()
 THREAD_LOCK : threading.Lock = threading.Lock()
+YUNET_LOCK : threading.Lock = threading.Lock()
+VIDEO_FRAME : threading.local = threading.local()
+FRAME_STATE_LOCK : threading.Lock = threading.Lock()
+FRAME_STATE_LIMIT = 256
+TRACKER_STATES : Dict[Tuple[str, int], TrackerState] = {}
+TRACKER_FRAME_SIZE = 640
+TRACKER_SCENE_THRESHOLD = 30.0
+ADAPTIVE_STATES : Dict[Tuple[str, int], AdaptiveState] = {}
+REFERENCE_INDEXES : 'OrderedDict[Tuple[Tuple[str, ...], Tuple[int, ...]], ReferenceIndex]' = OrderedDict()
+REFERENCE_INDEX_LIMIT = 4
+ADAPTIVE_COARSE_SIZE = 320
+ADAPTIVE_FACE_SIZE = 48
+ADAPTIVE_CANDIDATE_RATIO = 0.5
+ADAPTIVE_CANDIDATE_LIMIT = 8
+ADAPTIVE_REGION_SCALE = 1.5
 MODELS : ModelSet =\
 {
 	'face_detector_retinaface':
@@ -56,16 +74,16 @@ def get_face_analyser() -> Any:
 	with THREAD_LOCK:
 		if FACE_ANALYSER is None:
 			if fan.globals.face_detector_model == 'retinaface':
-				face_detector = onnxruntime.InferenceSession(MODELS.get('face_detector_retinaface').get('path'), providers = fan.globals.execution_providers)
+				face_detector = get_inference_session(MODELS.get('face_detector_retinaface').get('path'))
 			if fan.globals.face_detector_model == 'yunet':
 				face_detector = cv2.FaceDetectorYN.create(MODELS.get('face_detector_yunet').get('path'), '', (0, 0))
 			if fan.globals.face_recognizer_model == 'arcface_blendswap':
-				face_recognizer = onnxruntime.InferenceSession(MODELS.get('face_recognizer_arcface_blendswap').get('path'), providers = fan.globals.execution_providers)
+				face_recognizer = get_inference_session(MODELS.get('face_recognizer_arcface_blendswap').get('path'))
 			if fan.globals.face_recognizer_model == 'arcface_inswapper':
-				face_recognizer = onnxruntime.InferenceSession(MODELS.get('face_recognizer_arcface_inswapper').get('path'), providers = fan.globals.execution_providers)
+				face_recognizer = get_inference_session(MODELS.get('face_recognizer_arcface_inswapper').get('path'))
 			if fan.globals.face_recognizer_model == 'arcface_simswap':
-				face_recognizer = onnxruntime.InferenceSession(MODELS.get('face_recognizer_arcface_simswap').get('path'), providers = fan.globals.execution_providers)
-			gender_age = onnxruntime.InferenceSession(MODELS.get('gender_age').get('path'), providers = fan.globals.execution_providers)
+				face_recognizer = get_inference_session(MODELS.get('face_recognizer_arcface_simswap').get('path'))
+			gender_age = get_inference_session(MODELS.get('gender_age').get('path'))
 			FACE_ANALYSER =\
 			{
 				'face_detector': face_detector,
@@ -79,6 +97,11 @@ def clear_face_analyser() -> Any:
 	global FACE_ANALYSER
 
 	FACE_ANALYSER = None
+	REFERENCE_INDEXES.clear()
+	with FRAME_STATE_LOCK:
+		TRACKER_STATES.clear()
+		ADAPTIVE_STATES.clear()
+	clear_face_cache()
 
 
 def pre_check() -> bool:
@@ -97,136 +120,290 @@ def pre_check() -> bool:
 
 
 def extract_faces(frame: Frame) -> List[Face]:
-	face_detector_width, face_detector_height = map(int, fan.globals.face_detector_size.split('x'))
+	if fan.globals.face_detector_adaptive:
+		return extract_adaptive_faces(frame)
+	return extract_faces_by_size(frame, get_face_detector_resolution(), fan.globals.face_detector_score)
+
+
+def extract_faces_by_size(frame : Frame, face_detector_resolution : Resolution, face_detector_score : float) -> List[Face]:
+	face_detector_width, face_detector_height = face_detector_resolution
 	frame_height, frame_width, _ = frame.shape
 	temp_frame = resize_frame_dimension(frame, face_detector_width, face_detector_height)
 	temp_frame_height, temp_frame_width, _ = temp_frame.shape
 	ratio_height = frame_height / temp_frame_height
 	ratio_width = frame_width / temp_frame_width
 	if fan.globals.face_detector_model == 'retinaface':
-		bbox_list, kps_list, score_list = detect_with_retinaface(temp_frame, temp_frame_height, temp_frame_width, face_detector_height, face_detector_width, ratio_height, ratio_width)
-		return create_faces(frame, bbox_list, kps_list, score_list)
+		bboxes, kps, scores = detect_with_retinaface(temp_frame, temp_frame_height, temp_frame_width, face_detector_height, face_detector_width, ratio_height, ratio_width, face_detector_score)
+		return create_faces(frame, bboxes, kps, scores)
 	elif fan.globals.face_detector_model == 'yunet':
-		bbox_list, kps_list, score_list = detect_with_yunet(temp_frame, temp_frame_height, temp_frame_width, ratio_height, ratio_width)
-		return create_faces(frame, bbox_list, kps_list, score_list)
+		bboxes, kps, scores = detect_with_yunet(temp_frame, temp_frame_height, temp_frame_width, ratio_height, ratio_width, face_detector_score)
+		return create_faces(frame, bboxes, kps, scores)
 	return []
 
 
-def detect_with_retinaface(temp_frame : Frame, temp_frame_height : int, temp_frame_width : int, face_detector_height : int, face_detector_width : int, ratio_height : float, ratio_width : float) -> Tuple[List[Bbox], List[Kps], List[Score]]:
+def get_face_detector_resolution() -> Resolution:
+	face_detector_width, face_detector_height = map(int, fan.globals.face_detector_size.split('x'))
+	return face_detector_width, face_detector_height
+
+
+def extract_adaptive_faces(frame : Frame) -> List[Face]:
+	face_detector_resolution = get_adaptive_detector_resolution(frame)
+	faces = extract_faces_by_size(frame, face_detector_resolution, fan.globals.face_detector_score * ADAPTIVE_CANDIDATE_RATIO)
+	adaptive_faces = [ face for face in faces if face.score >= fan.globals.face_detector_score ]
+	candidate_faces = [ face for face in faces if face.score < fan.globals.face_detector_score ]
+	for face in candidate_faces[:ADAPTIVE_CANDIDATE_LIMIT]:
+		adaptive_faces.extend(refine_faces(frame, face))
+	if len(adaptive_faces) < 2:
+		return adaptive_faces
+	keep_indices = apply_nms(numpy.stack([ face.bbox for face in adaptive_faces ]), numpy.array([ face.score for face in adaptive_faces ]), 0.4)
+	return [ adaptive_faces[index] for index in keep_indices ]
+
+
+def get_adaptive_detector_resolution(frame : Frame) -> Resolution:
+	frame_number = get_video_frame_number(frame)
+	if frame_number is None:
+		return choose_adaptive_detector_resolution(frame)
+	thumbnail = cv2.cvtColor(cv2.resize(frame, (64, 64), interpolation = cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+	_, adaptive_state = find_frame_state(ADAPTIVE_STATES, frame_number, fan.globals.face_tracker_interval or 1)
+	if adaptive_state is None or is_scene_change(adaptive_state.get('thumbnail'), thumbnail):
+		face_detector_resolution = choose_adaptive_detector_resolution(frame)
+	else:
+		face_detector_resolution = adaptive_state.get('face_detector_resolution')
+	set_frame_state(ADAPTIVE_STATES, frame_number,
+	{
+		'thumbnail': thumbnail,
+		'face_detector_resolution': face_detector_resolution
+	})
+	return face_detector_resolution
+
+
+def choose_adaptive_detector_resolution(frame : Frame) -> Resolution:
+	face_detector_width, face_detector_height = get_face_detector_resolution()
+	coarse_width = min(ADAPTIVE_COARSE_SIZE, face_detector_width)
+	coarse_height = min(ADAPTIVE_COARSE_SIZE, face_detector_height)
+	frame_height, frame_width, _ = frame.shape
+	coarse_scale = min(coarse_width / frame_width, coarse_height / frame_height, 1)
+	coarse_faces = extract_faces_by_size(frame, (coarse_width, coarse_height), fan.globals.face_detector_score)
+	if coarse_faces and all((face.bbox[3] - face.bbox[1]) * coarse_scale >= ADAPTIVE_FACE_SIZE for face in coarse_faces):
+		return coarse_width, coarse_height
+	return face_detector_width, face_detector_height
+
+
+def refine_faces(frame : Frame, face : Face) -> List[Face]:
+	face_detector_width, face_detector_height = get_face_detector_resolution()
+	frame_height, frame_width, _ = frame.shape
+	center_x, center_y = (face.bbox[:2] + face.bbox[2:]) / 2
+	region_size = max(face.bbox[2] - face.bbox[0], face.bbox[3] - face.bbox[1]) * ADAPTIVE_REGION_SCALE
+	x1, y1 = max(int(center_x - region_size), 0), max(int(center_y - region_size), 0)
+	x2, y2 = min(int(center_x + region_size), frame_width), min(int(center_y + region_size), frame_height)
+	if x2 - x1 < 2 or y2 - y1 < 2:
+		return []
+	region_scale = min(face_detector_width / (x2 - x1), face_detector_height / (y2 - y1))
+	region_frame = cv2.resize(frame[y1:y2, x1:x2], (max(int((x2 - x1) * region_scale), 1), max(int((y2 - y1) * region_scale), 1)))
+	refined_faces = []
+	for refined_face in extract_faces_by_size(region_frame, (face_detector_width, face_detector_height), fan.globals.face_detector_score):
+		refined_faces.append(refined_face._replace(
+			bbox = refined_face.bbox / region_scale + [ x1, y1, x1, y1 ],
+			kps = refined_face.kps / region_scale + [ x1, y1 ]
+		))
+	return refined_faces
+
+
+def detect_with_retinaface(temp_frame : Frame, temp_frame_height : int, temp_frame_width : int, face_detector_height : int, face_detector_width : int, ratio_height : float, ratio_width : float, face_detector_score : float) -> Tuple[Bboxes, Kpss, Scores]:
 	face_detector = get_face_analyser().get('face_detector')
-	bbox_list = []
-	kps_list = []
-	score_list = []
+	prepare_frame = prepare_retinaface_frame(temp_frame, face_detector_height, face_detector_width)
+	detections = run_inference_session(face_detector,
+	{
+		face_detector.get_inputs()[0].name: prepare_frame
+	})
+	return decode_retinaface(detections, face_detector_height, face_detector_width, ratio_height, ratio_width, face_detector_score)
+
+
+def prepare_retinaface_frame(temp_frame : Frame, face_detector_height : int, face_detector_width : int) -> Frame:
+	temp_frame_height, temp_frame_width, _ = temp_frame.shape
+	prepare_frame = numpy.zeros((face_detector_height, face_detector_width, 3), dtype = numpy.float32)
+	prepare_frame[:temp_frame_height, :temp_frame_width, :] = temp_frame
+	prepare_frame = (prepare_frame - 127.5) / 128.0
+	return numpy.expand_dims(prepare_frame.transpose(2, 0, 1), axis = 0)
+
+
+def decode_retinaface(detections : List[numpy.ndarray[Any, Any]], face_detector_height : int, face_detector_width : int, ratio_height : float, ratio_width : float, face_detector_score : float) -> Tuple[Bboxes, Kpss, Scores]:
 	feature_strides = [ 8, 16, 32 ]
 	feature_map_channel = 3
 	anchor_total = 2
-	prepare_frame = numpy.zeros((face_detector_height, face_detector_width, 3))
-	prepare_frame[:temp_frame_height, :temp_frame_width, :] = temp_frame
-	temp_frame = (prepare_frame - 127.5) / 128.0
-	temp_frame = numpy.expand_dims(temp_frame.transpose(2, 0, 1), axis = 0).astype(numpy.float32)
-	with THREAD_SEMAPHORE:
-		detections = face_detector.run(None,
-		{
-			face_detector.get_inputs()[0].name: temp_frame
-		})
-	for index, feature_stride in enumerate(feature_strides):
-		keep_indices = numpy.where(detections[index] >= fan.globals.face_detector_score)[0]
-		if keep_indices.any():
-			stride_height = face_detector_height // feature_stride
-			stride_width = face_detector_width // feature_stride
-			anchors = create_static_anchors(feature_stride, anchor_total, stride_height, stride_width)
-			bbox_raw = (detections[index + feature_map_channel] * feature_stride)
-			kps_raw = detections[index + feature_map_channel * 2] * feature_stride
-			for bbox in distance_to_bbox(anchors, bbox_raw)[keep_indices]:
-				bbox_list.append(numpy.array(
-				[
-					bbox[0] * ratio_width,
-					bbox[1] * ratio_height,
-					bbox[2] * ratio_width,
-					bbox[3] * ratio_height
-				]))
-			for kps in distance_to_kps(anchors, kps_raw)[keep_indices]:
-				kps_list.append(kps * [ ratio_width, ratio_height ])
-			for score in detections[index][keep_indices]:
-				score_list.append(score[0])
-	return bbox_list, kps_list, score_list
-
-
-def detect_with_yunet(temp_frame : Frame, temp_frame_height : int, temp_frame_width : int, ratio_height : float, ratio_width : float) -> Tuple[List[Bbox], List[Kps], List[Score]]:
-	face_detector = get_face_analyser().get('face_detector')
-	face_detector.setInputSize((temp_frame_width, temp_frame_height))
-	face_detector.setScoreThreshold(fan.globals.face_detector_score)
 	bbox_list = []
 	kps_list = []
 	score_list = []
-	with THREAD_SEMAPHORE:
+	for index, feature_stride in enumerate(feature_strides):
+		keep_mask = detections[index][:, 0] >= face_detector_score
+		stride_height = face_detector_height // feature_stride
+		stride_width = face_detector_width // feature_stride
+		anchors = create_static_anchors(feature_stride, anchor_total, stride_height, stride_width)[keep_mask]
+		bbox_list.append(distance_to_bbox(anchors, detections[index + feature_map_channel][keep_mask] * feature_stride))
+		kps_list.append(distance_to_kps(anchors, detections[index + feature_map_channel * 2][keep_mask] * feature_stride))
+		score_list.append(detections[index][keep_mask, 0])
+	ratio = numpy.array([ ratio_width, ratio_height ])
+	bboxes : Bboxes = (numpy.concatenate(bbox_list).reshape(-1, 2, 2) * ratio).reshape(-1, 4)
+	kps : Kpss = numpy.concatenate(kps_list) * ratio
+	scores : Scores = numpy.concatenate(score_list)
+	return bboxes, kps, scores
+
+
+def extract_many_faces(frames : List[Frame]) -> List[List[Face]]:
+	face_detector = get_face_analyser().get('face_detector')
+	if fan.globals.face_detector_model != 'retinaface' or len(frames) < 2 or not has_batched_detections(face_detector):
+		return [ extract_faces(frame) for frame in frames ]
+	face_detector_width, face_detector_height = get_face_detector_resolution()
+	prepare_frames = []
+	ratios = []
+	for frame in frames:
+		frame_height, frame_width, _ = frame.shape
+		temp_frame = resize_frame_dimension(frame, face_detector_width, face_detector_height)
+		temp_frame_height, temp_frame_width, _ = temp_frame.shape
+		prepare_frames.append(prepare_retinaface_frame(temp_frame, face_detector_height, face_detector_width))
+		ratios.append((frame_height / temp_frame_height, frame_width / temp_frame_width))
+	detections = run_inference_session(face_detector,
+	{
+		face_detector.get_inputs()[0].name: numpy.concatenate(prepare_frames)
+	})
+	bboxes = []
+	kps = []
+	scores = []
+	frame_indices = []
+	for frame_index, (ratio_height, ratio_width) in enumerate(ratios):
+		frame_bboxes, frame_kps, frame_scores = decode_retinaface([ detection[frame_index] for detection in detections ], face_detector_height, face_detector_width, ratio_height, ratio_width, fan.globals.face_detector_score)
+		bboxes.append(frame_bboxes)
+		kps.append(frame_kps)
+		scores.append(frame_scores)
+		frame_indices.append(numpy.full(len(frame_scores), frame_index))
+	return create_many_faces(len(frames), numpy.concatenate(bboxes), numpy.concatenate(kps), numpy.concatenate(scores), numpy.concatenate(frame_indices))
+
+
+def has_batched_detections(face_detector : Any) -> bool:
+	return has_dynamic_batch(face_detector) and len(face_detector.get_outputs()[0].shape) == 3
+
+
+def prime_many_faces(frames : List[Frame], frame_numbers : List[Optional[int]]) -> None:
+	if fan.globals.face_detector_adaptive or fan.globals.face_tracker_interval and fan.globals.face_tracker_interval > 1:
+		return
+	missing_frames = []
+	for frame, frame_number in zip(frames, frame_numbers):
+		if get_static_faces(frame) is None:
+			cached_faces = get_cached_faces(frame_number) if frame_number is not None else None
+			if cached_faces is None:
+				missing_frames.append(frame)
+			else:
+				set_static_faces(frame, cached_faces)
+	if len(missing_frames) > 1:
+		for frame, faces in zip(missing_frames, extract_many_faces(missing_frames)):
+			set_static_faces(frame, faces)
+
+
+def detect_with_yunet(temp_frame : Frame, temp_frame_height : int, temp_frame_width : int, ratio_height : float, ratio_width : float, face_detector_score : float) -> Tuple[Bboxes, Kpss, Scores]:
+	face_detector = get_face_analyser().get('face_detector')
+	with YUNET_LOCK:
+		face_detector.setInputSize((temp_frame_width, temp_frame_height))
+		face_detector.setScoreThreshold(face_detector_score)
 		_, detections = face_detector.detect(temp_frame)
-	if detections.any():
-		for detection in detections:
-			bbox_list.append(numpy.array(
-			[
-				detection[0] * ratio_width,
-				detection[1] * ratio_height,
-				(detection[0] + detection[2]) * ratio_width,
-				(detection[1] + detection[3]) * ratio_height
-			]))
-			kps_list.append(detection[4:14].reshape((5, 2)) * [ ratio_width, ratio_height])
-			score_list.append(detection[14])
-	return bbox_list, kps_list, score_list
-
-
-def create_faces(frame : Frame, bbox_list : List[Bbox], kps_list : List[Kps], score_list : List[Score]) -> List[Face]:
-	faces = []
+	if detections is None:
+		detections = numpy.zeros((0, 15), dtype = numpy.float32)
+	ratio = numpy.array([ ratio_width, ratio_height ])
+	bboxes = numpy.concatenate([ detections[:, 0:2], detections[:, 0:2] + detections[:, 2:4] ], axis = 1).reshape(-1, 2, 2) * ratio
+	kps = detections[:, 4:14].reshape(-1, 5, 2) * ratio
+	return bboxes.reshape(-1, 4), kps, detections[:, 14]
+
+
+def create_faces(frame : Frame, bboxes : Bboxes, kps : Kpss, scores : Scores) -> List[Face]:
+	return create_many_faces(1, bboxes, kps, scores, None)[0]
+
+
+def create_many_faces(frame_total : int, bboxes : Bboxes, kps : Kpss, scores : Scores, frame_indices : Optional[numpy.ndarray[Any, Any]]) -> List[List[Face]]:
+	many_faces : List[List[Face]] = [ [] for _ in range(frame_total) ]
 	if fan.globals.face_detector_score > 0:
-		sort_indices = numpy.argsort(-numpy.array(score_list))
-		bbox_list = [ bbox_list[index] for index in sort_indices ]
-		kps_list = [ kps_list[index] for index in sort_indices ]
-		score_list = [ score_list[index] for index in sort_indices ]
-		keep_indices = apply_nms(bbox_list, 0.4)
+		keep_indices = apply_nms(bboxes, scores, 0.4, frame_indices)
 		for index in keep_indices:
-			bbox = bbox_list[index]
-			kps = kps_list[index]
-			score = score_list[index]
-			embedding, normed_embedding = calc_embedding(frame, kps)
-			gender, age = detect_gender_age(frame, kps)
-			faces.append(Face(
-				bbox = bbox,
-				kps = kps,
-				score = score,
-				embedding = embedding,
-				normed_embedding = normed_embedding,
-				gender = gender,
-				age = age
+			frame_index = frame_indices[index] if frame_indices is not None else 0
+			many_faces[frame_index].append(Face(
+				bbox = bboxes[index],
+				kps = kps[index],
+				score = scores[index],
+				embedding = None,
+				normed_embedding = None,
+				gender = None,
+				age = None
 			))
+	return many_faces
+
+
+def complete_faces(frame : Frame, faces : List[Face], embedding_required : bool, gender_age_required : bool) -> List[Face]:
+	faces = list(faces)
+	if embedding_required:
+		missing_indices = [ index for index, face in enumerate(faces) if face.embedding is None ]
+		if missing_indices:
+			embedding_list, normed_embedding_list = calc_embeddings(frame, [ faces[index].kps for index in missing_indices ])
+			for index, embedding, normed_embedding in zip(missing_indices, embedding_list, normed_embedding_list):
+				faces[index] = faces[index]._replace(embedding = embedding, normed_embedding = normed_embedding)
+	if gender_age_required:
+		missing_indices = [ index for index, face in enumerate(faces) if face.gender is None ]
+		if missing_indices:
+			gender_list, age_list = detect_genders_ages(frame, [ faces[index].kps for index in missing_indices ])
+			for index, gender, age in zip(missing_indices, gender_list, age_list):
+				faces[index] = faces[index]._replace(gender = gender, age = age)
 	return faces
 
 
+def is_embedding_required() -> bool:
+	return fan.globals.face_selector_mode == 'reference' or bool(frame_processors_globals.face_swapper_mapping)
+
+
+def is_gender_age_required() -> bool:
+	return fan.globals.face_analyser_age is not None or fan.globals.face_analyser_gender is not None
+
+
 def calc_embedding(temp_frame : Frame, kps : Kps) -> Tuple[Embedding, Embedding]:
+	embedding_list, normed_embedding_list = calc_embeddings(temp_frame, [ kps ])
+	return embedding_list[0], normed_embedding_list[0]
+
+
+def calc_embeddings(temp_frame : Frame, kps_list : List[Kps]) -> Tuple[List[Embedding], List[Embedding]]:
+	if not kps_list:
+		return [], []
 	face_recognizer = get_face_analyser().get('face_recognizer')
-	crop_frame, matrix = warp_face(temp_frame, kps, 'arcface_112_v2', (112, 112))
-	crop_frame = crop_frame.astype(numpy.float32) / 127.5 - 1
-	crop_frame = crop_frame[:, :, ::-1].transpose(2, 0, 1)
-	crop_frame = numpy.expand_dims(crop_frame, axis = 0)
-	embedding = face_recognizer.run(None,
+	crop_frames = []
+	for kps in kps_list:
+		crop_frame, matrix = warp_face(temp_frame, kps, 'arcface_112_v2', (112, 112))
+		crop_frames.append(crop_frame)
+	crop_batch : numpy.ndarray[Any, Any] = numpy.stack(crop_frames).astype(numpy.float32) / 127.5 - 1
+	crop_batch = crop_batch[:, :, :, ::-1].transpose(0, 3, 1, 2)
+	embedding_batch = run_in_batches(face_recognizer,
 	{
-		face_recognizer.get_inputs()[0].name: crop_frame
-	})[0]
-	embedding = embedding.ravel()
-	normed_embedding = embedding / numpy.linalg.norm(embedding)
-	return embedding, normed_embedding
+		face_recognizer.get_inputs()[0].name: numpy.ascontiguousarray(crop_batch)
+	}, len(kps_list)).reshape(len(kps_list), -1)
+	normed_embedding_batch = embedding_batch / numpy.linalg.norm(embedding_batch, axis = 1, keepdims = True)
+	return list(embedding_batch), list(normed_embedding_batch)
 
 
 def detect_gender_age(frame : Frame, kps : Kps) -> Tuple[int, int]:
+	gender_list, age_list = detect_genders_ages(frame, [ kps ])
+	return gender_list[0], age_list[0]
+
+
+def detect_genders_ages(frame : Frame, kps_list : List[Kps]) -> Tuple[List[int], List[int]]:
+	if not kps_list:
+		return [], []
 	gender_age = get_face_analyser().get('gender_age')
-	crop_frame, affine_matrix = warp_face(frame, kps, 'arcface_112_v2', (96, 96))
-	crop_frame = numpy.expand_dims(crop_frame, axis = 0).transpose(0, 3, 1, 2).astype(numpy.float32)
-	prediction = gender_age.run(None,
+	crop_frames = []
+	for kps in kps_list:
+		crop_frame, affine_matrix = warp_face(frame, kps, 'arcface_112_v2', (96, 96))
+		crop_frames.append(crop_frame)
+	crop_batch : numpy.ndarray[Any, Any] = numpy.stack(crop_frames).transpose(0, 3, 1, 2).astype(numpy.float32)
+	predictions = run_in_batches(gender_age,
 	{
-		gender_age.get_inputs()[0].name: crop_frame
-	})[0][0]
-	gender = int(numpy.argmax(prediction[:2]))
-	age = int(numpy.round(prediction[2] * 100))
-	return gender, age
+		gender_age.get_inputs()[0].name: crop_batch
+	}, len(kps_list))
+	gender_list = [ int(numpy.argmax(prediction[:2])) for prediction in predictions ]
+	age_list = [ int(numpy.round(prediction[2] * 100)) for prediction in predictions ]
+	return gender_list, age_list
 
 
 def get_one_face(frame : Frame, position : int = 0) -> Optional[Face]:
@@ -247,6 +424,7 @@ def get_average_face(frames : List[Frame], position : int = 0) -> Optional[Face]
 	for frame in frames:
 		face = get_one_face(frame, position)
 		if face:
+			face = complete_faces(frame, [ face ], True, False)[0]
 			faces.append(face)
 			embedding_list.append(face.embedding)
 			normed_embedding_list.append(face.normed_embedding)
@@ -265,12 +443,23 @@ def get_average_face(frames : List[Frame], position : int = 0) -> Optional[Face]
 
 def get_many_faces(frame : Frame) -> List[Face]:
 	try:
+		target_frame_number = get_target_frame_number(frame)
 		faces_cache = get_static_faces(frame)
-		if faces_cache:
-			faces = faces_cache
+		if faces_cache is not None:
+			faces = complete_faces(frame, faces_cache, is_embedding_required(), is_gender_age_required())
+			if not is_same_faces(faces, faces_cache):
+				set_static_faces(frame, faces)
 		else:
-			faces = extract_faces(frame)
+			faces = get_cached_faces(target_frame_number) if target_frame_number is not None else None
+			frame_number = get_video_frame_number(frame)
+			if faces is None and frame_number is not None and fan.globals.face_tracker_interval and fan.globals.face_tracker_interval > 1:
+				faces = extract_tracked_faces(frame, frame_number)
+			if faces is None:
+				faces = extract_faces(frame)
+			faces = complete_faces(frame, faces, is_embedding_required(), is_gender_age_required())
 			set_static_faces(frame, faces)
+		if target_frame_number is not None:
+			set_cached_faces(target_frame_number, faces)
 		if fan.globals.face_analyser_order:
 			faces = sort_by_order(faces, fan.globals.face_analyser_order)
 		if fan.globals.face_analyser_age:
@@ -282,22 +471,142 @@ def get_many_faces(frame : Frame) -> List[Face]:
 		return []
 
 
+def extract_tracked_faces(frame : Frame, frame_number : int) -> List[Face]:
+	tracker_frame = cv2.cvtColor(resize_frame_dimension(frame, TRACKER_FRAME_SIZE, TRACKER_FRAME_SIZE), cv2.COLOR_BGR2GRAY)
+	frame_distance, tracker_state = find_frame_state(TRACKER_STATES, frame_number, fan.globals.face_tracker_interval - 1)
+	faces = track_faces(frame, tracker_frame, tracker_state, frame_distance)
+	if faces is None:
+		faces = extract_faces(frame)
+		frame_counter = 1
+	else:
+		frame_counter = tracker_state.get('frame_counter') + frame_distance
+	set_frame_state(TRACKER_STATES, frame_number,
+	{
+		'tracker_frame': tracker_frame,
+		'faces': faces,
+		'frame_counter': frame_counter
+	})
+	return faces
+
+
+def track_faces(frame : Frame, tracker_frame : Frame, tracker_state : Optional[TrackerState], frame_distance : int) -> Optional[List[Face]]:
+	if tracker_state is None or tracker_state.get('tracker_frame').shape != tracker_frame.shape:
+		return None
+	previous_tracker_frame = tracker_state.get('tracker_frame')
+	previous_faces = tracker_state.get('faces')
+	if tracker_state.get('frame_counter') + frame_distance > fan.globals.face_tracker_interval or is_scene_change(previous_tracker_frame, tracker_frame):
+		return None
+	if not previous_faces:
+		return []
+	tracker_scale = tracker_frame.shape[1] / frame.shape[1]
+	previous_points = numpy.concatenate([ face.kps for face in previous_faces ]).reshape(-1, 1, 2).astype(numpy.float32) * tracker_scale
+	points, status, _ = cv2.calcOpticalFlowPyrLK(previous_tracker_frame, tracker_frame, previous_points, None, winSize = (21, 21), maxLevel = 3)
+	if points is None or not status.all():
+		return None
+	kps_list = points.reshape(-1, 5, 2) / tracker_scale
+	faces = []
+	for face, kps in zip(previous_faces, kps_list):
+		kps = kps.astype(face.kps.dtype)
+		faces.append(face._replace(bbox = transform_bbox(face.bbox, face.kps, kps), kps = kps))
+	return faces
+
+
+def set_video_frame(frame : Optional[Frame], frame_number : Optional[int], is_target_frame : bool = True) -> None:
+	VIDEO_FRAME.frame = frame
+	VIDEO_FRAME.frame_number = frame_number
+	VIDEO_FRAME.is_target_frame = is_target_frame
+
+
+def get_video_frame_number(frame : Frame) -> Optional[int]:
+	if frame is not None and getattr(VIDEO_FRAME, 'frame', None) is frame:
+		return VIDEO_FRAME.frame_number
+	return None
+
+
+def get_target_frame_number(frame : Frame) -> Optional[int]:
+	if getattr(VIDEO_FRAME, 'is_target_frame', False):
+		return get_video_frame_number(frame)
+	return None
+
+
+def find_frame_state(frame_states : Dict[Tuple[str, int], Any], frame_number : int, frame_distance_limit : int) -> Tuple[int, Any]:
+	with FRAME_STATE_LOCK:
+		for frame_distance in range(1, frame_distance_limit + 1):
+			frame_state = frame_states.get((fan.globals.target_path, frame_number - frame_distance))
+			if frame_state is not None:
+				return frame_distance, frame_state
+	return 0, None
+
+
+def set_frame_state(frame_states : Dict[Tuple[str, int], Any], frame_number : int, frame_state : Any) -> None:
+	with FRAME_STATE_LOCK:
+		frame_states[(fan.globals.target_path, frame_number)] = frame_state
+		while len(frame_states) > FRAME_STATE_LIMIT:
+			del frame_states[next(iter(frame_states))]
+
+
+def is_scene_change(previous_tracker_frame : Frame, tracker_frame : Frame) -> bool:
+	previous_thumbnail = cv2.resize(previous_tracker_frame, (64, 64), interpolation = cv2.INTER_AREA)
+	thumbnail = cv2.resize(tracker_frame, (64, 64), interpolation = cv2.INTER_AREA)
+	return cv2.absdiff(previous_thumbnail, thumbnail).mean() > TRACKER_SCENE_THRESHOLD
+
+
 def find_similar_faces(frame : Frame, reference_faces : FaceSet, face_distance : float) -> List[Face]:
-	similar_faces : List[Face] = []
 	many_faces = get_many_faces(frame)
 
-	if reference_faces:
-		for reference_set in reference_faces:
-			if not similar_faces:
-				for reference_face in reference_faces[reference_set]:
-					for face in many_faces:
-						if compare_faces(face, reference_face, face_distance):
-							similar_faces.append(face)
-	return similar_faces
+	if reference_faces and many_faces:
+		reference_index = get_reference_index(reference_faces)
+		face_matches = calc_face_distances(many_faces, reference_index) < face_distance
+		for set_index in range(len(reference_index.get('set_names'))):
+			set_matches = face_matches[:, reference_index.get('set_indices') == set_index]
+			face_indices = numpy.flatnonzero(set_matches.any(axis = 1))
+			if face_indices.size:
+				first_reference_indices = set_matches[face_indices].argmax(axis = 1)
+				return [ many_faces[index] for index in face_indices[numpy.lexsort((face_indices, first_reference_indices))] ]
+	return []
+
+
+def get_reference_index(reference_faces : FaceSet) -> ReferenceIndex:
+	index_faces = []
+	set_indices = []
+	for set_index, reference_set in enumerate(reference_faces):
+		for reference_face in reference_faces[reference_set]:
+			if reference_face.normed_embedding is not None:
+				index_faces.append(reference_face)
+				set_indices.append(set_index)
+	reference_key = (tuple(reference_faces), tuple(id(reference_face) for reference_face in index_faces))
+	with THREAD_LOCK:
+		reference_index = REFERENCE_INDEXES.get(reference_key)
+		if reference_index is None or not is_same_faces(reference_index.get('faces'), index_faces):
+			reference_index =\
+			{
+				'faces': index_faces,
+				'set_names': list(reference_faces),
+				'set_indices': numpy.array(set_indices, dtype = numpy.int64),
+				'embeddings': numpy.stack([ reference_face.normed_embedding for reference_face in index_faces ]).astype(numpy.float32) if index_faces else numpy.zeros((0, 0), dtype = numpy.float32)
+			}
+			REFERENCE_INDEXES[reference_key] = reference_index
+		REFERENCE_INDEXES.move_to_end(reference_key)
+		while len(REFERENCE_INDEXES) > REFERENCE_INDEX_LIMIT:
+			REFERENCE_INDEXES.popitem(last = False)
+		return reference_index
+
+
+def is_same_faces(faces : List[Face], other_faces : List[Face]) -> bool:
+	return len(faces) == len(other_faces) and all(face is other_face for face, other_face in zip(faces, other_faces))
+
+
+def calc_face_distances(faces : List[Face], reference_index : ReferenceIndex) -> numpy.ndarray[Any, Any]:
+	face_distances = numpy.full((len(faces), len(reference_index.get('faces'))), numpy.inf, dtype = numpy.float32)
+	face_indices = [ index for index, face in enumerate(faces) if face.normed_embedding is not None ]
+	if face_indices and reference_index.get('faces'):
+		face_embeddings = numpy.stack([ faces[index].normed_embedding for index in face_indices ]).astype(numpy.float32)
+		face_distances[face_indices] = 1 - face_embeddings @ reference_index.get('embeddings').T
+	return face_distances
 
 
 def compare_faces(face : Face, reference_face : Face, face_distance : float) -> bool:
-	if hasattr(face, 'normed_embedding') and hasattr(reference_face, 'normed_embedding'):
+	if face.normed_embedding is not None and reference_face.normed_embedding is not None:
 		current_face_distance = 1 - numpy.dot(face.normed_embedding, reference_face.normed_embedding)
 		return current_face_distance < face_distance
 	return False
@@ -1,29 +1,221 @@
-from typing import Optional, List, Dict
+from typing import Any, Dict, List, Optional, Tuple
 import hashlib
+import multiprocessing
+import os
+import threading
+import time
+import numpy
 
-from fan.typing import Frame, Face
+import fan.globals
+from fan.filesystem import is_file, resolve_relative_path
+from fan.typing import Face, FaceCache, FaceCacheShard
 
-FACES_CACHE : Dict[str, List[Face]] = {}
+FACE_CACHE : Optional[FaceCache] = None
+THREAD_LOCK : threading.Lock = threading.Lock()
+FACE_CACHE_DIRECTORY_PATH = resolve_relative_path('../.assets/face_cache')
+FACE_CACHE_FLUSH_TOTAL = 1024
+FACE_CACHE_SHARD_LIMIT = 16
+FACE_CACHE_EMBEDDING_SIZE = 512
+FRAME_DTYPE = numpy.dtype(
+[
+	('frame_number', numpy.int64),
+	('face_start', numpy.int64),
+	('face_total', numpy.int64)
+])
+FACE_DTYPE = numpy.dtype(
+[
+	('bbox', numpy.float64, (4,)),
+	('kps', numpy.float64, (5, 2)),
+	('score', numpy.float64),
+	('embedding', numpy.float32, (FACE_CACHE_EMBEDDING_SIZE,)),
+	('normed_embedding', numpy.float32, (FACE_CACHE_EMBEDDING_SIZE,)),
+	('has_embedding', numpy.bool_),
+	('gender', numpy.int8),
+	('age', numpy.int16)
+])
 
 
-def get_faces_cache(frame : Frame) -> Optional[List[Face]]:
-	frame_hash = create_frame_hash(frame)
-	if frame_hash in FACES_CACHE:
-		return FACES_CACHE[frame_hash]
+def get_face_cache() -> Optional[FaceCache]:
+	global FACE_CACHE
+
+	if not fan.globals.face_analyser_cache or not is_file(fan.globals.target_path):
+		return None
+	face_cache_key = create_face_cache_key(fan.globals.target_path)
+	with THREAD_LOCK:
+		if FACE_CACHE is None or FACE_CACHE.get('key') != face_cache_key:
+			if FACE_CACHE:
+				write_pending_faces(FACE_CACHE)
+			FACE_CACHE = open_face_cache(face_cache_key)
+	return FACE_CACHE
+
+
+def flush_face_cache() -> None:
+	with THREAD_LOCK:
+		if FACE_CACHE:
+			write_pending_faces(FACE_CACHE)
+			if multiprocessing.parent_process() is None and len(FACE_CACHE.get('shards')) > FACE_CACHE_SHARD_LIMIT:
+				merge_face_cache(FACE_CACHE)
+
+
+def clear_face_cache() -> None:
+	global FACE_CACHE
+
+	flush_face_cache()
+	FACE_CACHE = None
+
+
+def create_face_cache_key(target_path : str) -> str:
+	target_stat = os.stat(target_path)
+	face_cache_key =\
+	[
+		os.path.abspath(target_path),
+		target_stat.st_mtime_ns,
+		target_stat.st_size,
+		fan.globals.face_detector_model,
+		fan.globals.face_detector_size,
+		fan.globals.face_detector_score,
+		fan.globals.face_detector_adaptive,
+		fan.globals.face_tracker_interval,
+		fan.globals.face_recognizer_model,
+		fan.globals.video_pipeline,
+		fan.globals.keep_fps,
+		fan.globals.trim_frame_start
+	]
+	if fan.globals.video_pipeline != 'pipe':
+		face_cache_key.extend([ fan.globals.temp_frame_format, fan.globals.temp_frame_quality ])
+	return hashlib.sha1(str(face_cache_key).encode()).hexdigest()
+
+
+def get_face_cache_directory_path(face_cache_key : str) -> str:
+	return os.path.join(FACE_CACHE_DIRECTORY_PATH, face_cache_key)
+
+
+def open_face_cache(face_cache_key : str) -> FaceCache:
+	face_cache : FaceCache =\
+	{
+		'key': face_cache_key,
+		'shards': [],
+		'shard_paths': [],
+		'frames': {},
+		'completions': {},
+		'pending': {}
+	}
+	face_cache_directory_path = get_face_cache_directory_path(face_cache_key)
+	if os.path.isdir(face_cache_directory_path):
+		for shard_name in sorted(os.listdir(face_cache_directory_path)):
+			if shard_name.endswith('.frames.npy'):
+				shard_path = os.path.join(face_cache_directory_path, shard_name[:-len('.frames.npy')])
+				try:
+					append_face_cache_shard(face_cache, shard_path, read_face_cache_shard(shard_path))
+				except (OSError, ValueError):
+					continue
+	return face_cache
+
+
+def append_face_cache_shard(face_cache : FaceCache, shard_path : str, face_cache_shard : FaceCacheShard) -> None:
+	shard_index = len(face_cache.get('shards'))
+	frames, faces = face_cache_shard
+	face_cache.get('shards').append(face_cache_shard)
+	face_cache.get('shard_paths').append(shard_path)
+	for frame_number, face_start, face_total in frames.tolist():
+		frame_faces = faces[face_start:face_start + face_total]
+		face_cache.get('frames')[frame_number] = (shard_index, face_start, face_total)
+		face_cache.get('completions')[frame_number] = (bool(frame_faces['has_embedding'].all()), bool((frame_faces['gender'] >= 0).all()))
+
+
+def read_face_cache_shard(shard_path : str) -> FaceCacheShard:
+	frames = numpy.load(shard_path + '.frames.npy', mmap_mode = 'r')
+	faces = numpy.load(shard_path + '.faces.npy', mmap_mode = 'r')
+	return frames, faces
+
+
+def write_face_cache_shard(shard_path : str, entries : Dict[int, List[Face]]) -> None:
+	frames = numpy.zeros(len(entries), dtype = FRAME_DTYPE)
+	faces = numpy.zeros(sum(len(entry_faces) for entry_faces in entries.values()), dtype = FACE_DTYPE)
+	face_start = 0
+	for frame_index, (frame_number, entry_faces) in enumerate(entries.items()):
+		frames[frame_index] = (frame_number, face_start, len(entry_faces))
+		for face_index, face in enumerate(entry_faces, face_start):
+			faces[face_index] = pack_face(face)
+		face_start += len(entry_faces)
+	os.makedirs(os.path.dirname(shard_path), exist_ok = True)
+	for shard_suffix, shard_array in [ ('.faces.npy', faces), ('.frames.npy', frames) ]:
+		temp_shard_path = shard_path + shard_suffix + '.tmp'
+		with open(temp_shard_path, 'wb') as shard_file:
+			numpy.save(shard_file, shard_array)
+		os.replace(temp_shard_path, shard_path + shard_suffix)
+
+
+def write_pending_faces(face_cache : FaceCache) -> None:
+	if face_cache.get('pending'):
+		shard_name = str(time.time_ns()) + '-' + str(os.getpid()) + '-' + str(threading.get_ident())
+		shard_path = os.path.join(get_face_cache_directory_path(face_cache.get('key')), shard_name)
+		write_face_cache_shard(shard_path, face_cache.get('pending'))
+		face_cache['pending'] = {}
+		append_face_cache_shard(face_cache, shard_path, read_face_cache_shard(shard_path))
+
+
+def merge_face_cache(face_cache : FaceCache) -> None:
+	shard_paths = list(face_cache.get('shard_paths'))
+	entries = { frame_number: read_cached_faces(face_cache, frame_number) for frame_number in face_cache.get('frames') }
+	face_cache['pending'] = entries
+	write_pending_faces(face_cache)
+	for shard_path in shard_paths:
+		for shard_suffix in [ '.frames.npy', '.faces.npy' ]:
+			try:
+				os.remove(shard_path + shard_suffix)
+			except OSError:
+				continue
+	face_cache.update(open_face_cache(face_cache.get('key')))
+
+
+def get_cached_faces(frame_number : int) -> Optional[List[Face]]:
+	face_cache = get_face_cache()
+	if face_cache:
+		with THREAD_LOCK:
+			if frame_number in face_cache.get('pending') or frame_number in face_cache.get('frames'):
+				return read_cached_faces(face_cache, frame_number)
 	return None
 
 
-def set_faces_cache(frame : Frame, faces : List[Face]) -> None:
-	frame_hash = create_frame_hash(frame)
-	if frame_hash:
-		FACES_CACHE[frame_hash] = faces
+def set_cached_faces(frame_number : int, faces : List[Face]) -> None:
+	face_cache = get_face_cache()
+	if face_cache:
+		completion = (all(face.embedding is not None for face in faces), all(face.gender is not None for face in faces))
+		with THREAD_LOCK:
+			cached_completion = face_cache.get('completions').get(frame_number)
+			if cached_completion is None or completion[0] > cached_completion[0] or completion[1] > cached_completion[1]:
+				face_cache.get('pending')[frame_number] = list(faces)
+				face_cache.get('completions')[frame_number] = completion
+				if len(face_cache.get('pending')) >= FACE_CACHE_FLUSH_TOTAL:
+					write_pending_faces(face_cache)
+
 
+def read_cached_faces(face_cache : FaceCache, frame_number : int) -> List[Face]:
+	if frame_number in face_cache.get('pending'):
+		return list(face_cache.get('pending')[frame_number])
+	shard_index, face_start, face_total = face_cache.get('frames')[frame_number]
+	_, faces = face_cache.get('shards')[shard_index]
+	return [ unpack_face(face) for face in faces[face_start:face_start + face_total] ]
 
-def clear_faces_cache() -> None:
-	global FACES_CACHE
 
-	FACES_CACHE = {}
+def pack_face(face : Face) -> Tuple[numpy.ndarray[Any, Any], numpy.ndarray[Any, Any], float, numpy.ndarray[Any, Any], numpy.ndarray[Any, Any], bool, int, int]:
+	has_embedding = face.embedding is not None and face.embedding.size == FACE_CACHE_EMBEDDING_SIZE
+	embedding = face.embedding if has_embedding else numpy.zeros(FACE_CACHE_EMBEDDING_SIZE)
+	normed_embedding = face.normed_embedding if has_embedding else numpy.zeros(FACE_CACHE_EMBEDDING_SIZE)
+	gender = face.gender if face.gender is not None else -1
+	age = face.age if face.age is not None else -1
+	return face.bbox, face.kps, face.score, embedding, normed_embedding, has_embedding, gender, age
 
 
-def create_frame_hash(frame : Frame) -> Optional[str]:
-	return hashlib.sha256(frame.tobytes()).hexdigest() if frame is not None else None
+def unpack_face(face : numpy.void) -> Face:
+	has_embedding = bool(face['has_embedding'])
+	return Face(
+		bbox = numpy.array(face['bbox']),
+		kps = numpy.array(face['kps']),
+		score = face['score'],
+		embedding = numpy.array(face['embedding']) if has_embedding else None,
+		normed_embedding = numpy.array(face['normed_embedding']) if has_embedding else None,
+		gender = int(face['gender']) if face['gender'] >= 0 else None,
+		age = int(face['age']) if face['age'] >= 0 else None
+	)
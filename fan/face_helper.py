@@ -1,10 +1,10 @@
-from typing import Any, Dict, Tuple, List
+from typing import Any, Dict, Optional, Tuple, List
 from cv2.typing import Size
 from functools import lru_cache
 import cv2
 import numpy
 
-from fan.typing import Bbox, Kps, Frame, Mask, Matrix, Template
+from fan.typing import Bbox, Bboxes, Kps, Frame, Mask, Matrix, Scores, Template
 
 TEMPLATES : Dict[Template, numpy.ndarray[Any, Any]] =\
 {
@@ -44,24 +44,78 @@ TEMPLATES : Dict[Template, numpy.ndarray[Any, Any]] =\
 
 
 def warp_face(temp_frame : Frame, kps : Kps, template : Template, size : Size) -> Tuple[Frame, Matrix]:
-	normed_template = TEMPLATES.get(template) * size[1] / size[0]
-	affine_matrix = cv2.estimateAffinePartial2D(kps, normed_template, method = cv2.RANSAC, ransacReprojThreshold = 100)[0]
+	affine_matrix = estimate_matrix_by_kps(kps, template, size)
 	crop_frame = cv2.warpAffine(temp_frame, affine_matrix, (size[1], size[1]), borderMode = cv2.BORDER_REPLICATE)
 	return crop_frame, affine_matrix
 
 
+def estimate_matrix_by_kps(kps : Kps, template : Template, size : Size) -> Matrix:
+	return create_matrix_by_kps(numpy.asarray(kps, dtype = numpy.float64).tobytes(), template, tuple(size))
+
+
+@lru_cache(maxsize = 4096)
+def create_matrix_by_kps(kps_bytes : bytes, template : Template, size : Size) -> Matrix:
+	kps = numpy.frombuffer(kps_bytes, dtype = numpy.float64).reshape(-1, 2)
+	normed_template = TEMPLATES.get(template) * size[1] / size[0]
+	affine_matrix = estimate_similarity_matrix(kps, normed_template)
+	affine_matrix.flags.writeable = False
+	return affine_matrix
+
+
+def estimate_similarity_matrix(source_points : numpy.ndarray[Any, Any], target_points : numpy.ndarray[Any, Any]) -> Matrix:
+	source_center = source_points.mean(axis = 0)
+	target_center = target_points.mean(axis = 0)
+	source_x, source_y = (source_points - source_center).T
+	target_x, target_y = (target_points - target_center).T
+	source_variance = max(numpy.sum(source_x ** 2 + source_y ** 2), 1e-12)
+	scale_cos = numpy.sum(source_x * target_x + source_y * target_y) / source_variance
+	scale_sin = numpy.sum(source_x * target_y - source_y * target_x) / source_variance
+	translate_x = target_center[0] - scale_cos * source_center[0] + scale_sin * source_center[1]
+	translate_y = target_center[1] - scale_sin * source_center[0] - scale_cos * source_center[1]
+	return numpy.array(
+	[
+		[ scale_cos, -scale_sin, translate_x ],
+		[ scale_sin, scale_cos, translate_y ]
+	])
+
+
 def paste_back(temp_frame : Frame, crop_frame: Frame, crop_mask : Mask, affine_matrix : Matrix) -> Frame:
-	inverse_matrix = cv2.invertAffineTransform(affine_matrix)
-	temp_frame_size = temp_frame.shape[:2][::-1]
-	inverse_crop_mask = cv2.warpAffine(crop_mask, inverse_matrix, temp_frame_size).clip(0, 1)
-	inverse_crop_frame = cv2.warpAffine(crop_frame, inverse_matrix, temp_frame_size, borderMode = cv2.BORDER_REPLICATE)
 	paste_frame = temp_frame.copy()
-	paste_frame[:, :, 0] = inverse_crop_mask * inverse_crop_frame[:, :, 0] + (1 - inverse_crop_mask) * temp_frame[:, :, 0]
-	paste_frame[:, :, 1] = inverse_crop_mask * inverse_crop_frame[:, :, 1] + (1 - inverse_crop_mask) * temp_frame[:, :, 1]
-	paste_frame[:, :, 2] = inverse_crop_mask * inverse_crop_frame[:, :, 2] + (1 - inverse_crop_mask) * temp_frame[:, :, 2]
+	return paste_back_into(paste_frame, crop_frame, crop_mask, affine_matrix)
+
+
+def paste_back_into(paste_frame : Frame, crop_frame: Frame, crop_mask : Mask, affine_matrix : Matrix) -> Frame:
+	inverse_matrix = cv2.invertAffineTransform(affine_matrix)
+	paste_height, paste_width = paste_frame.shape[:2]
+	x1, y1, x2, y2 = calc_paste_area(crop_frame.shape[:2], inverse_matrix, (paste_width, paste_height))
+	if x2 <= x1 or y2 <= y1:
+		return paste_frame
+	inverse_matrix[:, 2] -= (x1, y1)
+	paste_area_size = (x2 - x1, y2 - y1)
+	inverse_crop_mask = cv2.warpAffine(crop_mask.astype(numpy.float32, copy = False), inverse_matrix, paste_area_size)
+	numpy.clip(inverse_crop_mask, 0, 1, out = inverse_crop_mask)
+	inverse_crop_frame = cv2.warpAffine(crop_frame, inverse_matrix, paste_area_size, borderMode = cv2.BORDER_REPLICATE)
+	paste_area_frame = paste_frame[y1:y2, x1:x2]
+	paste_area_frame[:] = cv2.blendLinear(inverse_crop_frame, paste_area_frame, inverse_crop_mask, 1 - inverse_crop_mask)
 	return paste_frame
 
 
+def calc_paste_area(crop_shape : Tuple[int, int], inverse_matrix : Matrix, paste_size : Size) -> Tuple[int, int, int, int]:
+	crop_height, crop_width = crop_shape
+	crop_corners = numpy.array([ [ 0, 0 ], [ crop_width, 0 ], [ 0, crop_height ], [ crop_width, crop_height ] ], dtype = numpy.float32)
+	paste_corners = cv2.transform(crop_corners.reshape(-1, 1, 2), inverse_matrix).reshape(-1, 2)
+	x1, y1 = numpy.maximum(numpy.floor(paste_corners.min(axis = 0)).astype(int) - 1, 0)
+	x2, y2 = numpy.minimum(numpy.ceil(paste_corners.max(axis = 0)).astype(int) + 1, paste_size)
+	return x1, y1, x2, y2
+
+
+def transform_bbox(bbox : Bbox, previous_kps : Kps, kps : Kps) -> Bbox:
+	previous_center = numpy.mean(previous_kps, axis = 0)
+	center = numpy.mean(kps, axis = 0)
+	scale = float(numpy.linalg.norm(kps - center)) / max(float(numpy.linalg.norm(previous_kps - previous_center)), 1e-6)
+	return ((numpy.reshape(bbox, (2, 2)) - previous_center) * scale + center).ravel()
+
+
 @lru_cache(maxsize = None)
 def create_static_anchors(feature_stride : int, anchor_total : int, stride_height : int, stride_width : int) -> numpy.ndarray[Any, Any]:
 	y, x = numpy.mgrid[:stride_height, :stride_width][::-1]
@@ -87,25 +141,12 @@ def distance_to_kps(points : numpy.ndarray[Any, Any], distance : numpy.ndarray[A
 	return kps
 
 
-def apply_nms(bbox_list : List[Bbox], iou_threshold : float) -> List[int]:
-	keep_indices = []
-	dimension_list = numpy.reshape(bbox_list, (-1, 4))
-	x1 = dimension_list[:, 0]
-	y1 = dimension_list[:, 1]
-	x2 = dimension_list[:, 2]
-	y2 = dimension_list[:, 3]
-	areas = (x2 - x1 + 1) * (y2 - y1 + 1)
-	indices = numpy.arange(len(bbox_list))
-	while indices.size > 0:
-		index = indices[0]
-		remain_indices = indices[1:]
-		keep_indices.append(index)
-		xx1 = numpy.maximum(x1[index], x1[remain_indices])
-		yy1 = numpy.maximum(y1[index], y1[remain_indices])
-		xx2 = numpy.minimum(x2[index], x2[remain_indices])
-		yy2 = numpy.minimum(y2[index], y2[remain_indices])
-		width = numpy.maximum(0, xx2 - xx1 + 1)
-		height = numpy.maximum(0, yy2 - yy1 + 1)
-		iou = width * height / (areas[index] + areas[remain_indices] - width * height)
-		indices = indices[numpy.where(iou <= iou_threshold)[0] + 1]
-	return keep_indices
+def apply_nms(bboxes : Bboxes, scores : Scores, iou_threshold : float, frame_indices : Optional[numpy.ndarray[Any, Any]] = None) -> numpy.ndarray[Any, Any]:
+	if not len(bboxes):
+		return numpy.zeros(0, dtype = numpy.int64)
+	if frame_indices is not None:
+		frame_offset = (numpy.abs(bboxes).max() + 1) * 2
+		bboxes = bboxes + (frame_indices * frame_offset)[:, numpy.newaxis]
+	nms_boxes = numpy.concatenate([ bboxes[:, :2], bboxes[:, 2:] - bboxes[:, :2] + 1 ], axis = 1)
+	keep_indices = cv2.dnn.NMSBoxes(nms_boxes.tolist(), scores.astype(numpy.float32).tolist(), 0.0, iou_threshold)
+	return numpy.asarray(keep_indices, dtype = numpy.int64).reshape(-1)
@@ -1,19 +1,21 @@
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
 from cv2.typing import Size
 from functools import lru_cache
 import threading
 import cv2
 import numpy
-import onnxruntime
 
 import fan.globals
-from fan.typing import Frame, Mask, Padding, FaceMaskRegion, ModelSet
+from fan.typing import Frame, Kps, Mask, Matrix, Padding, FaceMaskRegion, ModelSet
 from fan.filesystem import resolve_relative_path
 from fan.download import conditional_download
+from fan.inference_manager import get_inference_session
+from fan.batcher import run_in_batches
 
 FACE_OCCLUDER = None
 FACE_PARSER = None
 THREAD_LOCK : threading.Lock = threading.Lock()
+MASK_CACHE : threading.local = threading.local()
 MODELS : ModelSet =\
 {
 	'face_occluder':
@@ -48,7 +50,7 @@ def get_face_occluder() -> Any:
 	with THREAD_LOCK:
 		if FACE_OCCLUDER is None:
 			model_path = MODELS.get('face_occluder').get('path')
-			FACE_OCCLUDER = onnxruntime.InferenceSession(model_path, providers = fan.globals.execution_providers)
+			FACE_OCCLUDER = get_inference_session(model_path)
 	return FACE_OCCLUDER
 
 
@@ -58,7 +60,7 @@ def get_face_parser() -> Any:
 	with THREAD_LOCK:
 		if FACE_PARSER is None:
 			model_path = MODELS.get('face_parser').get('path')
-			FACE_PARSER = onnxruntime.InferenceSession(model_path, providers = fan.globals.execution_providers)
+			FACE_PARSER = get_inference_session(model_path)
 	return FACE_PARSER
 
 
@@ -96,33 +98,82 @@ def create_static_box_mask(crop_size : Size, face_mask_blur : float, face_mask_p
 	box_mask[:, :max(blur_area, int(crop_size[0] * face_mask_padding[3] / 100))] = 0
 	box_mask[:, -max(blur_area, int(crop_size[0] * face_mask_padding[1] / 100)):] = 0
 	if blur_amount > 0:
-		box_mask = cv2.GaussianBlur(box_mask, (0, 0), blur_amount * 0.25)
+		box_mask = cv2.GaussianBlur(box_mask, (0, 0), blur_amount * 0.25).astype(numpy.float32)
 	return box_mask
 
 
 def create_occlusion_mask(crop_frame : Frame) -> Mask:
+	return create_occlusion_masks([ crop_frame ])[0]
+
+
+def create_occlusion_masks(crop_frames : List[Frame]) -> List[Mask]:
 	face_occluder = get_face_occluder()
-	prepare_frame = cv2.resize(crop_frame, face_occluder.get_inputs()[0].shape[1:3][::-1])
-	prepare_frame = numpy.expand_dims(prepare_frame, axis = 0).astype(numpy.float32) / 255
-	prepare_frame = prepare_frame.transpose(0, 1, 2, 3)
-	occlusion_mask = face_occluder.run(None,
+	face_occluder_size = face_occluder.get_inputs()[0].shape[1:3][::-1]
+	prepare_frames = numpy.stack([ cv2.resize(crop_frame, face_occluder_size) for crop_frame in crop_frames ]).astype(numpy.float32) / 255
+	occlusion_masks = run_in_batches(face_occluder,
 	{
-		face_occluder.get_inputs()[0].name: prepare_frame
-	})[0][0]
-	occlusion_mask = occlusion_mask.transpose(0, 1, 2).clip(0, 1).astype(numpy.float32)
-	occlusion_mask = cv2.resize(occlusion_mask, crop_frame.shape[:2][::-1])
-	return occlusion_mask
+		face_occluder.get_inputs()[0].name: prepare_frames
+	}, len(crop_frames))
+	occlusion_masks = occlusion_masks.clip(0, 1).astype(numpy.float32)
+	return [ cv2.resize(occlusion_mask, crop_frame.shape[:2][::-1]) for occlusion_mask, crop_frame in zip(occlusion_masks, crop_frames) ]
 
 
 def create_region_mask(crop_frame : Frame, face_mask_regions : List[FaceMaskRegion]) -> Mask:
+	return create_region_masks([ crop_frame ], face_mask_regions)[0]
+
+
+def create_region_masks(crop_frames : List[Frame], face_mask_regions : List[FaceMaskRegion]) -> List[Mask]:
 	face_parser = get_face_parser()
-	prepare_frame = cv2.flip(cv2.resize(crop_frame, (512, 512)), 1)
-	prepare_frame = numpy.expand_dims(prepare_frame, axis = 0).astype(numpy.float32)[:, :, ::-1] / 127.5 - 1
-	prepare_frame = prepare_frame.transpose(0, 3, 1, 2)
-	region_mask = face_parser.run(None,
+	prepare_frames = numpy.stack([ cv2.flip(cv2.resize(crop_frame, (512, 512)), 1) for crop_frame in crop_frames ]).astype(numpy.float32)[:, :, :, ::-1] / 127.5 - 1
+	prepare_frames = prepare_frames.transpose(0, 3, 1, 2)
+	region_masks = run_in_batches(face_parser,
 	{
-		face_parser.get_inputs()[0].name: prepare_frame
-	})[0][0]
-	region_mask = numpy.isin(region_mask.argmax(0), [ FACE_MASK_REGIONS[region] for region in face_mask_regions ])
-	region_mask = cv2.resize(region_mask.astype(numpy.float32), crop_frame.shape[:2][::-1])
-	return region_mask
+		face_parser.get_inputs()[0].name: numpy.ascontiguousarray(prepare_frames)
+	}, len(crop_frames))
+	region_masks = numpy.isin(region_masks.argmax(1), [ FACE_MASK_REGIONS[region] for region in face_mask_regions ])
+	return [ cv2.resize(region_mask.astype(numpy.float32), crop_frame.shape[:2][::-1]) for region_mask, crop_frame in zip(region_masks, crop_frames) ]
+
+
+def get_occlusion_masks(crop_frames : List[Frame], kps_list : List[Kps], affine_matrices : List[Matrix]) -> List[Mask]:
+	return get_cached_masks('occlusion', crop_frames, kps_list, affine_matrices, create_occlusion_masks)
+
+
+def get_region_masks(crop_frames : List[Frame], kps_list : List[Kps], affine_matrices : List[Matrix], face_mask_regions : List[FaceMaskRegion]) -> List[Mask]:
+	return get_cached_masks('region:' + ','.join(face_mask_regions), crop_frames, kps_list, affine_matrices, lambda region_crop_frames : create_region_masks(region_crop_frames, face_mask_regions))
+
+
+def get_cached_masks(mask_name : str, crop_frames : List[Frame], kps_list : List[Kps], affine_matrices : List[Matrix], create_masks : Callable[[List[Frame]], List[Mask]]) -> List[Mask]:
+	mask_cache = getattr(MASK_CACHE, 'masks', None)
+	masks : List[Optional[Mask]] = []
+	missing_indices = []
+	for index, (crop_frame, kps, affine_matrix) in enumerate(zip(crop_frames, kps_list, affine_matrices)):
+		mask = None
+		if mask_cache is not None and (mask_name, kps.tobytes()) in mask_cache:
+			cache_mask, cache_matrix = mask_cache.get((mask_name, kps.tobytes()))
+			mask = warp_mask(cache_mask, cache_matrix, affine_matrix, crop_frame.shape[:2][::-1])
+		if mask is None:
+			missing_indices.append(index)
+		masks.append(mask)
+	if missing_indices:
+		missing_masks = create_masks([ crop_frames[index] for index in missing_indices ])
+		for index, mask in zip(missing_indices, missing_masks):
+			masks[index] = mask
+			if mask_cache is not None:
+				mask_cache[(mask_name, kps_list[index].tobytes())] = (mask, affine_matrices[index])
+	return masks # type: ignore[return-value]
+
+
+def warp_mask(mask : Mask, source_matrix : Matrix, target_matrix : Matrix, crop_size : Size) -> Mask:
+	if numpy.array_equal(source_matrix, target_matrix) and mask.shape[:2][::-1] == tuple(crop_size):
+		return mask
+	inverse_source_matrix = numpy.vstack([ cv2.invertAffineTransform(source_matrix), [ 0, 0, 1 ] ])
+	mask_matrix = numpy.asarray(target_matrix) @ inverse_source_matrix
+	return cv2.warpAffine(mask, mask_matrix, tuple(crop_size))
+
+
+def open_mask_cache() -> None:
+	MASK_CACHE.masks = {}
+
+
+def close_mask_cache() -> None:
+	MASK_CACHE.masks = None
@@ -1,34 +1,78 @@
 from typing import Optional, List
+from collections import OrderedDict
 import hashlib
+import threading
+import numpy
 
-from fan.typing import Frame, Face, FaceStore, FaceSet
+from fan.typing import Frame, Face, FaceStore, FaceSet, FaceStoreStatistics
 
 FACE_STORE: FaceStore =\
 {
-	'static_faces': {},
+	'static_faces': OrderedDict(),
 	'reference_faces': {}
 }
+FACE_STORE_STATISTICS : FaceStoreStatistics =\
+{
+	'hits': 0,
+	'misses': 0,
+	'evictions': 0,
+	'memory': 0
+}
+STATIC_FACES_MEMORY_LIMIT = 256 * 1024 ** 2
+STATIC_FACES_ENTRY_MEMORY = 256
+STATIC_FACES_FACE_MEMORY = 4096
+FRAME_HASH_STRIDE = 8
+THREAD_LOCK : threading.Lock = threading.Lock()
 
 
 def get_static_faces(frame : Frame) -> Optional[List[Face]]:
 	frame_hash = create_frame_hash(frame)
-	if frame_hash in FACE_STORE['static_faces']:
-		return FACE_STORE['static_faces'][frame_hash]
+	with THREAD_LOCK:
+		if frame_hash in FACE_STORE['static_faces']:
+			FACE_STORE['static_faces'].move_to_end(frame_hash)
+			FACE_STORE_STATISTICS['hits'] += 1
+			return FACE_STORE['static_faces'][frame_hash]
+		FACE_STORE_STATISTICS['misses'] += 1
 	return None
 
 
 def set_static_faces(frame : Frame, faces : List[Face]) -> None:
 	frame_hash = create_frame_hash(frame)
 	if frame_hash:
-		FACE_STORE['static_faces'][frame_hash] = faces
+		with THREAD_LOCK:
+			if frame_hash in FACE_STORE['static_faces']:
+				FACE_STORE_STATISTICS['memory'] -= estimate_faces_memory(FACE_STORE['static_faces'][frame_hash])
+			FACE_STORE['static_faces'][frame_hash] = faces
+			FACE_STORE['static_faces'].move_to_end(frame_hash)
+			FACE_STORE_STATISTICS['memory'] += estimate_faces_memory(faces)
+			while FACE_STORE_STATISTICS['memory'] > STATIC_FACES_MEMORY_LIMIT and len(FACE_STORE['static_faces']) > 1:
+				_, evict_faces = FACE_STORE['static_faces'].popitem(last = False)
+				FACE_STORE_STATISTICS['memory'] -= estimate_faces_memory(evict_faces)
+				FACE_STORE_STATISTICS['evictions'] += 1
 
 
 def clear_static_faces() -> None:
-	FACE_STORE['static_faces'] = {}
+	with THREAD_LOCK:
+		FACE_STORE['static_faces'] = OrderedDict()
+		FACE_STORE_STATISTICS['memory'] = 0
+
+
+def get_face_store_statistics() -> FaceStoreStatistics:
+	return FACE_STORE_STATISTICS.copy() # type: ignore[return-value]
 
 
-def create_frame_hash(frame: Frame) -> Optional[str]:
-	return hashlib.sha1(frame.tobytes()).hexdigest() if frame.any() else None
+def estimate_faces_memory(faces : List[Face]) -> int:
+	faces_memory = STATIC_FACES_ENTRY_MEMORY
+	for face in faces:
+		faces_memory += STATIC_FACES_FACE_MEMORY + face.bbox.nbytes + face.kps.nbytes
+	return faces_memory
+
+
+def create_frame_hash(frame : Frame) -> Optional[str]:
+	sample_frame = numpy.ascontiguousarray(frame[::FRAME_HASH_STRIDE, ::FRAME_HASH_STRIDE])
+	if sample_frame.any():
+		return hashlib.sha1(str(frame.shape).encode() + sample_frame.tobytes()).hexdigest()
+	return None
 
 
 def get_reference_faces() -> Optional[FaceSet]:
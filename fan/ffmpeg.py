@@ -3,8 +3,9 @@ import subprocess
 
 import fan.globals
 from fan import logger
+from fan.typing import Resolution
 from fan.filesystem import get_temp_frames_pattern, get_temp_output_video_path
-from fan.vision import detect_fps
+from fan.vision import detect_fps, detect_video_metadata
 
 
 def run_ffmpeg(args : List[str]) -> bool:
@@ -24,24 +25,59 @@ def open_ffmpeg(args : List[str]) -> subprocess.Popen[bytes]:
 	return subprocess.Popen(commands, stdin = subprocess.PIPE)
 
 
+def read_ffmpeg(args : List[str]) -> subprocess.Popen[bytes]:
+	commands = [ 'ffmpeg', '-hide_banner', '-loglevel', 'error' ]
+	commands.extend(args)
+	return subprocess.Popen(commands, stdout = subprocess.PIPE)
+
+
 def extract_frames(target_path : str, fps : float) -> bool:
 	temp_frame_compression = round(31 - (fan.globals.temp_frame_quality * 0.31))
-	trim_frame_start = fan.globals.trim_frame_start
-	trim_frame_end = fan.globals.trim_frame_end
 	temp_frames_pattern = get_temp_frames_pattern(target_path, '%04d')
 	commands = [ '-hwaccel', 'auto', '-i', target_path, '-q:v', str(temp_frame_compression), '-pix_fmt', 'rgb24' ]
-	if trim_frame_start is not None and trim_frame_end is not None:
-		commands.extend([ '-vf', 'trim=start_frame=' + str(trim_frame_start) + ':end_frame=' + str(trim_frame_end) + ',fps=' + str(fps) ])
-	elif trim_frame_start is not None:
-		commands.extend([ '-vf', 'trim=start_frame=' + str(trim_frame_start) + ',fps=' + str(fps) ])
-	elif trim_frame_end is not None:
-		commands.extend([ '-vf', 'trim=end_frame=' + str(trim_frame_end) + ',fps=' + str(fps) ])
-	else:
-		commands.extend([ '-vf', 'fps=' + str(fps) ])
+	commands.extend(create_frame_filter(fps))
 	commands.extend([ '-vsync', '0', temp_frames_pattern ])
 	return run_ffmpeg(commands)
 
 
+def open_frames_decoder(target_path : str, fps : float) -> subprocess.Popen[bytes]:
+	commands = [ '-hwaccel', 'auto', '-i', target_path ]
+	commands.extend(create_frame_filter(fps))
+	commands.extend([ '-vsync', '0', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-' ])
+	return read_ffmpeg(commands)
+
+
+def open_packets_reader(target_path : str) -> subprocess.Popen[bytes]:
+	commands = [ '-i', target_path, '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-' ]
+	return read_ffmpeg(commands)
+
+
+def open_sample_frames_decoder(target_path : str, frame_start : int, frame_end : int, frame_step : int) -> subprocess.Popen[bytes]:
+	commands = [ '-hwaccel', 'auto', '-i', target_path, '-vf', 'select=\'between(n,' + str(frame_start) + ',' + str(frame_end - 1) + ')*not(mod(n-' + str(frame_start) + ',' + str(frame_step) + '))\'' ]
+	commands.extend([ '-vsync', '0', '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-' ])
+	return read_ffmpeg(commands)
+
+
+def open_frames_encoder(target_path : str, fps : float, resolution : Resolution) -> subprocess.Popen[bytes]:
+	temp_output_video_path = get_temp_output_video_path(target_path)
+	commands = [ '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', str(resolution[0]) + 'x' + str(resolution[1]), '-r', str(fps), '-i', '-', '-c:v', fan.globals.output_video_encoder ]
+	commands.extend(create_video_compression())
+	commands.extend([ '-pix_fmt', 'yuv420p', '-colorspace', 'bt709', '-y', temp_output_video_path ])
+	return open_ffmpeg(commands)
+
+
+def create_frame_filter(fps : float) -> List[str]:
+	trim_frame_start = fan.globals.trim_frame_start
+	trim_frame_end = fan.globals.trim_frame_end
+	if trim_frame_start is not None and trim_frame_end is not None:
+		return [ '-vf', 'trim=start_frame=' + str(trim_frame_start) + ':end_frame=' + str(trim_frame_end) + ',fps=' + str(fps) ]
+	if trim_frame_start is not None:
+		return [ '-vf', 'trim=start_frame=' + str(trim_frame_start) + ',fps=' + str(fps) ]
+	if trim_frame_end is not None:
+		return [ '-vf', 'trim=end_frame=' + str(trim_frame_end) + ',fps=' + str(fps) ]
+	return [ '-vf', 'fps=' + str(fps) ]
+
+
 def compress_image(output_path : str) -> bool:
 	output_image_compression = round(31 - (fan.globals.output_image_quality * 0.31))
 	commands = [ '-hwaccel', 'auto', '-i', output_path, '-q:v', str(output_image_compression), '-y', output_path ]
@@ -52,20 +88,28 @@ def merge_video(target_path : str, fps : float) -> bool:
 	temp_output_video_path = get_temp_output_video_path(target_path)
 	temp_frames_pattern = get_temp_frames_pattern(target_path, '%04d')
 	commands = [ '-hwaccel', 'auto', '-r', str(fps), '-i', temp_frames_pattern, '-c:v', fan.globals.output_video_encoder ]
+	commands.extend(create_video_compression())
+	commands.extend([ '-pix_fmt', 'yuv420p', '-colorspace', 'bt709', '-y', temp_output_video_path ])
+	return run_ffmpeg(commands)
+
+
+def create_video_compression() -> List[str]:
 	if fan.globals.output_video_encoder in [ 'libx264', 'libx265' ]:
 		output_video_compression = round(51 - (fan.globals.output_video_quality * 0.51))
-		commands.extend([ '-crf', str(output_video_compression) ])
+		return [ '-crf', str(output_video_compression) ]
 	if fan.globals.output_video_encoder in [ 'libvpx-vp9' ]:
 		output_video_compression = round(63 - (fan.globals.output_video_quality * 0.63))
-		commands.extend([ '-crf', str(output_video_compression) ])
+		return [ '-crf', str(output_video_compression) ]
 	if fan.globals.output_video_encoder in [ 'h264_nvenc', 'hevc_nvenc' ]:
 		output_video_compression = round(51 - (fan.globals.output_video_quality * 0.51))
-		commands.extend([ '-cq', str(output_video_compression) ])
-	commands.extend([ '-pix_fmt', 'yuv420p', '-colorspace', 'bt709', '-y', temp_output_video_path ])
-	return run_ffmpeg(commands)
+		return [ '-cq', str(output_video_compression) ]
+	return []
 
 
 def restore_audio(target_path : str, output_path : str) -> bool:
+	video_metadata = detect_video_metadata(target_path)
+	if video_metadata and video_metadata.get('audio_streams') == []:
+		return False
 	fps = detect_fps(target_path)
 	trim_frame_start = fan.globals.trim_frame_start
 	trim_frame_end = fan.globals.trim_frame_end
@@ -7,6 +7,7 @@ import filetype
 from pathlib import Path
 
 import fan.globals
+from fan.vision import detect_video_metadata
 
 TEMP_DIRECTORY_PATH = os.path.join(tempfile.gettempdir(), 'fan')
 TEMP_OUTPUT_VIDEO_NAME = 'temp.mp4'
@@ -17,6 +18,13 @@ def get_temp_frame_paths(target_path : str) -> List[str]:
 	return sorted(glob.glob(temp_frames_pattern))
 
 
+def get_temp_frame_number(temp_frame_path : str) -> Optional[int]:
+	temp_frame_name, _ = os.path.splitext(os.path.basename(temp_frame_path))
+	if temp_frame_name.isdigit():
+		return int(temp_frame_name)
+	return None
+
+
 def get_temp_frames_pattern(target_path : str, temp_frame_prefix : str) -> str:
 	temp_directory_path = get_temp_directory_path(target_path)
 	return os.path.join(temp_directory_path, temp_frame_prefix + '.' + fan.globals.temp_frame_format)
@@ -76,7 +84,7 @@ def are_images(image_paths : List[str]) -> bool:
 
 def is_video(video_path : str) -> bool:
 	if is_file(video_path):
-		return filetype.helpers.is_video(video_path)
+		return detect_video_metadata(video_path) is not None
 	return False
 
 
@@ -0,0 +1,60 @@
+from typing import Optional
+from multiprocessing import shared_memory
+from queue import Empty, Queue
+import threading
+import numpy
+
+from fan.typing import FrameRing, Resolution
+
+FRAME_RING_POLL_INTERVAL = 0.1
+
+
+def create_frame_ring(resolution : Resolution, slot_total : int) -> FrameRing:
+	width, height = resolution
+	frame_ring_memory = shared_memory.SharedMemory(create = True, size = max(slot_total * height * width * 3, 1))
+	free_slots : Queue[int] = Queue()
+	for slot_index in range(slot_total):
+		free_slots.put(slot_index)
+	return\
+	{
+		'shared_memory': frame_ring_memory,
+		'frames': numpy.ndarray((slot_total, height, width, 3), dtype = numpy.uint8, buffer = frame_ring_memory.buf),
+		'free_slots': free_slots,
+		'closed': threading.Event()
+	}
+
+
+def attach_frame_ring(name : str, resolution : Resolution, slot_total : int) -> FrameRing:
+	width, height = resolution
+	frame_ring_memory = shared_memory.SharedMemory(name = name)
+	return\
+	{
+		'shared_memory': frame_ring_memory,
+		'frames': numpy.ndarray((slot_total, height, width, 3), dtype = numpy.uint8, buffer = frame_ring_memory.buf),
+		'free_slots': None,
+		'closed': threading.Event()
+	}
+
+
+def acquire_frame_slot(frame_ring : FrameRing) -> Optional[int]:
+	while not frame_ring.get('closed').is_set():
+		try:
+			return frame_ring.get('free_slots').get(timeout = FRAME_RING_POLL_INTERVAL)
+		except Empty:
+			continue
+	return None
+
+
+def release_frame_slot(frame_ring : FrameRing, slot_index : int) -> None:
+	frame_ring.get('free_slots').put(slot_index)
+
+
+def close_frame_ring(frame_ring : FrameRing, unlink : bool) -> None:
+	frame_ring.get('closed').set()
+	frame_ring['frames'] = None
+	try:
+		frame_ring.get('shared_memory').close()
+	except BufferError:
+		pass
+	if unlink:
+		frame_ring.get('shared_memory').unlink()
@@ -1,6 +1,6 @@
 from typing import List, Optional
 
-from fan.typing import LogLevel, FaceSelectorMode, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, FaceMaskType, FaceMaskRegion, OutputVideoEncoder, FaceDetectorModel, FaceRecognizerModel, TempFrameFormat, Padding
+from fan.typing import LogLevel, FaceSelectorMode, FaceAnalyserOrder, FaceAnalyserAge, FaceAnalyserGender, FaceMaskType, FaceMaskRegion, OutputVideoEncoder, FaceDetectorModel, FaceRecognizerModel, TempFrameFormat, VideoPipeline, ExecutionPool, Padding
 
 # general
 source_paths : Optional[List[str]] = None
@@ -14,6 +14,7 @@ log_level : Optional[LogLevel] = None
 execution_providers : List[str] = []
 execution_thread_count : Optional[int] = None
 execution_queue_count : Optional[int] = None
+execution_pool : Optional[ExecutionPool] = None
 max_memory : Optional[int] = None
 # face analyser
 face_analyser_order : Optional[FaceAnalyserOrder] = None
@@ -22,6 +23,10 @@ face_analyser_gender : Optional[FaceAnalyserGender] = None
 face_detector_model : Optional[FaceDetectorModel] = None
 face_detector_size : Optional[str] = None
 face_detector_score : Optional[float] = None
+face_detector_batch_size : Optional[int] = None
+face_detector_adaptive : Optional[bool] = None
+face_tracker_interval : Optional[int] = None
+face_analyser_cache : Optional[bool] = None
 face_recognizer_model : Optional[FaceRecognizerModel] = None
 # face selector
 face_selector_mode : Optional[FaceSelectorMode] = None
@@ -39,6 +44,7 @@ trim_frame_end : Optional[int] = None
 temp_frame_format : Optional[TempFrameFormat] = None
 temp_frame_quality : Optional[int] = None
 keep_temp : Optional[bool] = None
+video_pipeline : Optional[VideoPipeline] = None
 # output creation
 output_image_quality : Optional[int] = None
 output_video_encoder : Optional[OutputVideoEncoder] = None
@@ -47,5 +53,6 @@ keep_fps : Optional[bool] = None
 skip_audio : Optional[bool] = None
 # frame processors
 frame_processors : List[str] = []
+fuse_frame_processors : Optional[bool] = None
 # uis
 ui_layouts : List[str] = []
@@ -0,0 +1,140 @@
+from typing import Any, Dict, List
+import os
+import threading
+import onnxruntime
+
+import fan.globals
+from fan import logger, wording
+from fan.filesystem import resolve_relative_path
+from fan.typing import InferenceSessionStatistics
+
+INFERENCE_SESSIONS : Dict[str, onnxruntime.InferenceSession] = {}
+INFERENCE_SESSION_STATISTICS : Dict[str, InferenceSessionStatistics] = {}
+INFERENCE_SEMAPHORES : Dict[int, threading.BoundedSemaphore] = {}
+INFERENCE_MEMORY_FACTOR = 4
+THREAD_LOCK : threading.Lock = threading.Lock()
+OPTIMIZED_MODEL_DIRECTORY_PATH = resolve_relative_path('../.assets/optimized')
+PROVIDER_OPTIONS : Dict[str, Dict[str, Any]] =\
+{
+	'CUDAExecutionProvider':
+	{
+		'arena_extend_strategy': 'kSameAsRequested',
+		'cudnn_conv_algo_search': 'DEFAULT'
+	}
+}
+
+
+def get_inference_session(model_path : str) -> onnxruntime.InferenceSession:
+	session_key = create_session_key(model_path, fan.globals.execution_providers)
+	with THREAD_LOCK:
+		if session_key in INFERENCE_SESSIONS:
+			INFERENCE_SESSION_STATISTICS[session_key]['reuse_total'] += 1
+		else:
+			inference_concurrency = calc_inference_concurrency(model_path, fan.globals.execution_providers)
+			INFERENCE_SESSIONS[session_key] = create_inference_session(model_path, fan.globals.execution_providers)
+			INFERENCE_SEMAPHORES[id(INFERENCE_SESSIONS[session_key])] = threading.BoundedSemaphore(inference_concurrency)
+			INFERENCE_SESSION_STATISTICS[session_key] =\
+			{
+				'model_path': model_path,
+				'reuse_total': 0,
+				'concurrency': inference_concurrency
+			}
+	return INFERENCE_SESSIONS[session_key]
+
+
+def clear_inference_sessions() -> None:
+	global INFERENCE_SESSIONS
+	global INFERENCE_SESSION_STATISTICS
+	global INFERENCE_SEMAPHORES
+
+	with THREAD_LOCK:
+		INFERENCE_SESSIONS = {}
+		INFERENCE_SESSION_STATISTICS = {}
+		INFERENCE_SEMAPHORES = {}
+
+
+def run_inference_session(inference_session : Any, inference_inputs : Dict[str, Any]) -> List[Any]:
+	inference_semaphore = INFERENCE_SEMAPHORES.get(id(inference_session))
+	if inference_semaphore is None:
+		return inference_session.run(None, inference_inputs)
+	with inference_semaphore:
+		return inference_session.run(None, inference_inputs)
+
+
+def get_inference_session_statistics() -> List[InferenceSessionStatistics]:
+	with THREAD_LOCK:
+		return [ statistics.copy() for statistics in INFERENCE_SESSION_STATISTICS.values() ] # type: ignore[misc]
+
+
+def log_inference_session_statistics() -> None:
+	for statistics in get_inference_session_statistics():
+		model_name = os.path.basename(statistics.get('model_path'))
+		logger.debug(wording.get('inference_session_statistics').format(model_name = model_name, reuse_total = statistics.get('reuse_total'), concurrency = statistics.get('concurrency')), __name__.upper())
+
+
+def create_session_key(model_path : str, execution_providers : List[str]) -> str:
+	return model_path + '|' + ','.join(execution_providers)
+
+
+def create_inference_session(model_path : str, execution_providers : List[str]) -> onnxruntime.InferenceSession:
+	if is_optimized_model_cacheable(execution_providers):
+		optimized_model_path = get_optimized_model_path(model_path)
+		if not is_optimized_model_valid(model_path, optimized_model_path):
+			write_optimized_model(model_path, optimized_model_path)
+		if is_optimized_model_valid(model_path, optimized_model_path):
+			model_path = optimized_model_path
+	return onnxruntime.InferenceSession(model_path, sess_options = create_session_options(execution_providers), providers = create_providers(execution_providers))
+
+
+def write_optimized_model(model_path : str, optimized_model_path : str) -> None:
+	temp_optimized_model_path = optimized_model_path + '.' + str(os.getpid()) + '.tmp'
+	session_options = onnxruntime.SessionOptions()
+	session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED
+	session_options.optimized_model_filepath = temp_optimized_model_path
+	os.makedirs(OPTIMIZED_MODEL_DIRECTORY_PATH, exist_ok = True)
+	onnxruntime.InferenceSession(model_path, sess_options = session_options, providers = [ 'CPUExecutionProvider' ])
+	if os.path.isfile(temp_optimized_model_path):
+		os.replace(temp_optimized_model_path, optimized_model_path)
+
+
+def create_session_options(execution_providers : List[str]) -> onnxruntime.SessionOptions:
+	session_options = onnxruntime.SessionOptions()
+	session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+	session_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+	session_options.enable_cpu_mem_arena = True
+	session_options.enable_mem_pattern = True
+	session_options.inter_op_num_threads = 1
+	if 'CPUExecutionProvider' in execution_providers:
+		session_options.intra_op_num_threads = calc_intra_op_thread_count()
+	return session_options
+
+
+def create_providers(execution_providers : List[str]) -> List[Any]:
+	return [ (execution_provider, PROVIDER_OPTIONS.get(execution_provider)) if execution_provider in PROVIDER_OPTIONS else execution_provider for execution_provider in execution_providers ]
+
+
+def calc_inference_concurrency(model_path : str, execution_providers : List[str]) -> int:
+	inference_concurrency = max(fan.globals.execution_thread_count or 1, 1)
+	if 'DmlExecutionProvider' in execution_providers:
+		return 1
+	if fan.globals.max_memory:
+		inference_memory = max(os.path.getsize(model_path) * INFERENCE_MEMORY_FACTOR, 1)
+		inference_concurrency = min(inference_concurrency, max(fan.globals.max_memory * 1024 ** 3 // inference_memory, 1))
+	return inference_concurrency
+
+
+def calc_intra_op_thread_count() -> int:
+	return max((os.cpu_count() or 1) // max(fan.globals.execution_thread_count or 1, 1), 1)
+
+
+def is_optimized_model_cacheable(execution_providers : List[str]) -> bool:
+	return execution_providers == [ 'CPUExecutionProvider' ]
+
+
+def get_optimized_model_path(model_path : str) -> str:
+	model_name, _ = os.path.splitext(os.path.basename(model_path))
+	return os.path.join(OPTIMIZED_MODEL_DIRECTORY_PATH, model_name + '.' + onnxruntime.__version__ + '.cpu.onnx')
+
+
+def is_optimized_model_valid(model_path : str, optimized_model_path : str) -> bool:
+	return os.path.isfile(optimized_model_path) and os.path.getmtime(optimized_model_path) >= os.path.getmtime(model_path)
@@ -12,23 +12,15 @@ import inquirer
 
 from fan import metadata, wording
 
-TORCH : Dict[str, str] =\
-{
-	'default': 'default',
-	'cpu': 'cpu'
-}
 ONNXRUNTIMES : Dict[str, Tuple[str, str]] =\
 {
 	'default': ('onnxruntime', '1.16.3')
 }
 if platform.system().lower() == 'linux' or platform.system().lower() == 'windows':
-	TORCH['cuda'] = 'cu118'
-	TORCH['cuda-nightly'] = 'cu121'
 	ONNXRUNTIMES['cuda'] = ('onnxruntime-gpu', '1.16.3')
 	ONNXRUNTIMES['cuda-nightly'] = ('ort-nightly-gpu', '1.17.0.dev20231205004')
 	ONNXRUNTIMES['openvino'] = ('onnxruntime-openvino', '1.16.0')
 if platform.system().lower() == 'linux':
-	TORCH['rocm'] = 'rocm5.6'
 	ONNXRUNTIMES['directml'] = ('onnxruntime-directml', '1.16.3')
 	ONNXRUNTIMES['rocm'] = ('onnxruntime-rocm', '1.16.3')
 if platform.system().lower() == 'darwin':
@@ -38,7 +30,6 @@ if platform.system().lower() == 'darwin':
 
 def cli() -> None:
 	program = ArgumentParser(formatter_class = lambda prog: HelpFormatter(prog, max_help_position = 120))
-	program.add_argument('--torch', help = wording.get('install_dependency_help').format(dependency = 'torch'), choices = TORCH.keys())
 	program.add_argument('--onnxruntime', help = wording.get('install_dependency_help').format(dependency = 'onnxruntime'), choices = ONNXRUNTIMES.keys())
 	program.add_argument('--skip-venv', help = wording.get('skip_venv_help'), action = 'store_true')
 	program.add_argument('-v', '--version', version = metadata.get('name') + ' ' + metadata.get('version'), action = 'version')
@@ -51,29 +42,21 @@ def run(program : ArgumentParser) -> None:
 
 	if not args.skip_venv:
 		os.environ['PIP_REQUIRE_VIRTUALENV'] = '1'
-	if args.torch and args.onnxruntime:
+	if args.onnxruntime:
 		answers =\
 		{
-			'torch': args.torch,
 			'onnxruntime': args.onnxruntime
 		}
 	else:
 		answers = inquirer.prompt(
 		[
-			inquirer.List('torch', message = wording.get('install_dependency_help').format(dependency = 'torch'), choices = list(TORCH.keys())),
 			inquirer.List('onnxruntime', message = wording.get('install_dependency_help').format(dependency = 'onnxruntime'), choices = list(ONNXRUNTIMES.keys()))
 		])
 	if answers:
-		torch = answers['torch']
-		torch_wheel = TORCH[torch]
 		onnxruntime = answers['onnxruntime']
 		onnxruntime_name, onnxruntime_version = ONNXRUNTIMES[onnxruntime]
 
-		subprocess.call([ 'pip', 'uninstall', 'torch', '-y', '-q' ])
-		if torch_wheel == 'default':
-			subprocess.call([ 'pip', 'install', '-r', 'requirements.txt' ])
-		else:
-			subprocess.call([ 'pip', 'install', '-r', 'requirements.txt', '--extra-index-url', 'https://download.pytorch.org/whl/' + torch_wheel ])
+		subprocess.call([ 'pip', 'install', '-r', 'requirements.txt' ])
 		if onnxruntime == 'rocm':
 			if python_id in [ 'cp39', 'cp310', 'cp311' ]:
 				wheel_name = 'onnxruntime_training-' + onnxruntime_version + '+rocm56-' + python_id + '-' + python_id + '-manylinux_2_17_x86_64.manylinux2014_x86_64.whl'
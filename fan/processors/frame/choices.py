@@ -7,7 +7,13 @@ face_swapper_models : List[FaceSwapperModel] = [ 'blendswap_256', 'inswapper_128
 face_enhancer_models : List[FaceEnhancerModel] = [ 'codeformer', 'gfpgan_1.2', 'gfpgan_1.3', 'gfpgan_1.4', 'gpen_bfr_256', 'gpen_bfr_512', 'restoreformer' ]
 frame_enhancer_models : List[FrameEnhancerModel] = [ 'real_esrgan_x2plus', 'real_esrgan_x4plus', 'real_esrnet_x4plus' ]
 
+face_swapper_batch_size_range : List[int] = numpy.arange(1, 33, 1).tolist()
+face_swapper_batch_latency_range : List[int] = numpy.arange(0, 1001, 1).tolist()
 face_enhancer_blend_range : List[int] = numpy.arange(0, 101, 1).tolist()
 frame_enhancer_blend_range : List[int] = numpy.arange(0, 101, 1).tolist()
+frame_enhancer_tile_size_range : List[int] = numpy.arange(128, 1025, 32).tolist()
+frame_enhancer_tile_overlap_range : List[int] = numpy.arange(0, 33, 1).tolist()
+frame_enhancer_batch_size_range : List[int] = numpy.arange(1, 33, 1).tolist()
+frame_enhancer_batch_latency_range : List[int] = numpy.arange(0, 1001, 1).tolist()
 
 face_debugger_items : List[FaceDebuggerItem] = [ 'bbox', 'kps', 'face-mask', 'score' ]
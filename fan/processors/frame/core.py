@@ -1,17 +1,36 @@
 import sys
 import importlib
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from queue import Queue
+import multiprocessing
+import os
+import subprocess
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from io import BufferedReader
+from queue import Empty, Queue
 from types import ModuleType
-from typing import Any, List
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, cast
+import numpy
 from tqdm import tqdm
 
 import fan.globals
-from fan.typing import Process_Frames
+import fan.processors.frame.globals as frame_processors_globals
+from fan.typing import Face, FaceSet, Frame, FrameRing, Resolution, ProcessState, Process_Frames, Update_Process, WorkerStatistics
 from fan.execution_helper import encode_execution_providers
+from fan.face_analyser import get_average_face, get_many_faces, prime_many_faces, set_video_frame
+from fan.face_masker import open_mask_cache, close_mask_cache
+from fan.face_store import FACE_STORE, get_reference_faces, get_static_faces, set_static_faces
+from fan.face_cache import flush_face_cache
+from fan.ffmpeg import open_frames_decoder, open_frames_encoder
+from fan.filesystem import get_temp_frame_number
+from fan.frame_ring import create_frame_ring, attach_frame_ring, acquire_frame_slot, release_frame_slot, close_frame_ring
+from fan.vision import read_image, read_static_images, write_image, detect_fps, detect_video_resolution, count_video_frame_total
 from fan import logger, wording
 
 FRAME_PROCESSORS_MODULES : List[ModuleType] = []
+PROCESS_TEMP_FRAME_PATHS : List[str] = []
+PROCESS_FRAME_RING : Optional[FrameRing] = None
+FRAME_BATCHES_PER_WORKER = 16
 FRAME_PROCESSORS_METHODS =\
 [
 	'get_frame_processor',
@@ -71,16 +90,109 @@ def multi_process_frames(source_paths : List[str], temp_frame_paths : List[str],
 			'execution_thread_count': fan.globals.execution_thread_count,
 			'execution_queue_count': fan.globals.execution_queue_count
 		})
-		with ThreadPoolExecutor(max_workers = fan.globals.execution_thread_count) as executor:
-			futures = []
-			queue_temp_frame_paths : Queue[str] = create_queue(temp_frame_paths)
-			queue_per_future = max(len(temp_frame_paths) // fan.globals.execution_thread_count * fan.globals.execution_queue_count, 1)
-			while not queue_temp_frame_paths.empty():
-				payload_temp_frame_paths = pick_queue(queue_temp_frame_paths, queue_per_future)
-				future = executor.submit(process_frames, source_paths, payload_temp_frame_paths, progress.update)
-				futures.append(future)
+		worker_statistics : Dict[str, WorkerStatistics] = {}
+		start_time = time.perf_counter()
+		if fan.globals.execution_pool == 'process':
+			multi_process_frames_in_processes(source_paths, temp_frame_paths, process_frames, progress.update, worker_statistics)
+		else:
+			multi_process_frames_in_threads(source_paths, temp_frame_paths, process_frames, progress.update, worker_statistics)
+		log_worker_statistics(worker_statistics, time.perf_counter() - start_time)
+
+
+def multi_process_frames_in_threads(source_paths : List[str], temp_frame_paths : List[str], process_frames : Process_Frames, update_progress : Update_Process, worker_statistics : Dict[str, WorkerStatistics]) -> None:
+	queue_temp_frame_paths : Queue[str] = create_queue(temp_frame_paths)
+	queue_per_future = calc_queue_per_future(len(temp_frame_paths))
+	with ThreadPoolExecutor(max_workers = fan.globals.execution_thread_count) as executor:
+		futures = {}
+		for worker_index in range(fan.globals.execution_thread_count):
+			future = executor.submit(process_queue, process_frames, source_paths, queue_temp_frame_paths, queue_per_future, update_progress)
+			futures[future] = 'thread-' + str(worker_index)
+		try:
+			for future_done in as_completed(futures):
+				worker_statistics[futures[future_done]] = future_done.result()
+		except Exception:
+			pick_queue(queue_temp_frame_paths, len(temp_frame_paths))
+			raise
+
+
+def multi_process_frames_in_processes(source_paths : List[str], temp_frame_paths : List[str], process_frames : Process_Frames, update_progress : Callable[[int], Any], worker_statistics : Dict[str, WorkerStatistics]) -> None:
+	process_context = multiprocessing.get_context('spawn')
+	queue_per_future = calc_queue_per_future(len(temp_frame_paths))
+	with ProcessPoolExecutor(max_workers = fan.globals.execution_thread_count, mp_context = process_context, initializer = init_process_worker, initargs = (get_process_state(), temp_frame_paths)) as executor:
+		futures = []
+		for start in range(0, len(temp_frame_paths), queue_per_future):
+			future = executor.submit(process_frame_range, process_frames, source_paths, (start, min(start + queue_per_future, len(temp_frame_paths))))
+			futures.append(future)
+		try:
 			for future_done in as_completed(futures):
-				future_done.result()
+				worker_name, range_statistics = future_done.result()
+				statistics = worker_statistics.setdefault(worker_name, { 'frame_total': 0, 'busy_time': 0.0 })
+				statistics['frame_total'] += range_statistics.get('frame_total')
+				statistics['busy_time'] += range_statistics.get('busy_time')
+				update_progress(range_statistics.get('frame_total'))
+		except Exception:
+			for future in futures:
+				future.cancel()
+			raise
+
+
+def calc_queue_per_future(frame_total : int) -> int:
+	return max(-(-frame_total // (fan.globals.execution_thread_count * FRAME_BATCHES_PER_WORKER)), fan.globals.execution_queue_count, fan.globals.face_tracker_interval or 1, 1)
+
+
+def process_queue(process_frames : Process_Frames, source_paths : List[str], queue_temp_frame_paths : Queue[str], queue_per_future : int, update_progress : Update_Process) -> WorkerStatistics:
+	worker_statistics : WorkerStatistics =\
+	{
+		'frame_total': 0,
+		'busy_time': 0.0
+	}
+	payload_temp_frame_paths = pick_queue(queue_temp_frame_paths, queue_per_future)
+	while payload_temp_frame_paths:
+		start_time = time.perf_counter()
+		process_frames(source_paths, payload_temp_frame_paths, update_progress)
+		worker_statistics['busy_time'] += time.perf_counter() - start_time
+		worker_statistics['frame_total'] += len(payload_temp_frame_paths)
+		payload_temp_frame_paths = pick_queue(queue_temp_frame_paths, queue_per_future)
+	return worker_statistics
+
+
+def log_worker_statistics(worker_statistics : Dict[str, WorkerStatistics], total_time : float) -> None:
+	for worker_name, statistics in sorted(worker_statistics.items()):
+		utilisation = round(statistics.get('busy_time') / max(total_time, 1e-6) * 100)
+		logger.debug(wording.get('worker_statistics').format(worker = worker_name, frame_total = statistics.get('frame_total'), utilisation = utilisation), __name__.upper())
+
+
+def get_process_state() -> ProcessState:
+	return\
+	{
+		'globals': { key: getattr(fan.globals, key) for key in fan.globals.__annotations__ },
+		'frame_processors_globals': { key: getattr(frame_processors_globals, key) for key in frame_processors_globals.__annotations__ },
+		'reference_faces': FACE_STORE['reference_faces']
+	}
+
+
+def init_process_worker(process_state : ProcessState, temp_frame_paths : List[str]) -> None:
+	global PROCESS_TEMP_FRAME_PATHS
+
+	for key, value in process_state.get('globals').items():
+		setattr(fan.globals, key, value)
+	for key, value in process_state.get('frame_processors_globals').items():
+		setattr(frame_processors_globals, key, value)
+	FACE_STORE['reference_faces'] = process_state.get('reference_faces')
+	PROCESS_TEMP_FRAME_PATHS = temp_frame_paths
+
+
+def process_frame_range(process_frames : Process_Frames, source_paths : List[str], frame_range : Tuple[int, int]) -> Tuple[str, WorkerStatistics]:
+	start, end = frame_range
+	start_time = time.perf_counter()
+	process_frames(source_paths, PROCESS_TEMP_FRAME_PATHS[start:end], lambda : None)
+	flush_face_cache()
+	range_statistics : WorkerStatistics =\
+	{
+		'frame_total': end - start,
+		'busy_time': time.perf_counter() - start_time
+	}
+	return 'process-' + str(os.getpid()), range_statistics
 
 
 def create_queue(temp_frame_paths : List[str]) -> Queue[str]:
@@ -93,6 +205,222 @@ def create_queue(temp_frame_paths : List[str]) -> Queue[str]:
 def pick_queue(queue : Queue[str], queue_per_future : int) -> List[str]:
 	queues = []
 	for _ in range(queue_per_future):
-		if not queue.empty():
-			queues.append(queue.get())
+		try:
+			queues.append(queue.get_nowait())
+		except Empty:
+			break
 	return queues
+
+
+def multi_process_pipe(source_paths : List[str], target_path : str, fps : float) -> bool:
+	video_resolution = detect_video_resolution(target_path)
+	if not video_resolution:
+		return False
+	source_frames = read_static_images(source_paths)
+	source_face = get_average_face(source_frames)
+	reference_faces = get_reference_faces() if 'reference' in fan.globals.face_selector_mode else None
+	queue_size = max(fan.globals.execution_thread_count * fan.globals.execution_queue_count // fan.globals.face_detector_batch_size, fan.globals.execution_thread_count, 1)
+	slot_total = (queue_size + 2) * fan.globals.face_detector_batch_size
+	frame_ring = create_frame_ring(video_resolution, slot_total)
+	queue_decode_frames : Queue[Optional[int]] = Queue()
+	queue_encode_frames : Queue[Optional[Tuple[int, Optional[Frame]]]] = Queue()
+	decoder = open_frames_decoder(target_path, fps)
+	with tqdm(total = count_pipe_frame_total(target_path, fps), desc = wording.get('processing'), unit = 'frame', ascii = ' =', disable = fan.globals.log_level in [ 'warn', 'error' ]) as progress:
+		progress.set_postfix(
+		{
+			'execution_providers': encode_execution_providers(fan.globals.execution_providers),
+			'execution_thread_count': fan.globals.execution_thread_count,
+			'execution_queue_count': fan.globals.execution_queue_count
+		})
+		with ThreadPoolExecutor(max_workers = 2) as stage_executor:
+			decode_future = stage_executor.submit(decode_frames, decoder, frame_ring, queue_decode_frames)
+			encode_future = stage_executor.submit(encode_frames, target_path, fps, frame_ring, queue_encode_frames, progress.update)
+			try:
+				with create_pipe_executor(source_paths, frame_ring, video_resolution, slot_total) as executor:
+					futures : Deque[Future[List[Tuple[int, Optional[Frame]]]]] = deque()
+					slot_indices = []
+					frame_number = 0
+					slot_index = queue_decode_frames.get()
+					while slot_index is not None:
+						slot_indices.append(slot_index)
+						frame_number += 1
+						if len(slot_indices) >= fan.globals.face_detector_batch_size:
+							futures.append(submit_ring_frames(executor, source_paths, source_face, reference_faces, frame_ring, slot_indices, frame_number - len(slot_indices) + 1))
+							slot_indices = []
+						if len(futures) >= queue_size:
+							for result in futures.popleft().result():
+								queue_encode_frames.put(result)
+						slot_index = queue_decode_frames.get()
+					if slot_indices:
+						futures.append(submit_ring_frames(executor, source_paths, source_face, reference_faces, frame_ring, slot_indices, frame_number - len(slot_indices) + 1))
+					while futures:
+						for result in futures.popleft().result():
+							queue_encode_frames.put(result)
+			except BaseException:
+				decoder.kill()
+				frame_ring.get('closed').set()
+				raise
+			finally:
+				queue_encode_frames.put(None)
+				wait([ decode_future, encode_future ])
+				close_frame_ring(frame_ring, True)
+			return all([ decode_future.result(), encode_future.result() ])
+
+
+def create_pipe_executor(source_paths : List[str], frame_ring : FrameRing, video_resolution : Resolution, slot_total : int) -> Executor:
+	if fan.globals.execution_pool == 'process':
+		process_context = multiprocessing.get_context('spawn')
+		return ProcessPoolExecutor(max_workers = fan.globals.execution_thread_count, mp_context = process_context, initializer = init_pipe_process_worker, initargs = (get_process_state(), frame_ring.get('shared_memory').name, video_resolution, slot_total))
+	return ThreadPoolExecutor(max_workers = fan.globals.execution_thread_count)
+
+
+def submit_ring_frames(executor : Executor, source_paths : List[str], source_face : Face, reference_faces : FaceSet, frame_ring : FrameRing, slot_indices : List[int], frame_number : int) -> Future[List[Tuple[int, Optional[Frame]]]]:
+	if isinstance(executor, ProcessPoolExecutor):
+		return executor.submit(process_ring_frames_in_process, source_paths, slot_indices, frame_number)
+	return executor.submit(process_ring_frames, source_face, reference_faces, frame_ring, slot_indices, frame_number)
+
+
+def init_pipe_process_worker(process_state : ProcessState, frame_ring_name : str, video_resolution : Resolution, slot_total : int) -> None:
+	global PROCESS_FRAME_RING
+
+	init_process_worker(process_state, [])
+	PROCESS_FRAME_RING = attach_frame_ring(frame_ring_name, video_resolution, slot_total)
+
+
+def process_ring_frames_in_process(source_paths : List[str], slot_indices : List[int], frame_number : int) -> List[Tuple[int, Optional[Frame]]]:
+	source_frames = read_static_images(source_paths)
+	source_face = get_average_face(source_frames)
+	reference_faces = get_reference_faces() if 'reference' in fan.globals.face_selector_mode else None
+	results = process_ring_frames(source_face, reference_faces, PROCESS_FRAME_RING, slot_indices, frame_number)
+	flush_face_cache()
+	return results
+
+
+def process_ring_frames(source_face : Face, reference_faces : FaceSet, frame_ring : FrameRing, slot_indices : List[int], frame_number : int) -> List[Tuple[int, Optional[Frame]]]:
+	slot_frames = frame_ring.get('frames')
+	frame_numbers = list(range(frame_number, frame_number + len(slot_indices)))
+	result_frames = process_chain_frame_batch(source_face, reference_faces, [ slot_frames[slot_index] for slot_index in slot_indices ], frame_numbers)
+	results : List[Tuple[int, Optional[Frame]]] = []
+	for slot_index, result_frame in zip(slot_indices, result_frames):
+		if result_frame.shape == slot_frames[slot_index].shape:
+			slot_frames[slot_index] = result_frame
+			results.append((slot_index, None))
+		else:
+			results.append((slot_index, result_frame))
+	return results
+
+
+def decode_frames(decoder : subprocess.Popen[bytes], frame_ring : FrameRing, queue_decode_frames : Queue[Optional[int]]) -> bool:
+	is_decoded = False
+	try:
+		slot_index = acquire_frame_slot(frame_ring)
+		while slot_index is not None:
+			slot_frame = frame_ring.get('frames')[slot_index]
+			if cast(BufferedReader, decoder.stdout).readinto(slot_frame) != slot_frame.nbytes:
+				release_frame_slot(frame_ring, slot_index)
+				is_decoded = True
+				break
+			queue_decode_frames.put(slot_index)
+			slot_index = acquire_frame_slot(frame_ring)
+	finally:
+		if not is_decoded:
+			decoder.kill()
+		frame_ring.get('closed').set()
+		queue_decode_frames.put(None)
+	return decoder.wait() == 0
+
+
+def encode_frames(target_path : str, fps : float, frame_ring : FrameRing, queue_encode_frames : Queue[Optional[Tuple[int, Optional[Frame]]]], update_progress : Update_Process) -> bool:
+	encoder = None
+	is_encoding = True
+	try:
+		result = queue_encode_frames.get()
+		while result is not None:
+			slot_index, temp_frame = result
+			if temp_frame is None:
+				temp_frame = frame_ring.get('frames')[slot_index]
+			if encoder is None:
+				height, width = temp_frame.shape[:2]
+				encoder = open_frames_encoder(target_path, fps, (width, height))
+			if is_encoding:
+				try:
+					encoder.stdin.write(numpy.ascontiguousarray(temp_frame).data)
+				except OSError:
+					is_encoding = False
+			release_frame_slot(frame_ring, slot_index)
+			update_progress()
+			result = queue_encode_frames.get()
+	finally:
+		frame_ring.get('closed').set()
+	if encoder:
+		try:
+			encoder.stdin.close()
+		except OSError:
+			is_encoding = False
+		return encoder.wait() == 0 and is_encoding
+	return False
+
+
+def process_chain_frames(source_paths : List[str], temp_frame_paths : List[str], update_progress : Update_Process) -> None:
+	source_frames = read_static_images(source_paths)
+	source_face = get_average_face(source_frames)
+	reference_faces = get_reference_faces() if 'reference' in fan.globals.face_selector_mode else None
+	for index in range(0, len(temp_frame_paths), fan.globals.face_detector_batch_size):
+		batch_temp_frame_paths = temp_frame_paths[index:index + fan.globals.face_detector_batch_size]
+		temp_frames = [ read_image(temp_frame_path) for temp_frame_path in batch_temp_frame_paths ]
+		frame_numbers = [ get_temp_frame_number(temp_frame_path) for temp_frame_path in batch_temp_frame_paths ]
+		for temp_frame_path, result_frame in zip(batch_temp_frame_paths, process_chain_frame_batch(source_face, reference_faces, temp_frames, frame_numbers)):
+			write_image(temp_frame_path, result_frame)
+			update_progress()
+
+
+def process_chain_frame_batch(source_face : Face, reference_faces : FaceSet, temp_frames : List[Frame], frame_numbers : List[Optional[int]]) -> List[Frame]:
+	result_frames = []
+	if has_face_processors(fan.globals.frame_processors):
+		prime_many_faces(temp_frames, frame_numbers)
+	try:
+		for temp_frame, frame_number in zip(temp_frames, frame_numbers):
+			set_video_frame(temp_frame, frame_number)
+			result_frames.append(process_chain_frame(source_face, reference_faces, temp_frame))
+	finally:
+		set_video_frame(None, None)
+	return result_frames
+
+
+def process_chain_frame(source_face : Face, reference_faces : FaceSet, temp_frame : Frame) -> Frame:
+	many_faces = None
+	if has_face_processors(fan.globals.frame_processors):
+		get_many_faces(temp_frame)
+		many_faces = get_static_faces(temp_frame)
+	open_mask_cache()
+	try:
+		for frame_processor_module in get_frame_processors_modules(fan.globals.frame_processors):
+			temp_frame_shape = temp_frame.shape
+			temp_frame = frame_processor_module.process_frame(source_face, reference_faces, temp_frame)
+			if temp_frame.shape != temp_frame_shape:
+				many_faces = None
+				close_mask_cache()
+			if many_faces is not None:
+				set_static_faces(temp_frame, many_faces)
+	finally:
+		close_mask_cache()
+	return temp_frame
+
+
+def is_first_frame_processor(frame_processor_name : str) -> bool:
+	frame_processors_modules = get_frame_processors_modules(fan.globals.frame_processors)
+	return bool(frame_processors_modules) and frame_processors_modules[0].NAME == frame_processor_name
+
+
+def has_face_processors(frame_processors : List[str]) -> bool:
+	return any(frame_processor.startswith('face_') for frame_processor in frame_processors)
+
+
+def count_pipe_frame_total(target_path : str, fps : float) -> int:
+	video_frame_total = count_video_frame_total(target_path)
+	video_fps = detect_fps(target_path)
+	trim_frame_start = fan.globals.trim_frame_start or 0
+	trim_frame_end = fan.globals.trim_frame_end or video_frame_total
+	if video_fps:
+		return max(round((trim_frame_end - trim_frame_start) * fps / video_fps), 0)
+	return 0
@@ -1,10 +1,17 @@
 from typing import List, Optional
 
-from fan.processors.frame.typings import FaceSwapperModel, FaceEnhancerModel, FrameEnhancerModel, FaceDebuggerItem
+from fan.processors.frame.typings import FaceSwapperModel, FaceEnhancerModel, FrameEnhancerModel, FaceDebuggerItem, FaceSwapperMapping
 
 face_swapper_model : Optional[FaceSwapperModel] = None
+face_swapper_batch_size : Optional[int] = None
+face_swapper_batch_latency : Optional[int] = None
+face_swapper_mapping : Optional[List[FaceSwapperMapping]] = None
 face_enhancer_model : Optional[FaceEnhancerModel] = None
 face_enhancer_blend : Optional[int] = None
 frame_enhancer_model : Optional[FrameEnhancerModel] = None
 frame_enhancer_blend : Optional[int] = None
+frame_enhancer_tile_size : Optional[int] = None
+frame_enhancer_tile_overlap : Optional[int] = None
+frame_enhancer_batch_size : Optional[int] = None
+frame_enhancer_batch_latency : Optional[int] = None
 face_debugger_items : Optional[List[FaceDebuggerItem]] = None
@@ -6,13 +6,14 @@ import numpy
 import fan.globals
 import fan.processors.frame.core as frame_processors
 from fan import wording
-from fan.face_analyser import get_one_face, get_average_face, get_many_faces, find_similar_faces, clear_face_analyser
+from fan.face_analyser import get_one_face, get_average_face, get_many_faces, find_similar_faces, clear_face_analyser, set_video_frame
 from fan.face_store import get_reference_faces
 from fan.content_analyser import clear_content_analyser
+from fan.filesystem import get_temp_frame_number
 from fan.typing import Face, FaceSet, Frame, Update_Process, ProcessMode
 from fan.vision import read_image, read_static_image, read_static_images, write_image
 from fan.face_helper import warp_face
-from fan.face_masker import create_static_box_mask, create_occlusion_mask, create_region_mask, clear_face_occluder, clear_face_parser
+from fan.face_masker import create_static_box_mask, get_occlusion_masks, get_region_masks, clear_face_occluder, clear_face_parser
 from fan.processors.frame import globals as frame_processors_globals, choices as frame_processors_choices
 
 NAME = __name__.upper()
@@ -74,9 +75,9 @@ def debug_face(source_face : Face, target_face : Face, temp_frame : Frame) -> Fr
 		if 'box' in fan.globals.face_mask_types:
 			crop_mask_list.append(create_static_box_mask(crop_frame.shape[:2][::-1], 0, fan.globals.face_mask_padding))
 		if 'occlusion' in fan.globals.face_mask_types:
-			crop_mask_list.append(create_occlusion_mask(crop_frame))
+			crop_mask_list.extend(get_occlusion_masks([ crop_frame ], [ target_face.kps ], [ affine_matrix ]))
 		if 'region' in fan.globals.face_mask_types:
-			crop_mask_list.append(create_region_mask(crop_frame, fan.globals.face_mask_regions))
+			crop_mask_list.extend(get_region_masks([ crop_frame ], [ target_face.kps ], [ affine_matrix ], fan.globals.face_mask_regions))
 		crop_mask = numpy.minimum.reduce(crop_mask_list).clip(0, 1)
 		crop_mask = (crop_mask * 255).astype(numpy.uint8)
 		inverse_mask_frame = cv2.warpAffine(crop_mask, inverse_matrix, temp_frame_size)
@@ -122,11 +123,14 @@ def process_frames(source_paths : List[str], temp_frame_paths : List[str], updat
 	source_frames = read_static_images(source_paths)
 	source_face = get_average_face(source_frames)
 	reference_faces = get_reference_faces() if 'reference' in fan.globals.face_selector_mode else None
+	is_target_frame = frame_processors.is_first_frame_processor(NAME)
 	for temp_frame_path in temp_frame_paths:
 		temp_frame = read_image(temp_frame_path)
+		set_video_frame(temp_frame, get_temp_frame_number(temp_frame_path), is_target_frame)
 		result_frame = process_frame(source_face, reference_faces, temp_frame)
 		write_image(temp_frame_path, result_frame)
 		update_progress()
+	set_video_frame(None, None)
 
 
 def process_image(source_paths : List[str], target_path : str, output_path : str) -> None:
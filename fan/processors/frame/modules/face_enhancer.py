@@ -1,28 +1,26 @@
 from typing import Any, List, Literal, Optional
 from argparse import ArgumentParser
-import cv2
 import threading
 import numpy
-import onnxruntime
 
 import fan.globals
 import fan.processors.frame.core as frame_processors
 from fan import logger, wording
-from fan.face_analyser import get_many_faces, clear_face_analyser, find_similar_faces, get_one_face
-from fan.face_helper import warp_face, paste_back
+from fan.face_analyser import get_many_faces, clear_face_analyser, find_similar_faces, get_one_face, set_video_frame
+from fan.face_helper import warp_face, paste_back_into
 from fan.content_analyser import clear_content_analyser
 from fan.face_store import get_reference_faces
 from fan.typing import Face, FaceSet, Frame, Update_Process, ProcessMode, ModelSet, OptionsWithModel
 from fan.common_helper import create_metavar
-from fan.filesystem import is_file, is_image, is_video, resolve_relative_path
+from fan.filesystem import is_file, is_image, is_video, resolve_relative_path, get_temp_frame_number
 from fan.download import conditional_download, is_download_done
+from fan.inference_manager import get_inference_session, run_inference_session
 from fan.vision import read_image, read_static_image, write_image
 from fan.processors.frame import globals as frame_processors_globals
 from fan.processors.frame import choices as frame_processors_choices
-from fan.face_masker import create_static_box_mask, create_occlusion_mask, clear_face_occluder
+from fan.face_masker import create_static_box_mask, get_occlusion_masks, clear_face_occluder
 
 FRAME_PROCESSOR = None
-THREAD_SEMAPHORE : threading.Semaphore = threading.Semaphore()
 THREAD_LOCK : threading.Lock = threading.Lock()
 NAME = __name__.upper()
 MODELS : ModelSet =\
@@ -86,7 +84,7 @@ def get_frame_processor() -> Any:
 	with THREAD_LOCK:
 		if FRAME_PROCESSOR is None:
 			model_path = get_options('model').get('path')
-			FRAME_PROCESSOR = onnxruntime.InferenceSession(model_path, providers = fan.globals.execution_providers)
+			FRAME_PROCESSOR = get_inference_session(model_path)
 	return FRAME_PROCESSOR
 
 
@@ -158,17 +156,34 @@ def post_process() -> None:
 	read_static_image.cache_clear()
 
 
-def enhance_face(target_face: Face, temp_frame: Frame) -> Frame:
-	frame_processor = get_frame_processor()
+def enhance_face(target_face : Face, temp_frame : Frame) -> Frame:
+	return enhance_faces([ target_face ], temp_frame)
+
+
+def enhance_faces(target_faces : List[Face], temp_frame : Frame) -> Frame:
 	model_template = get_options('model').get('template')
 	model_size = get_options('model').get('size')
-	crop_frame, affine_matrix = warp_face(temp_frame, target_face.kps, model_template, model_size)
-	crop_mask_list =\
-	[
-		create_static_box_mask(crop_frame.shape[:2][::-1], fan.globals.face_mask_blur, (0, 0, 0, 0))
-	]
+	crop_frames = []
+	affine_matrices = []
+	crop_mask_lists = []
+	for target_face in target_faces:
+		crop_frame, affine_matrix = warp_face(temp_frame, target_face.kps, model_template, model_size)
+		crop_frames.append(crop_frame)
+		affine_matrices.append(affine_matrix)
+		crop_mask_lists.append([ create_static_box_mask(crop_frame.shape[:2][::-1], fan.globals.face_mask_blur, (0, 0, 0, 0)) ])
 	if 'occlusion' in fan.globals.face_mask_types:
-		crop_mask_list.append(create_occlusion_mask(crop_frame))
+		for crop_mask_list, occlusion_mask in zip(crop_mask_lists, get_occlusion_masks(crop_frames, [ target_face.kps for target_face in target_faces ], affine_matrices)):
+			crop_mask_list.append(occlusion_mask)
+	temp_frame = temp_frame.copy()
+	for crop_frame, affine_matrix, crop_mask_list in zip(crop_frames, affine_matrices, crop_mask_lists):
+		crop_frame = enhance_crop_frame(crop_frame)
+		crop_mask = numpy.minimum.reduce(crop_mask_list).clip(0, 1) * (frame_processors_globals.face_enhancer_blend / 100)
+		paste_back_into(temp_frame, crop_frame, crop_mask, affine_matrix)
+	return temp_frame
+
+
+def enhance_crop_frame(crop_frame : Frame) -> Frame:
+	frame_processor = get_frame_processor()
 	crop_frame = prepare_crop_frame(crop_frame)
 	frame_processor_inputs = {}
 	for frame_processor_input in frame_processor.get_inputs():
@@ -176,13 +191,8 @@ def enhance_face(target_face: Face, temp_frame: Frame) -> Frame:
 			frame_processor_inputs[frame_processor_input.name] = crop_frame
 		if frame_processor_input.name == 'weight':
 			frame_processor_inputs[frame_processor_input.name] = numpy.array([ 1 ], dtype = numpy.double)
-	with THREAD_SEMAPHORE:
-		crop_frame = frame_processor.run(None, frame_processor_inputs)[0][0]
-	crop_frame = normalize_crop_frame(crop_frame)
-	crop_mask = numpy.minimum.reduce(crop_mask_list).clip(0, 1)
-	paste_frame = paste_back(temp_frame, crop_frame, crop_mask, affine_matrix)
-	temp_frame = blend_frame(temp_frame, paste_frame)
-	return temp_frame
+	crop_frame = run_inference_session(frame_processor, frame_processor_inputs)[0][0]
+	return normalize_crop_frame(crop_frame)
 
 
 def prepare_crop_frame(crop_frame : Frame) -> Frame:
@@ -201,12 +211,6 @@ def normalize_crop_frame(crop_frame : Frame) -> Frame:
 	return crop_frame
 
 
-def blend_frame(temp_frame : Frame, paste_frame : Frame) -> Frame:
-	face_enhancer_blend = 1 - (frame_processors_globals.face_enhancer_blend / 100)
-	temp_frame = cv2.addWeighted(temp_frame, face_enhancer_blend, paste_frame, 1 - face_enhancer_blend, 0)
-	return temp_frame
-
-
 def get_reference_frame(source_face : Face, target_face : Face, temp_frame : Frame) -> Optional[Frame]:
 	return enhance_face(target_face, temp_frame)
 
@@ -215,8 +219,7 @@ def process_frame(source_face : Face, reference_faces : FaceSet, temp_frame : Fr
 	if 'reference' in fan.globals.face_selector_mode:
 		similar_faces = find_similar_faces(temp_frame, reference_faces, fan.globals.reference_face_distance)
 		if similar_faces:
-			for similar_face in similar_faces:
-				temp_frame = enhance_face(similar_face, temp_frame)
+			temp_frame = enhance_faces(similar_faces, temp_frame)
 	if 'one' in fan.globals.face_selector_mode:
 		target_face = get_one_face(temp_frame)
 		if target_face:
@@ -224,18 +227,20 @@ def process_frame(source_face : Face, reference_faces : FaceSet, temp_frame : Fr
 	if 'many' in fan.globals.face_selector_mode:
 		many_faces = get_many_faces(temp_frame)
 		if many_faces:
-			for target_face in many_faces:
-				temp_frame = enhance_face(target_face, temp_frame)
+			temp_frame = enhance_faces(many_faces, temp_frame)
 	return temp_frame
 
 
 def process_frames(source_path : List[str], temp_frame_paths : List[str], update_progress : Update_Process) -> None:
 	reference_faces = get_reference_faces() if 'reference' in fan.globals.face_selector_mode else None
+	is_target_frame = frame_processors.is_first_frame_processor(NAME)
 	for temp_frame_path in temp_frame_paths:
 		temp_frame = read_image(temp_frame_path)
+		set_video_frame(temp_frame, get_temp_frame_number(temp_frame_path), is_target_frame)
 		result_frame = process_frame(None, reference_faces, temp_frame)
 		write_image(temp_frame_path, result_frame)
 		update_progress()
+	set_video_frame(None, None)
 
 
 def process_image(source_path : str, target_path : str, output_path : str) -> None:
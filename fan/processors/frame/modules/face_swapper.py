@@ -3,26 +3,32 @@ from argparse import ArgumentParser
 import threading
 import numpy
 import onnx
-import onnxruntime
 from onnx import numpy_helper
 
 import fan.globals
 import fan.processors.frame.core as frame_processors
 from fan import logger, wording
-from fan.face_analyser import get_one_face, get_average_face, get_many_faces, find_similar_faces, clear_face_analyser
-from fan.face_helper import warp_face, paste_back
+from fan.face_analyser import get_one_face, get_average_face, get_many_faces, find_similar_faces, get_reference_index, calc_face_distances, clear_face_analyser, set_video_frame
+from fan.face_helper import warp_face, paste_back_into
+from fan.batcher import collect_and_run
 from fan.face_store import get_reference_faces
 from fan.content_analyser import clear_content_analyser
 from fan.typing import Face, FaceSet, Frame, Update_Process, ProcessMode, ModelSet, OptionsWithModel, Embedding
-from fan.filesystem import is_file, is_image, are_images, is_video, resolve_relative_path
+from fan.common_helper import create_metavar
+from fan.filesystem import is_file, is_image, are_images, is_video, resolve_relative_path, get_temp_frame_number
 from fan.download import conditional_download, is_download_done
+from fan.inference_manager import get_inference_session
+from fan.capturer import get_video_frame
 from fan.vision import read_image, read_static_image, read_static_images, write_image
 from fan.processors.frame import globals as frame_processors_globals
 from fan.processors.frame import choices as frame_processors_choices
-from fan.face_masker import create_static_box_mask, create_occlusion_mask, create_region_mask, clear_face_occluder, clear_face_parser
+from fan.processors.frame.typings import FaceSwapperMapping, FaceSwapperMappingTable, FaceSwapperSourceInput
+from fan.face_masker import create_static_box_mask, get_occlusion_masks, get_region_masks, clear_face_occluder, clear_face_parser
 
 FRAME_PROCESSOR = None
 MODEL_MATRIX = None
+MAPPING_TABLE : Optional[FaceSwapperMappingTable] = None
+SOURCE_INPUT : Optional[FaceSwapperSourceInput] = None
 THREAD_LOCK : threading.Lock = threading.Lock()
 NAME = __name__.upper()
 MODELS : ModelSet =\
@@ -87,7 +93,7 @@ def get_frame_processor() -> Any:
 	with THREAD_LOCK:
 		if FRAME_PROCESSOR is None:
 			model_path = get_options('model').get('path')
-			FRAME_PROCESSOR = onnxruntime.InferenceSession(model_path, providers = fan.globals.execution_providers)
+			FRAME_PROCESSOR = get_inference_session(model_path)
 	return FRAME_PROCESSOR
 
 
@@ -114,6 +120,71 @@ def clear_model_matrix() -> None:
 	MODEL_MATRIX = None
 
 
+def get_mapping_table() -> FaceSwapperMappingTable:
+	global MAPPING_TABLE
+
+	with THREAD_LOCK:
+		if MAPPING_TABLE is None:
+			MAPPING_TABLE = create_mapping_table(fan.globals.source_paths, frame_processors_globals.face_swapper_mapping)
+	return MAPPING_TABLE
+
+
+def clear_mapping_table() -> None:
+	global MAPPING_TABLE
+
+	MAPPING_TABLE = None
+
+
+def get_source_input(source_path : str, source_face : Face) -> Any:
+	global SOURCE_INPUT
+
+	source_key = (frame_processors_globals.face_swapper_model, source_path, source_face.kps.tobytes(), source_face.embedding.tobytes())
+	source_input = SOURCE_INPUT
+	if source_input is None or source_input.get('key') != source_key:
+		source_input =\
+		{
+			'key': source_key,
+			'source_input': prepare_source_input(source_path, source_face)
+		}
+		source_input.get('source_input').flags.writeable = False
+		SOURCE_INPUT = source_input
+	return source_input.get('source_input')
+
+
+def clear_source_input() -> None:
+	global SOURCE_INPUT
+
+	SOURCE_INPUT = None
+
+
+def create_mapping_table(source_paths : List[str], face_swapper_mapping : List[FaceSwapperMapping]) -> FaceSwapperMappingTable:
+	many_faces = get_many_faces(read_mapping_frame())
+	reference_faces = {}
+	source_inputs = []
+	for mapping_index, (source_index, reference_position) in enumerate(face_swapper_mapping):
+		if reference_position in range(len(many_faces)):
+			source_path = source_paths[source_index]
+			source_face = get_average_face([ read_static_image(source_path) ])
+			reference_faces[str(mapping_index)] = [ many_faces[reference_position] ]
+			source_inputs.append(prepare_source_input(source_path, source_face))
+	return\
+	{
+		'reference_faces': reference_faces,
+		'source_inputs': numpy.concatenate(source_inputs) if source_inputs else None
+	}
+
+
+def read_mapping_frame() -> Optional[Frame]:
+	if is_video(fan.globals.target_path):
+		return get_video_frame(fan.globals.target_path, fan.globals.reference_frame_number)
+	return read_static_image(fan.globals.target_path)
+
+
+def parse_face_swapper_mapping(value : str) -> FaceSwapperMapping:
+	source_index, reference_position = value.split(':')
+	return int(source_index), int(reference_position)
+
+
 def get_options(key : Literal['model']) -> Any:
 	global OPTIONS
 
@@ -133,11 +204,17 @@ def set_options(key : Literal['model'], value : Any) -> None:
 
 def register_args(program : ArgumentParser) -> None:
 	program.add_argument('--face-swapper-model', help = wording.get('frame_processor_model_help'), default = 'inswapper_128', choices = frame_processors_choices.face_swapper_models)
+	program.add_argument('--face-swapper-batch-size', help = wording.get('frame_processor_batch_size_help'), type = int, default = 1, choices = frame_processors_choices.face_swapper_batch_size_range, metavar = create_metavar(frame_processors_choices.face_swapper_batch_size_range))
+	program.add_argument('--face-swapper-batch-latency', help = wording.get('frame_processor_batch_latency_help'), type = int, default = 0, choices = frame_processors_choices.face_swapper_batch_latency_range, metavar = create_metavar(frame_processors_choices.face_swapper_batch_latency_range))
+	program.add_argument('--face-swapper-mapping', help = wording.get('face_swapper_mapping_help'), type = parse_face_swapper_mapping, nargs = '+', metavar = 'SOURCE_INDEX:REFERENCE_POSITION')
 
 
 def apply_args(program : ArgumentParser) -> None:
 	args = program.parse_args()
 	frame_processors_globals.face_swapper_model = args.face_swapper_model
+	frame_processors_globals.face_swapper_batch_size = args.face_swapper_batch_size
+	frame_processors_globals.face_swapper_batch_latency = args.face_swapper_batch_latency
+	frame_processors_globals.face_swapper_mapping = args.face_swapper_mapping
 	if args.face_swapper_model == 'blendswap_256':
 		fan.globals.face_recognizer_model = 'arcface_blendswap'
 	if args.face_swapper_model == 'inswapper_128' or args.face_swapper_model == 'inswapper_128_fp16':
@@ -170,9 +247,20 @@ def pre_process(mode : ProcessMode) -> bool:
 		if not get_one_face(source_frame):
 			logger.error(wording.get('no_source_face_detected') + wording.get('exclamation_mark'), NAME)
 			return False
+	if frame_processors_globals.face_swapper_mapping and 'reference' not in fan.globals.face_selector_mode:
+		logger.error(wording.get('face_swapper_mapping_mode_invalid') + wording.get('exclamation_mark'), NAME)
+		return False
+	if frame_processors_globals.face_swapper_mapping and any(source_index not in range(len(fan.globals.source_paths)) for source_index, _ in frame_processors_globals.face_swapper_mapping):
+		logger.error(wording.get('face_swapper_mapping_source_missing') + wording.get('exclamation_mark'), NAME)
+		return False
 	if mode in [ 'output', 'preview' ] and not is_image(fan.globals.target_path) and not is_video(fan.globals.target_path):
 		logger.error(wording.get('select_image_or_video_target') + wording.get('exclamation_mark'), NAME)
 		return False
+	if mode in [ 'output', 'preview' ] and frame_processors_globals.face_swapper_mapping:
+		reference_face_total = len(get_many_faces(read_mapping_frame()))
+		if any(reference_position not in range(reference_face_total) for _, reference_position in frame_processors_globals.face_swapper_mapping):
+			logger.error(wording.get('face_swapper_mapping_reference_missing') + wording.get('exclamation_mark'), NAME)
+			return False
 	if mode == 'output' and not fan.globals.output_path:
 		logger.error(wording.get('select_file_or_directory_output') + wording.get('exclamation_mark'), NAME)
 		return False
@@ -182,6 +270,8 @@ def pre_process(mode : ProcessMode) -> bool:
 def post_process() -> None:
 	clear_frame_processor()
 	clear_model_matrix()
+	clear_mapping_table()
+	clear_source_input()
 	clear_face_analyser()
 	clear_content_analyser()
 	clear_face_occluder()
@@ -190,37 +280,82 @@ def post_process() -> None:
 
 
 def swap_face(source_face : Face, target_face : Face, temp_frame : Frame) -> Frame:
+	return swap_faces(source_face, [ target_face ], temp_frame)
+
+
+def swap_faces(source_face : Face, target_faces : List[Face], temp_frame : Frame) -> Frame:
+	source_input = get_source_input(fan.globals.source_paths[0], source_face)
+	return apply_swaps([ source_input ] * len(target_faces), target_faces, temp_frame)
+
+
+def swap_mapped_faces(temp_frame : Frame) -> Frame:
+	mapping_table = get_mapping_table()
+	many_faces = get_many_faces(temp_frame)
+	if not many_faces or not mapping_table.get('reference_faces'):
+		return temp_frame
+	reference_index = get_reference_index(mapping_table.get('reference_faces'))
+	if not reference_index.get('faces'):
+		return temp_frame
+	face_distances = calc_face_distances(many_faces, reference_index)
+	source_inputs = []
+	target_faces = []
+	for face, reference_face_index, face_distance in zip(many_faces, face_distances.argmin(axis = 1), face_distances.min(axis = 1)):
+		if face_distance < fan.globals.reference_face_distance:
+			mapping_index = reference_index.get('set_indices')[reference_face_index]
+			source_inputs.append(mapping_table.get('source_inputs')[mapping_index:mapping_index + 1])
+			target_faces.append(face)
+	return apply_swaps(source_inputs, target_faces, temp_frame)
+
+
+def apply_swaps(source_inputs : List[Any], target_faces : List[Face], temp_frame : Frame) -> Frame:
 	frame_processor = get_frame_processor()
 	model_template = get_options('model').get('template')
 	model_size = get_options('model').get('size')
-	model_type = get_options('model').get('type')
-	crop_frame, affine_matrix = warp_face(temp_frame, target_face.kps, model_template, model_size)
-	crop_mask_list = []
-	if 'box' in fan.globals.face_mask_types:
-		crop_mask_list.append(create_static_box_mask(crop_frame.shape[:2][::-1], fan.globals.face_mask_blur, fan.globals.face_mask_padding))
+	crop_frames = []
+	affine_matrices = []
+	crop_mask_lists = []
+	for target_face in target_faces:
+		crop_frame, affine_matrix = warp_face(temp_frame, target_face.kps, model_template, model_size)
+		crop_mask_list = []
+		if 'box' in fan.globals.face_mask_types:
+			crop_mask_list.append(create_static_box_mask(crop_frame.shape[:2][::-1], fan.globals.face_mask_blur, fan.globals.face_mask_padding))
+		crop_frames.append(crop_frame)
+		affine_matrices.append(affine_matrix)
+		crop_mask_lists.append(crop_mask_list)
+	if not crop_frames:
+		return temp_frame
+	target_kps_list = [ target_face.kps for target_face in target_faces ]
 	if 'occlusion' in fan.globals.face_mask_types:
-		crop_mask_list.append(create_occlusion_mask(crop_frame))
-	crop_frame = prepare_crop_frame(crop_frame)
+		for crop_mask_list, occlusion_mask in zip(crop_mask_lists, get_occlusion_masks(crop_frames, target_kps_list, affine_matrices)):
+			crop_mask_list.append(occlusion_mask)
 	frame_processor_inputs = {}
 	for frame_processor_input in frame_processor.get_inputs():
 		if frame_processor_input.name == 'source':
-			if model_type == 'blendswap':
-				frame_processor_inputs[frame_processor_input.name] = prepare_source_frame(source_face)
-			else:
-				frame_processor_inputs[frame_processor_input.name] = prepare_source_embedding(source_face)
+			frame_processor_inputs[frame_processor_input.name] = numpy.concatenate(source_inputs)
 		if frame_processor_input.name == 'target':
-			frame_processor_inputs[frame_processor_input.name] = crop_frame
-	crop_frame = frame_processor.run(None, frame_processor_inputs)[0][0]
-	crop_frame = normalize_crop_frame(crop_frame)
+			frame_processor_inputs[frame_processor_input.name] = numpy.concatenate([ prepare_crop_frame(crop_frame) for crop_frame in crop_frames ])
+	batch_latency = frame_processors_globals.face_swapper_batch_latency / 1000
+	swap_frames = collect_and_run(frame_processor, frame_processor_inputs, frame_processors_globals.face_swapper_batch_size, batch_latency)
+	crop_frames = [ normalize_crop_frame(swap_frame) for swap_frame in swap_frames ]
 	if 'region' in fan.globals.face_mask_types:
-		crop_mask_list.append(create_region_mask(crop_frame, fan.globals.face_mask_regions))
-	crop_mask = numpy.minimum.reduce(crop_mask_list).clip(0, 1)
-	temp_frame = paste_back(temp_frame, crop_frame, crop_mask, affine_matrix)
+		for crop_mask_list, region_mask in zip(crop_mask_lists, get_region_masks(crop_frames, target_kps_list, affine_matrices, fan.globals.face_mask_regions)):
+			crop_mask_list.append(region_mask)
+	temp_frame = temp_frame.copy()
+	for crop_frame, affine_matrix, crop_mask_list in zip(crop_frames, affine_matrices, crop_mask_lists):
+		crop_mask = numpy.minimum.reduce(crop_mask_list).clip(0, 1)
+		paste_back_into(temp_frame, crop_frame, crop_mask, affine_matrix)
 	return temp_frame
 
 
-def prepare_source_frame(source_face : Face) -> Frame:
-	source_frame = read_static_image(fan.globals.source_paths[0])
+def prepare_source_input(source_path : str, source_face : Face) -> Any:
+	model_type = get_options('model').get('type')
+	if model_type == 'blendswap':
+		return prepare_source_frame(source_path, source_face)
+	return prepare_source_embedding(source_face)
+
+
+def prepare_source_frame(source_path : str, source_face : Face) -> Frame:
+	source_frame = read_static_image(source_path)
 	source_frame, _ = warp_face(source_frame, source_face.kps, 'arcface_112_v2', (112, 112))
 	source_frame = source_frame[:, :, ::-1] / 255.0
 	source_frame = source_frame.transpose(2, 0, 1)
@@ -262,10 +397,12 @@ def get_reference_frame(source_face : Face, target_face : Face, temp_frame : Fra
 
 def process_frame(source_face : Face, reference_faces : FaceSet, temp_frame : Frame) -> Frame:
 	if 'reference' in fan.globals.face_selector_mode:
-		similar_faces = find_similar_faces(temp_frame, reference_faces, fan.globals.reference_face_distance)
-		if similar_faces:
-			for similar_face in similar_faces:
-				temp_frame = swap_face(source_face, similar_face, temp_frame)
+		if frame_processors_globals.face_swapper_mapping:
+			temp_frame = swap_mapped_faces(temp_frame)
+		else:
+			similar_faces = find_similar_faces(temp_frame, reference_faces, fan.globals.reference_face_distance)
+			if similar_faces:
+				temp_frame = swap_faces(source_face, similar_faces, temp_frame)
 	if 'one' in fan.globals.face_selector_mode:
 		target_face = get_one_face(temp_frame)
 		if target_face:
@@ -273,8 +410,7 @@ def process_frame(source_face : Face, reference_faces : FaceSet, temp_frame : Fr
 	if 'many' in fan.globals.face_selector_mode:
 		many_faces = get_many_faces(temp_frame)
 		if many_faces:
-			for target_face in many_faces:
-				temp_frame = swap_face(source_face, target_face, temp_frame)
+			temp_frame = swap_faces(source_face, many_faces, temp_frame)
 	return temp_frame
 
 
@@ -282,11 +418,14 @@ def process_frames(source_paths : List[str], temp_frame_paths : List[str], updat
 	source_frames = read_static_images(source_paths)
 	source_face = get_average_face(source_frames)
 	reference_faces = get_reference_faces() if 'reference' in fan.globals.face_selector_mode else None
+	is_target_frame = frame_processors.is_first_frame_processor(NAME)
 	for temp_frame_path in temp_frame_paths:
 		temp_frame = read_image(temp_frame_path)
+		set_video_frame(temp_frame, get_temp_frame_number(temp_frame_path), is_target_frame)
 		result_frame = process_frame(source_face, reference_faces, temp_frame)
 		write_image(temp_frame_path, result_frame)
 		update_progress()
+	set_video_frame(None, None)
 
 
 def process_image(source_paths : List[str], target_path : str, output_path : str) -> None:
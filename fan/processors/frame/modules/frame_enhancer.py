@@ -1,9 +1,8 @@
-from typing import Any, List, Literal, Optional
+from typing import Any, List, Literal, Optional, Tuple
 from argparse import ArgumentParser
 import threading
 import cv2
-from basicsr.archs.rrdbnet_arch import RRDBNet
-from realesrgan import RealESRGANer
+import numpy
 
 import fan.globals
 import fan.processors.frame.core as frame_processors
@@ -12,35 +11,35 @@ from fan.face_analyser import clear_face_analyser
 from fan.content_analyser import clear_content_analyser
 from fan.typing import Face, FaceSet, Frame, Update_Process, ProcessMode, ModelSet, OptionsWithModel
 from fan.common_helper import create_metavar
-from fan.execution_helper import map_device
 from fan.filesystem import is_file, resolve_relative_path
 from fan.download import conditional_download, is_download_done
+from fan.batcher import collect_and_run
+from fan.inference_manager import get_inference_session
 from fan.vision import read_image, read_static_image, write_image
 from fan.processors.frame import globals as frame_processors_globals
 from fan.processors.frame import choices as frame_processors_choices
 
 FRAME_PROCESSOR = None
-THREAD_SEMAPHORE : threading.Semaphore = threading.Semaphore()
 THREAD_LOCK : threading.Lock = threading.Lock()
 NAME = __name__.upper()
 MODELS : ModelSet =\
 {
 	'real_esrgan_x2plus':
 	{
-		'url': 'https://github.com/facefusion/facefusion-assets/releases/download/models/real_esrgan_x2plus.pth',
-		'path': resolve_relative_path('../.assets/models/real_esrgan_x2plus.pth'),
+		'url': 'https://github.com/facefusion/facefusion-assets/releases/download/models/real_esrgan_x2plus.onnx',
+		'path': resolve_relative_path('../.assets/models/real_esrgan_x2plus.onnx'),
 		'scale': 2
 	},
 	'real_esrgan_x4plus':
 	{
-		'url': 'https://github.com/facefusion/facefusion-assets/releases/download/models/real_esrgan_x4plus.pth',
-		'path': resolve_relative_path('../.assets/models/real_esrgan_x4plus.pth'),
+		'url': 'https://github.com/facefusion/facefusion-assets/releases/download/models/real_esrgan_x4plus.onnx',
+		'path': resolve_relative_path('../.assets/models/real_esrgan_x4plus.onnx'),
 		'scale': 4
 	},
 	'real_esrnet_x4plus':
 	{
-		'url': 'https://github.com/facefusion/facefusion-assets/releases/download/models/real_esrnet_x4plus.pth',
-		'path': resolve_relative_path('../.assets/models/real_esrnet_x4plus.pth'),
+		'url': 'https://github.com/facefusion/facefusion-assets/releases/download/models/real_esrnet_x4plus.onnx',
+		'path': resolve_relative_path('../.assets/models/real_esrnet_x4plus.onnx'),
 		'scale': 4
 	}
 }
@@ -53,17 +52,7 @@ def get_frame_processor() -> Any:
 	with THREAD_LOCK:
 		if FRAME_PROCESSOR is None:
 			model_path = get_options('model').get('path')
-			model_scale = get_options('model').get('scale')
-			FRAME_PROCESSOR = RealESRGANer(
-				model_path = model_path,
-				model = RRDBNet(
-					num_in_ch = 3,
-					num_out_ch = 3,
-					scale = model_scale
-				),
-				device = map_device(fan.globals.execution_providers),
-				scale = model_scale
-			)
+			FRAME_PROCESSOR = get_inference_session(model_path)
 	return FRAME_PROCESSOR
 
 
@@ -93,12 +82,20 @@ def set_options(key : Literal['model'], value : Any) -> None:
 def register_args(program : ArgumentParser) -> None:
 	program.add_argument('--frame-enhancer-model', help = wording.get('frame_processor_model_help'), default = 'real_esrgan_x2plus', choices = frame_processors_choices.frame_enhancer_models)
 	program.add_argument('--frame-enhancer-blend', help = wording.get('frame_processor_blend_help'), type = int, default = 80, choices = frame_processors_choices.frame_enhancer_blend_range, metavar = create_metavar(frame_processors_choices.frame_enhancer_blend_range))
+	program.add_argument('--frame-enhancer-tile-size', help = wording.get('frame_processor_tile_size_help'), type = int, default = 256, choices = frame_processors_choices.frame_enhancer_tile_size_range, metavar = create_metavar(frame_processors_choices.frame_enhancer_tile_size_range))
+	program.add_argument('--frame-enhancer-tile-overlap', help = wording.get('frame_processor_tile_overlap_help'), type = int, default = 16, choices = frame_processors_choices.frame_enhancer_tile_overlap_range, metavar = create_metavar(frame_processors_choices.frame_enhancer_tile_overlap_range))
+	program.add_argument('--frame-enhancer-batch-size', help = wording.get('frame_processor_batch_size_help'), type = int, default = 4, choices = frame_processors_choices.frame_enhancer_batch_size_range, metavar = create_metavar(frame_processors_choices.frame_enhancer_batch_size_range))
+	program.add_argument('--frame-enhancer-batch-latency', help = wording.get('frame_processor_batch_latency_help'), type = int, default = 0, choices = frame_processors_choices.frame_enhancer_batch_latency_range, metavar = create_metavar(frame_processors_choices.frame_enhancer_batch_latency_range))
 
 
 def apply_args(program : ArgumentParser) -> None:
 	args = program.parse_args()
 	frame_processors_globals.frame_enhancer_model = args.frame_enhancer_model
 	frame_processors_globals.frame_enhancer_blend = args.frame_enhancer_blend
+	frame_processors_globals.frame_enhancer_tile_size = args.frame_enhancer_tile_size
+	frame_processors_globals.frame_enhancer_tile_overlap = args.frame_enhancer_tile_overlap
+	frame_processors_globals.frame_enhancer_batch_size = args.frame_enhancer_batch_size
+	frame_processors_globals.frame_enhancer_batch_latency = args.frame_enhancer_batch_latency
 
 
 def pre_check() -> bool:
@@ -132,10 +129,53 @@ def post_process() -> None:
 
 
 def enhance_frame(temp_frame : Frame) -> Frame:
-	with THREAD_SEMAPHORE:
-		paste_frame, _ = get_frame_processor().enhance(temp_frame)
-		temp_frame = blend_frame(temp_frame, paste_frame)
-	return temp_frame
+	frame_processor = get_frame_processor()
+	model_scale = get_options('model').get('scale')
+	tile_size = frame_processors_globals.frame_enhancer_tile_size
+	tile_overlap = frame_processors_globals.frame_enhancer_tile_overlap
+	tile_frames = create_tile_frames(temp_frame, tile_size, tile_overlap)
+	frame_processor_inputs =\
+	{
+		frame_processor.get_inputs()[0].name: prepare_tile_frames(tile_frames)
+	}
+	batch_latency = frame_processors_globals.frame_enhancer_batch_latency / 1000
+	tile_frames = normalize_tile_frames(collect_and_run(frame_processor, frame_processor_inputs, frame_processors_globals.frame_enhancer_batch_size, batch_latency))
+	paste_frame = merge_tile_frames(tile_frames, temp_frame.shape[:2], tile_size * model_scale, tile_overlap * model_scale, model_scale)
+	return blend_frame(temp_frame, paste_frame)
+
+
+def create_tile_frames(temp_frame : Frame, tile_size : int, tile_overlap : int) -> Frame:
+	tile_step = tile_size - 2 * tile_overlap
+	temp_frame_height, temp_frame_width = temp_frame.shape[:2]
+	pad_bottom = -temp_frame_height % tile_step
+	pad_right = -temp_frame_width % tile_step
+	pad_frame = cv2.copyMakeBorder(temp_frame, tile_overlap, tile_overlap + pad_bottom, tile_overlap, tile_overlap + pad_right, cv2.BORDER_REFLECT_101)
+	tile_frames = []
+	for top in range(0, temp_frame_height + pad_bottom, tile_step):
+		for left in range(0, temp_frame_width + pad_right, tile_step):
+			tile_frames.append(pad_frame[top:top + tile_size, left:left + tile_size])
+	return numpy.stack(tile_frames)
+
+
+def merge_tile_frames(tile_frames : Frame, temp_frame_size : Tuple[int, int], tile_size : int, tile_overlap : int, model_scale : int) -> Frame:
+	tile_step = tile_size - 2 * tile_overlap
+	temp_frame_height, temp_frame_width = temp_frame_size
+	row_total = -(-temp_frame_height * model_scale // tile_step)
+	column_total = -(-temp_frame_width * model_scale // tile_step)
+	merge_frames = tile_frames[:, tile_overlap:tile_overlap + tile_step, tile_overlap:tile_overlap + tile_step]
+	merge_frame = merge_frames.reshape(row_total, column_total, tile_step, tile_step, -1).transpose(0, 2, 1, 3, 4).reshape(row_total * tile_step, column_total * tile_step, -1)
+	return merge_frame[:temp_frame_height * model_scale, :temp_frame_width * model_scale]
+
+
+def prepare_tile_frames(tile_frames : Frame) -> Frame:
+	tile_frames = tile_frames[:, :, :, ::-1].transpose(0, 3, 1, 2)
+	return numpy.ascontiguousarray(tile_frames, dtype = numpy.float32) / 255.0
+
+
+def normalize_tile_frames(tile_frames : Frame) -> Frame:
+	tile_frames = tile_frames.clip(0, 1).transpose(0, 2, 3, 1)
+	tile_frames = (tile_frames * 255.0).round()
+	return tile_frames.astype(numpy.uint8)[:, :, :, ::-1]
 
 
 def blend_frame(temp_frame : Frame, paste_frame : Frame) -> Frame:
@@ -1,7 +1,21 @@
-from typing import Literal
+from typing import Any, Dict, List, Literal, Tuple, TypedDict
+
+from fan.typing import Face
 
 FaceSwapperModel = Literal['blendswap_256', 'inswapper_128', 'inswapper_128_fp16', 'simswap_256', 'simswap_512_unofficial']
 FaceEnhancerModel = Literal['codeformer', 'gfpgan_1.2', 'gfpgan_1.3', 'gfpgan_1.4', 'gpen_bfr_256', 'gpen_bfr_512', 'restoreformer']
 FrameEnhancerModel = Literal['real_esrgan_x2plus', 'real_esrgan_x4plus', 'real_esrnet_x4plus']
 
 FaceDebuggerItem = Literal['bbox', 'kps', 'face-mask', 'score']
+
+FaceSwapperMapping = Tuple[int, int]
+FaceSwapperMappingTable = TypedDict('FaceSwapperMappingTable',
+{
+	'reference_faces' : Dict[str, List[Face]],
+	'source_inputs' : Any
+})
+FaceSwapperSourceInput = TypedDict('FaceSwapperSourceInput',
+{
+	'key' : Tuple[Any, ...],
+	'source_input' : Any
+})
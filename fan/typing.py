@@ -1,10 +1,15 @@
-from typing import Any, Literal, Callable, List, Tuple, Dict, TypedDict
+from typing import Any, Literal, Callable, List, Optional, OrderedDict, Tuple, Dict, TypedDict
 from collections import namedtuple
+from queue import Queue
+import threading
 import numpy
 
 Bbox = numpy.ndarray[Any, Any]
 Kps = numpy.ndarray[Any, Any]
 Score = float
+Bboxes = numpy.ndarray[Any, Any]
+Kpss = numpy.ndarray[Any, Any]
+Scores = numpy.ndarray[Any, Any]
 Embedding = numpy.ndarray[Any, Any]
 Face = namedtuple('Face',
 [
@@ -19,14 +24,99 @@ Face = namedtuple('Face',
 FaceSet = Dict[str, List[Face]]
 FaceStore = TypedDict('FaceStore',
 {
-	'static_faces' : FaceSet,
+	'static_faces' : OrderedDict[str, List[Face]],
 	'reference_faces': FaceSet
 })
+FaceCacheShard = Tuple[numpy.ndarray[Any, Any], numpy.ndarray[Any, Any]]
+FaceCache = TypedDict('FaceCache',
+{
+	'key' : str,
+	'shards' : List[FaceCacheShard],
+	'shard_paths' : List[str],
+	'frames' : Dict[int, Tuple[int, int, int]],
+	'completions' : Dict[int, Tuple[bool, bool]],
+	'pending' : Dict[int, List[Face]]
+})
+FaceStoreStatistics = TypedDict('FaceStoreStatistics',
+{
+	'hits' : int,
+	'misses' : int,
+	'evictions' : int,
+	'memory' : int
+})
+WorkerStatistics = TypedDict('WorkerStatistics',
+{
+	'frame_total' : int,
+	'busy_time' : float
+})
+InferenceSessionStatistics = TypedDict('InferenceSessionStatistics',
+{
+	'model_path' : str,
+	'reuse_total' : int,
+	'concurrency' : int
+})
+TrackerState = TypedDict('TrackerState',
+{
+	'tracker_frame' : numpy.ndarray[Any, Any],
+	'faces' : List[Face],
+	'frame_counter' : int
+})
+AdaptiveState = TypedDict('AdaptiveState',
+{
+	'thumbnail' : numpy.ndarray[Any, Any],
+	'face_detector_resolution' : Tuple[int, int]
+})
+ReferenceIndex = TypedDict('ReferenceIndex',
+{
+	'faces' : List[Face],
+	'set_names' : List[str],
+	'set_indices' : numpy.ndarray[Any, Any],
+	'embeddings' : numpy.ndarray[Any, Any]
+})
+FrameRing = TypedDict('FrameRing',
+{
+	'shared_memory' : Any,
+	'frames' : Optional[numpy.ndarray[Any, Any]],
+	'free_slots' : Optional['Queue[int]'],
+	'closed' : threading.Event
+})
+VideoMetadata = TypedDict('VideoMetadata',
+{
+	'fps' : float,
+	'frame_total' : int,
+	'resolution' : Tuple[int, int],
+	'codec' : Optional[str],
+	'pix_fmt' : Optional[str],
+	'rotation' : int,
+	'audio_streams' : Optional[List[str]]
+})
+VideoCapture = TypedDict('VideoCapture',
+{
+	'video_capture' : Any,
+	'frame_total' : int,
+	'frame_position' : int,
+	'keyframe_indices' : Optional[List[int]]
+})
+ProcessState = TypedDict('ProcessState',
+{
+	'globals' : Dict[str, Any],
+	'frame_processors_globals' : Dict[str, Any],
+	'reference_faces' : FaceSet
+})
 Frame = numpy.ndarray[Any, Any]
 Mask = numpy.ndarray[Any, Any]
 Matrix = numpy.ndarray[Any, Any]
 Padding = Tuple[int, int, int, int]
 
+BatchInputs = Dict[str, numpy.ndarray[Any, Any]]
+BatchPayload = TypedDict('BatchPayload',
+{
+	'inputs' : BatchInputs,
+	'outputs' : Optional[numpy.ndarray[Any, Any]],
+	'exception' : Optional[Exception],
+	'taken' : bool
+})
+
 Update_Process = Callable[[], None]
 Process_Frames = Callable[[List[str], List[str], Update_Process], None]
 LogLevel = Literal['error',	'warn',	'info',	'debug']
@@ -42,6 +132,9 @@ FaceMaskType = Literal['box', 'occlusion', 'region']
 FaceMaskRegion = Literal['skin', 'left-eyebrow', 'right-eyebrow', 'left-eye', 'right-eye', 'eye-glasses', 'nose', 'mouth', 'upper-lip', 'lower-lip']
 TempFrameFormat = Literal['jpg', 'png']
 OutputVideoEncoder = Literal['libx264', 'libx265', 'libvpx-vp9', 'h264_nvenc', 'hevc_nvenc']
+VideoPipeline = Literal['disk', 'pipe']
+ExecutionPool = Literal['thread', 'process']
+Resolution = Tuple[int, int]
 
 ModelValue = Dict[str, Any]
 ModelSet = Dict[str, ModelValue]
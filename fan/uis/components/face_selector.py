@@ -6,7 +6,8 @@ import fan.globals
 import fan.choices
 from fan import wording
 from fan.face_store import clear_static_faces, clear_reference_faces
-from fan.vision import get_video_frame, read_static_image, normalize_frame_color
+from fan.capturer import get_video_frame
+from fan.vision import read_static_image, normalize_frame_color
 from fan.face_analyser import get_many_faces
 from fan.typing import Frame, FaceSelectorMode
 from fan.filesystem import is_image, is_video
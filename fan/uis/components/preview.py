@@ -7,7 +7,8 @@ from fan import wording
 from fan.core import conditional_append_reference_faces
 from fan.face_store import clear_static_faces, get_reference_faces, clear_reference_faces
 from fan.typing import Frame, Face, FaceSet
-from fan.vision import get_video_frame, count_video_frame_total, normalize_frame_color, resize_frame_dimension, read_static_image, read_static_images
+from fan.capturer import get_video_frame
+from fan.vision import count_video_frame_total, normalize_frame_color, resize_frame_dimension, read_static_image, read_static_images
 from fan.face_analyser import get_average_face, clear_face_analyser
 from fan.content_analyser import analyse_frame
 from fan.processors.frame.core import load_frame_processor_module
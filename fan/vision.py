@@ -1,41 +1,125 @@
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from functools import lru_cache
+import json
+import os
+import shutil
+import subprocess
 import cv2
+import filetype
 
-from fan.typing import Frame
+from fan.typing import Frame, Resolution, VideoMetadata
 
 
-def get_video_frame(video_path : str, frame_number : int = 0) -> Optional[Frame]:
-	if video_path:
-		video_capture = cv2.VideoCapture(video_path)
-		if video_capture.isOpened():
-			frame_total = video_capture.get(cv2.CAP_PROP_FRAME_COUNT)
-			video_capture.set(cv2.CAP_PROP_POS_FRAMES, min(frame_total, frame_number - 1))
-			has_frame, frame = video_capture.read()
-			video_capture.release()
-			if has_frame:
-				return frame
+def detect_video_metadata(video_path : str) -> Optional[VideoMetadata]:
+	if video_path and os.path.isfile(video_path):
+		video_stat = os.stat(video_path)
+		return probe_video_metadata(os.path.abspath(video_path), video_stat.st_mtime_ns, video_stat.st_size)
 	return None
 
 
+@lru_cache(maxsize = 32)
+def probe_video_metadata(video_path : str, video_mtime : int, video_size : int) -> Optional[VideoMetadata]:
+	if filetype.helpers.is_video(video_path):
+		if shutil.which('ffprobe'):
+			return probe_stream_metadata(video_path)
+		return probe_capture_metadata(video_path)
+	return None
+
+
+def probe_stream_metadata(video_path : str) -> Optional[VideoMetadata]:
+	commands = [ 'ffprobe', '-v', 'error', '-show_streams', '-show_format', '-of', 'json', video_path ]
+	try:
+		probe = json.loads(subprocess.run(commands, stdout = subprocess.PIPE, stderr = subprocess.PIPE, check = True).stdout)
+	except (subprocess.CalledProcessError, ValueError):
+		return None
+	streams = probe.get('streams', [])
+	video_streams = [ stream for stream in streams if stream.get('codec_type') == 'video' and not stream.get('disposition', {}).get('attached_pic') ]
+	if not video_streams:
+		return None
+	video_stream = video_streams[0]
+	fps = parse_frame_rate(video_stream.get('r_frame_rate')) or parse_frame_rate(video_stream.get('avg_frame_rate'))
+	frame_total = int(video_stream.get('nb_frames') or 0)
+	if not frame_total:
+		duration = float(video_stream.get('duration') or probe.get('format', {}).get('duration') or 0)
+		frame_total = round(duration * fps)
+	rotation = detect_stream_rotation(video_stream)
+	width = int(video_stream.get('width') or 0)
+	height = int(video_stream.get('height') or 0)
+	if rotation % 180:
+		width, height = height, width
+	return\
+	{
+		'fps': fps,
+		'frame_total': frame_total,
+		'resolution': (width, height),
+		'codec': video_stream.get('codec_name'),
+		'pix_fmt': video_stream.get('pix_fmt'),
+		'rotation': rotation,
+		'audio_streams': [ stream.get('codec_name') for stream in streams if stream.get('codec_type') == 'audio' ]
+	}
+
+
+def probe_capture_metadata(video_path : str) -> Optional[VideoMetadata]:
+	video_capture = cv2.VideoCapture(video_path)
+	video_metadata : Optional[VideoMetadata] = None
+	if video_capture.isOpened():
+		video_capture.set(cv2.CAP_PROP_ORIENTATION_AUTO, 0)
+		video_fourcc = int(video_capture.get(cv2.CAP_PROP_FOURCC))
+		rotation = int(video_capture.get(cv2.CAP_PROP_ORIENTATION_META)) % 360
+		width = int(video_capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+		height = int(video_capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+		if rotation % 180:
+			width, height = height, width
+		video_metadata =\
+		{
+			'fps': video_capture.get(cv2.CAP_PROP_FPS),
+			'frame_total': int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT)),
+			'resolution': (width, height),
+			'codec': video_fourcc.to_bytes(4, 'little').decode(errors = 'ignore').strip('\x00 ').lower() or None,
+			'pix_fmt': None,
+			'rotation': rotation,
+			'audio_streams': None
+		}
+	video_capture.release()
+	return video_metadata
+
+
+def parse_frame_rate(frame_rate : Optional[str]) -> float:
+	if frame_rate:
+		numerator, _, denominator = frame_rate.partition('/')
+		if float(denominator or 1):
+			return float(numerator) / float(denominator or 1)
+	return 0.0
+
+
+def detect_stream_rotation(video_stream : Dict[str, Any]) -> int:
+	for side_data in video_stream.get('side_data_list', []):
+		if 'rotation' in side_data:
+			return round(-float(side_data.get('rotation'))) % 360
+	return round(float(video_stream.get('tags', {}).get('rotate', 0))) % 360
+
+
 def detect_fps(video_path : str) -> Optional[float]:
-	if video_path:
-		video_capture = cv2.VideoCapture(video_path)
-		if video_capture.isOpened():
-			return video_capture.get(cv2.CAP_PROP_FPS)
+	video_metadata = detect_video_metadata(video_path)
+	if video_metadata:
+		return video_metadata.get('fps')
 	return None
 
 
 def count_video_frame_total(video_path : str) -> int:
-	if video_path:
-		video_capture = cv2.VideoCapture(video_path)
-		if video_capture.isOpened():
-			video_frame_total = int(video_capture.get(cv2.CAP_PROP_FRAME_COUNT))
-			video_capture.release()
-			return video_frame_total
+	video_metadata = detect_video_metadata(video_path)
+	if video_metadata:
+		return video_metadata.get('frame_total')
 	return 0
 
 
+def detect_video_resolution(video_path : str) -> Optional[Resolution]:
+	video_metadata = detect_video_metadata(video_path)
+	if video_metadata:
+		return video_metadata.get('resolution')
+	return None
+
+
 def normalize_frame_color(frame : Frame) -> Frame:
 	return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
@@ -8,8 +8,14 @@ WORDING =\
 	'target_help': 'select a target image or video',
 	'output_help': 'specify the output file or directory',
 	'frame_processors_help': 'choose from the available frame processors (choices: {choices}, ...)',
+	'fuse_frame_processors_help': 'run the whole frame processor chain on each frame in a single pass',
 	'frame_processor_model_help': 'choose the model for the frame processor',
 	'frame_processor_blend_help': 'specify the blend amount for the frame processor',
+	'frame_processor_batch_size_help': 'specify the batch size for the frame processor',
+	'frame_processor_tile_size_help': 'specify the tile size for the frame processor',
+	'frame_processor_tile_overlap_help': 'specify the tile overlap for the frame processor',
+	'frame_processor_batch_latency_help': 'specify the maximum time in milliseconds the frame processor waits to fill a batch',
+	'face_swapper_mapping_help': 'map source faces to reference faces using SOURCE_INDEX:REFERENCE_POSITION pairs',
 	'face_debugger_items_help': 'specify the face debugger items (choices: {choices})',
 	'ui_layouts_help': 'choose from the available ui layouts (choices: {choices}, ...)',
 	'keep_fps_help': 'preserve the frames per second (fps) of the target',
@@ -21,6 +27,10 @@ WORDING =\
 	'face_detector_model_help': 'specify the model used for the face detector',
 	'face_detector_size_help': 'specify the size threshold used for the face detector',
 	'face_detector_score_help': 'specify the score threshold used for the face detector',
+	'face_detector_batch_size_help': 'specify the number of frames the face detector processes at once when frames are streamed',
+	'face_detector_adaptive_help': 'detect faces at a coarse size first, keep it for the shot when faces are large and refine uncertain faces at the face detector size',
+	'face_tracker_interval_help': 'specify the number of frames between full face detections, tracking the faces in between',
+	'face_analyser_cache_help': 'persist the face analysis of the target to disk and reuse it on later runs',
 	'face_selector_mode_help': 'specify the mode for the face selector',
 	'reference_face_position_help': 'specify the position of the reference face',
 	'reference_face_distance_help': 'specify the distance between the reference face and the target face',
@@ -33,6 +43,7 @@ WORDING =\
 	'trim_frame_end_help': 'specify the end frame for extraction',
 	'temp_frame_format_help': 'specify the image format used for frame extraction',
 	'temp_frame_quality_help': 'specify the image quality used for frame extraction',
+	'video_pipeline_help': 'choose the pipeline used to move frames between decoding, processing and encoding',
 	'output_image_quality_help': 'specify the quality used for the output image',
 	'output_video_encoder_help': 'specify the encoder used for the output video',
 	'output_video_quality_help': 'specify the quality used for the output video',
@@ -40,22 +51,29 @@ WORDING =\
 	'execution_providers_help': 'choose from the available execution providers (choices: {choices}, ...)',
 	'execution_thread_count_help': 'specify the number of execution threads',
 	'execution_queue_count_help': 'specify the number of execution queries',
+	'execution_pool_help': 'choose whether the execution threads run as threads or as processes',
 	'skip_download_help': 'omit automate downloads and lookups',
 	'headless_help': 'run the program in headless mode',
 	'log_level_help': 'choose from the available log levels',
 	'creating_temp': 'Creating temporary resources',
 	'extracting_frames_fps': 'Extracting frames with {fps} FPS',
 	'analysing': 'Analysing',
+	'analysing_video_failed': 'Analysing video failed',
 	'processing': 'Processing',
 	'downloading': 'Downloading',
 	'temp_frames_not_found': 'Temporary frames not found',
 	'compressing_image': 'Compressing image',
 	'compressing_image_failed': 'Compressing image failed',
+	'piping_frames_fps': 'Piping frames with {fps} FPS',
+	'piping_frames_failed': 'Piping frames failed',
 	'merging_video_fps': 'Merging video with {fps} FPS',
 	'merging_video_failed': 'Merging video failed',
 	'skipping_audio': 'Skipping audio',
 	'restoring_audio': 'Restoring audio',
 	'restoring_audio_skipped': 'Restoring audio skipped',
+	'worker_statistics': 'Worker {worker} processed {frame_total} frames at {utilisation}% utilisation',
+	'inference_session_statistics': 'Inference session {model_name} reused {reuse_total} times with {concurrency} concurrent runs',
+	'face_store_statistics': 'Face store {hits} hits, {misses} misses, {evictions} evictions',
 	'clearing_temp': 'Clearing temporary resources',
 	'processing_image_succeed': 'Processing to image succeed',
 	'processing_image_failed': 'Processing to image failed',
@@ -67,6 +85,9 @@ WORDING =\
 	'select_image_or_video_target': 'Select an image or video for target path',
 	'select_file_or_directory_output': 'Select an file or directory for output path',
 	'no_source_face_detected': 'No source face detected',
+	'face_swapper_mapping_source_missing': 'Mapping points to a missing source',
+	'face_swapper_mapping_reference_missing': 'Mapping points to a missing reference face',
+	'face_swapper_mapping_mode_invalid': 'Mapping requires the reference face selector mode',
 	'frame_processor_not_loaded': 'Frame processor {frame_processor} could not be loaded',
 	'frame_processor_not_implemented': 'Frame processor {frame_processor} not implemented correctly',
 	'ui_layout_not_loaded': 'UI layout {ui_layout} could not be loaded',
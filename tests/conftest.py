@@ -0,0 +1,9 @@
+import subprocess
+import pytest
+
+
+@pytest.fixture(scope = 'session')
+def video_path(tmp_path_factory : pytest.TempPathFactory) -> str:
+	video_path = str(tmp_path_factory.mktemp('video') / 'target.mp4')
+	subprocess.run([ 'ffmpeg', '-hide_banner', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=size=160x120:rate=25:duration=4', '-c:v', 'libx264', '-g', '12', '-pix_fmt', 'yuv420p', '-y', video_path ], check = True)
+	return video_path
@@ -0,0 +1,82 @@
+from typing import Any, Dict, List
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import time
+import numpy
+import pytest
+
+import fan.globals
+from fan.batcher import has_dynamic_batch, run_in_batches, collect_and_run
+
+SessionInput = namedtuple('SessionInput', [ 'name', 'shape' ])
+
+
+class DoubleSession:
+	def __init__(self, batch_axis : Any, run_delay : float = 0) -> None:
+		self.batch_axis = batch_axis
+		self.run_delay = run_delay
+		self.batch_sizes : List[int] = []
+
+	def get_inputs(self) -> List[SessionInput]:
+		return [ SessionInput('input', [ self.batch_axis, 4 ]) ]
+
+	def run(self, output_names : Any, inputs : Dict[str, numpy.ndarray[Any, Any]]) -> List[numpy.ndarray[Any, Any]]:
+		self.batch_sizes.append(len(inputs['input']))
+		time.sleep(self.run_delay)
+		return [ inputs['input'] * 2 ]
+
+
+def test_has_dynamic_batch() -> None:
+	assert has_dynamic_batch(DoubleSession('batch')) is True
+	assert has_dynamic_batch(DoubleSession(None)) is True
+	assert has_dynamic_batch(DoubleSession(1)) is False
+
+
+def test_run_in_batches() -> None:
+	dynamic_session = DoubleSession('batch')
+	static_session = DoubleSession(1)
+	batch_inputs = { 'input': numpy.arange(20).reshape(5, 4) }
+
+	assert numpy.array_equal(run_in_batches(dynamic_session, batch_inputs, 2), batch_inputs['input'] * 2)
+	assert dynamic_session.batch_sizes == [ 2, 2, 1 ]
+	assert numpy.array_equal(run_in_batches(static_session, batch_inputs, 2), batch_inputs['input'] * 2)
+	assert static_session.batch_sizes == [ 1, 1, 1, 1, 1 ]
+
+
+def test_collect_and_run(monkeypatch : pytest.MonkeyPatch) -> None:
+	monkeypatch.setattr(fan.globals, 'execution_pool', 'thread')
+	monkeypatch.setattr(fan.globals, 'execution_thread_count', 8)
+	session = DoubleSession('batch', 0.3)
+	rows = [ numpy.full((1, 4), index) for index in range(8) ]
+	with ThreadPoolExecutor(max_workers = 8) as executor:
+		futures = [ executor.submit(collect_and_run, session, { 'input': row }, 4, 1.0) for row in rows ]
+		outputs = [ future.result() for future in futures ]
+
+	for row, output in zip(rows, outputs):
+		assert numpy.array_equal(output, row * 2)
+	assert sum(session.batch_sizes) == 8
+	assert session.batch_sizes[0] == 1
+	assert max(session.batch_sizes) == 4
+
+
+def test_collect_and_run_without_peers(monkeypatch : pytest.MonkeyPatch) -> None:
+	monkeypatch.setattr(fan.globals, 'execution_pool', 'thread')
+	monkeypatch.setattr(fan.globals, 'execution_thread_count', 1)
+	session = DoubleSession('batch')
+	start = time.monotonic()
+
+	assert numpy.array_equal(collect_and_run(session, { 'input': numpy.ones((1, 4)) }, 4, 5.0), numpy.full((1, 4), 2))
+	assert time.monotonic() - start < 1
+	assert session.batch_sizes == [ 1 ]
+
+
+def test_collect_and_run_with_solo_caller(monkeypatch : pytest.MonkeyPatch) -> None:
+	monkeypatch.setattr(fan.globals, 'execution_pool', 'thread')
+	monkeypatch.setattr(fan.globals, 'execution_thread_count', 8)
+	session = DoubleSession('batch')
+	start = time.monotonic()
+
+	assert numpy.array_equal(collect_and_run(session, { 'input': numpy.ones((1, 4)) }, 4, 5.0), numpy.full((1, 4), 2))
+	assert numpy.array_equal(collect_and_run(session, { 'input': numpy.ones((1, 4)) }, 4, 5.0), numpy.full((1, 4), 2))
+	assert time.monotonic() - start < 1
+	assert session.batch_sizes == [ 1, 1 ]
@@ -0,0 +1,38 @@
+from typing import Any
+import cv2
+import numpy
+
+from fan.capturer import get_video_frame, read_video_frames, detect_keyframe_indices, clear_video_captures
+
+
+def read_reference_frames(video_path : str) -> numpy.ndarray[Any, Any]:
+	frames = []
+	video_capture = cv2.VideoCapture(video_path)
+	has_frame, frame = video_capture.read()
+	while has_frame:
+		frames.append(frame)
+		has_frame, frame = video_capture.read()
+	video_capture.release()
+	return numpy.stack(frames)
+
+
+def test_detect_keyframe_indices(video_path : str) -> None:
+	assert detect_keyframe_indices(video_path) == list(range(0, 100, 12))
+
+
+def test_get_video_frame(video_path : str) -> None:
+	reference_frames = read_reference_frames(video_path)
+	clear_video_captures()
+
+	for frame_number in [ 1, 2, 3, 40, 41, 90, 20, 20, 0, 100 ]:
+		assert numpy.array_equal(get_video_frame(video_path, frame_number), reference_frames[max(frame_number - 1, 0)])
+	assert get_video_frame(video_path, 101) is None
+
+
+def test_read_video_frames(video_path : str) -> None:
+	reference_frames = read_reference_frames(video_path)
+	video_frames = list(read_video_frames(video_path, 10, 95, 25))
+
+	assert [ frame_number for frame_number, _ in video_frames ] == [ 10, 35, 60, 85 ]
+	for frame_number, frame in video_frames:
+		assert numpy.abs(frame.astype(numpy.int16) - reference_frames[frame_number]).mean() < 1
@@ -0,0 +1,20 @@
+from typing import Iterator, Tuple
+import pytest
+
+import fan.content_analyser
+from fan.content_analyser import analyse_video
+from fan.typing import Frame
+
+
+def test_analyse_video_without_frames(monkeypatch : pytest.MonkeyPatch) -> None:
+	def read_video_frames(video_path : str, frame_start : int, frame_end : int, frame_step : int) -> Iterator[Tuple[int, Frame]]:
+		return iter([])
+
+	monkeypatch.setattr(fan.content_analyser, 'read_video_frames', read_video_frames)
+	monkeypatch.setattr(fan.content_analyser, 'count_video_frame_total', lambda video_path: 100)
+	monkeypatch.setattr(fan.content_analyser, 'detect_fps', lambda video_path: 25.0)
+	analyse_video.cache_clear()
+
+	assert analyse_video('target.mp4', 0, 100) is True
+	assert analyse_video('target.mp4', 90, 95) is False
+	analyse_video.cache_clear()
@@ -0,0 +1,335 @@
+from typing import Any, Dict, List
+from collections import namedtuple
+from pathlib import Path
+import os
+import cv2
+import numpy
+import pytest
+
+import fan.globals
+import fan.face_analyser
+import fan.face_cache
+from fan.face_store import clear_static_faces, get_static_faces, set_static_faces
+from fan.processors.frame import globals as frame_processors_globals
+from fan.face_cache import get_face_cache
+from fan.face_analyser import get_many_faces, get_reference_index, calc_face_distances, compare_faces, clear_face_analyser, extract_faces, extract_many_faces, has_batched_detections, extract_tracked_faces, extract_adaptive_faces, calc_embedding, calc_embeddings, detect_gender_age, detect_genders_ages, get_adaptive_detector_resolution, set_video_frame, get_video_frame_number
+from fan.typing import Face, Frame, Resolution
+
+SessionInput = namedtuple('SessionInput', [ 'name', 'shape' ])
+
+
+def create_face(normed_embedding : numpy.ndarray[Any, Any]) -> Face:
+	return Face(bbox = None, kps = None, score = 1.0, embedding = normed_embedding, normed_embedding = normed_embedding, gender = None, age = None)
+
+
+def test_calc_face_distances() -> None:
+	embeddings = numpy.random.default_rng(0).normal(size = (4, 512))
+	embeddings /= numpy.linalg.norm(embeddings, axis = 1, keepdims = True)
+	faces = [ create_face(embedding) for embedding in embeddings ]
+	reference_faces = { 'origin': [ faces[0] ], 'other': [ faces[2], faces[3] ] }
+	reference_index = get_reference_index(reference_faces)
+	face_distances = calc_face_distances(faces, reference_index)
+
+	assert reference_index.get('set_indices').tolist() == [ 0, 1, 1 ]
+	assert get_reference_index(reference_faces) is reference_index
+	other_reference_index = get_reference_index({ 'origin': [ faces[1] ] })
+	assert get_reference_index(reference_faces) is reference_index
+	assert get_reference_index({ 'origin': [ faces[1] ] }) is other_reference_index
+	assert face_distances.shape == (4, 3)
+	assert numpy.allclose(numpy.diag(face_distances[[ 0, 2, 3 ]]), 0, atol = 1e-5)
+	assert (face_distances < 0.6).tolist() == [ [ compare_faces(face, reference_face, 0.6) for reference_face in reference_index.get('faces') ] for face in faces ]
+
+
+def create_tracker_frame(seed : int) -> Frame:
+	tracker_frame = numpy.random.default_rng(seed).integers(0, 255, (120, 160, 3), dtype = numpy.uint8)
+	return cv2.GaussianBlur(tracker_frame, (7, 7), 2)
+
+
+def create_tracker_faces(frame : Frame) -> List[Face]:
+	kps = numpy.array([ [ 50, 40 ], [ 80, 40 ], [ 65, 55 ], [ 55, 70 ], [ 75, 70 ] ], dtype = numpy.float64)
+	return [ Face(bbox = numpy.array([ 40, 30, 90, 80 ], dtype = numpy.float64), kps = kps, score = 1.0, embedding = None, normed_embedding = None, gender = None, age = None) ]
+
+
+def test_extract_tracked_faces(monkeypatch : pytest.MonkeyPatch) -> None:
+	extract_frames = []
+
+	def extract_faces(frame : Frame) -> List[Face]:
+		extract_frames.append(frame)
+		return create_tracker_faces(frame)
+
+	monkeypatch.setattr(fan.globals, 'target_path', 'target.mp4')
+	monkeypatch.setattr(fan.globals, 'face_tracker_interval', 3)
+	monkeypatch.setattr(fan.face_analyser, 'extract_faces', extract_faces)
+	clear_face_analyser()
+	frame = create_tracker_frame(0)
+	shift_frame = numpy.roll(frame, (2, 3), axis = (0, 1))
+	faces = extract_tracked_faces(frame, 1)
+	tracked_faces = extract_tracked_faces(shift_frame, 2)
+
+	assert len(extract_frames) == 1
+	assert numpy.allclose(tracked_faces[0].kps, faces[0].kps + [ 3, 2 ], atol = 0.5)
+	assert numpy.allclose(tracked_faces[0].bbox, faces[0].bbox + [ 3, 2, 3, 2 ], atol = 0.5)
+
+	extract_tracked_faces(frame, 3)
+
+	assert len(extract_frames) == 1
+
+	extract_tracked_faces(frame, 4)
+
+	assert len(extract_frames) == 2
+
+	extract_tracked_faces(numpy.zeros_like(frame), 5)
+
+	assert len(extract_frames) == 3
+
+	extract_tracked_faces(frame, 7)
+
+	assert len(extract_frames) == 4
+
+	extract_tracked_faces(frame, 9)
+
+	assert len(extract_frames) == 4
+
+	extract_tracked_faces(frame, 12)
+
+	assert len(extract_frames) == 5
+
+
+def test_extract_tracked_faces_with_pipe_order(monkeypatch : pytest.MonkeyPatch) -> None:
+	extract_frame_numbers = []
+	frame = create_tracker_frame(0)
+
+	def extract_faces(frame : Frame) -> List[Face]:
+		extract_frame_numbers.append(frame_number)
+		return create_tracker_faces(frame)
+
+	monkeypatch.setattr(fan.globals, 'target_path', 'target.mp4')
+	monkeypatch.setattr(fan.globals, 'face_tracker_interval', 8)
+	monkeypatch.setattr(fan.face_analyser, 'extract_faces', extract_faces)
+	clear_face_analyser()
+	for frame_number in [ 1, 2, 3, 5, 6, 7, 8, 4, 9 ]:
+		extract_tracked_faces(frame, frame_number)
+
+	assert extract_frame_numbers == [ 1, 9 ]
+
+
+def test_get_video_frame_number() -> None:
+	frame = create_tracker_frame(0)
+	set_video_frame(frame, 5)
+
+	assert get_video_frame_number(frame) == 5
+	assert get_video_frame_number(frame.copy()) is None
+
+	set_video_frame(None, None)
+
+	assert get_video_frame_number(frame) is None
+
+
+def create_score_face(bbox : List[float], score : float) -> Face:
+	return Face(bbox = numpy.array(bbox, dtype = numpy.float64), kps = numpy.zeros((5, 2)), score = score, embedding = None, normed_embedding = None, gender = None, age = None)
+
+
+def test_extract_adaptive_faces(monkeypatch : pytest.MonkeyPatch) -> None:
+	detector_calls = []
+
+	def extract_faces_by_size(frame : Frame, face_detector_resolution : Resolution, face_detector_score : float) -> List[Face]:
+		detector_calls.append((frame.shape, face_detector_resolution))
+		if frame.shape == (480, 640, 3):
+			return [ create_score_face([ 100, 100, 200, 220 ], 0.9), create_score_face([ 105, 102, 203, 221 ], 0.8), create_score_face([ 400, 300, 440, 340 ], 0.3) ]
+		return [ create_score_face([ 20, 20, 60, 60 ], 0.7) ]
+
+	monkeypatch.setattr(fan.globals, 'face_detector_size', '640x640')
+	monkeypatch.setattr(fan.globals, 'face_detector_score', 0.5)
+	monkeypatch.setattr(fan.face_analyser, 'extract_faces_by_size', extract_faces_by_size)
+	monkeypatch.setattr(fan.face_analyser, 'get_adaptive_detector_resolution', lambda frame: (640, 640))
+	faces = extract_adaptive_faces(numpy.zeros((480, 640, 3), dtype = numpy.uint8))
+	refine_scale = 640 / 120
+
+	assert detector_calls[0][1] == (640, 640)
+	assert detector_calls[1][1] == (640, 640)
+	assert [ face.score for face in faces ] == [ 0.9, 0.7 ]
+	assert numpy.allclose(faces[1].bbox, numpy.array([ 20, 20, 60, 60 ]) / refine_scale + [ 360, 260, 360, 260 ])
+
+
+def test_get_adaptive_detector_resolution(monkeypatch : pytest.MonkeyPatch) -> None:
+	choose_frames = []
+
+	def choose_adaptive_detector_resolution(frame : Frame) -> Resolution:
+		choose_frames.append(frame)
+		return 320, 320
+
+	monkeypatch.setattr(fan.globals, 'target_path', 'target.mp4')
+	monkeypatch.setattr(fan.face_analyser, 'choose_adaptive_detector_resolution', choose_adaptive_detector_resolution)
+	clear_face_analyser()
+	frame = create_tracker_frame(0)
+
+	assert get_adaptive_detector_resolution(frame) == (320, 320)
+	assert get_adaptive_detector_resolution(frame) == (320, 320)
+	assert len(choose_frames) == 2
+
+	for frame_number in [ 1, 2, 3 ]:
+		set_video_frame(frame, frame_number)
+		get_adaptive_detector_resolution(frame)
+
+	assert len(choose_frames) == 3
+
+	scene_frame = numpy.zeros_like(frame)
+	set_video_frame(scene_frame, 4)
+	get_adaptive_detector_resolution(scene_frame)
+
+	assert len(choose_frames) == 4
+
+	set_video_frame(frame, 9)
+	get_adaptive_detector_resolution(frame)
+	set_video_frame(None, None)
+
+	assert len(choose_frames) == 5
+
+
+class RowSession:
+	def __init__(self, input_size : int, output_size : int) -> None:
+		self.input_size = input_size
+		self.output_size = output_size
+		self.batch_sizes : List[int] = []
+
+	def get_inputs(self) -> List[SessionInput]:
+		return [ SessionInput('input', [ 'batch', 3, self.input_size, self.input_size ]) ]
+
+	def run(self, output_names : Any, inputs : Dict[str, numpy.ndarray[Any, Any]]) -> List[numpy.ndarray[Any, Any]]:
+		self.batch_sizes.append(len(inputs['input']))
+		return [ inputs['input'].reshape(len(inputs['input']), -1)[:, ::997][:, :self.output_size] + 0.5 ]
+
+
+def test_calc_embeddings_and_genders_ages(monkeypatch : pytest.MonkeyPatch) -> None:
+	face_recognizer = RowSession(112, 512)
+	gender_age = RowSession(96, 3)
+	monkeypatch.setattr(fan.face_analyser, 'get_face_analyser', lambda: { 'face_recognizer': face_recognizer, 'gender_age': gender_age })
+	frame = create_tracker_frame(0)
+	kps_list = [ create_tracker_faces(frame)[0].kps + offset for offset in [ 0, 5, 10 ] ]
+	embeddings, normed_embeddings = calc_embeddings(frame, kps_list)
+	gender_list, age_list = detect_genders_ages(frame, kps_list)
+
+	assert face_recognizer.batch_sizes == [ 3 ]
+	assert gender_age.batch_sizes == [ 3 ]
+	for index, kps in enumerate(kps_list):
+		embedding, normed_embedding = calc_embedding(frame, kps)
+
+		assert numpy.allclose(embeddings[index], embedding)
+		assert numpy.allclose(normed_embeddings[index], normed_embedding)
+		assert (gender_list[index], age_list[index]) == detect_gender_age(frame, kps)
+	assert not numpy.allclose(embeddings[0], embeddings[1])
+
+
+class DetectorSession:
+	def __init__(self, batch_axis : Any, output_rank : int) -> None:
+		self.batch_axis = batch_axis
+		self.output_rank = output_rank
+		self.batch_sizes : List[int] = []
+
+	def get_inputs(self) -> List[SessionInput]:
+		return [ SessionInput('input', [ self.batch_axis, 3, 320, 320 ]) ]
+
+	def get_outputs(self) -> List[SessionInput]:
+		return [ SessionInput('score', [ self.batch_axis, 'anchors', 1 ][3 - self.output_rank:]) ]
+
+	def run(self, output_names : Any, inputs : Dict[str, numpy.ndarray[Any, Any]]) -> List[numpy.ndarray[Any, Any]]:
+		self.batch_sizes.append(len(inputs['input']))
+		score_list = []
+		bbox_list = []
+		kps_list = []
+		for feature_stride in [ 8, 16, 32 ]:
+			anchor_total = (320 // feature_stride) ** 2 * 2
+			generators = [ numpy.random.default_rng(int(abs(frame.mean()) * 1e6)) for frame in inputs['input'] ]
+			score_list.append(numpy.stack([ generator.random((anchor_total, 1)) ** 6 for generator in generators ]).astype(numpy.float32))
+			bbox_list.append(numpy.stack([ generator.uniform(0, 4, (anchor_total, 4)) for generator in generators ]).astype(numpy.float32))
+			kps_list.append(numpy.stack([ generator.uniform(-3, 3, (anchor_total, 10)) for generator in generators ]).astype(numpy.float32))
+		detections = score_list + bbox_list + kps_list
+		if self.output_rank == 2:
+			return [ detection[0] for detection in detections ]
+		return detections
+
+
+def test_has_batched_detections() -> None:
+	assert has_batched_detections(DetectorSession('batch', 3)) is True
+	assert has_batched_detections(DetectorSession('batch', 2)) is False
+	assert has_batched_detections(DetectorSession(1, 3)) is False
+
+
+def test_extract_many_faces(monkeypatch : pytest.MonkeyPatch) -> None:
+	frames = [ numpy.full((240, 320, 3), value, dtype = numpy.uint8) for value in [ 10, 50, 90 ] ]
+	single_detector = DetectorSession(1, 2)
+	batch_detector = DetectorSession('batch', 3)
+	monkeypatch.setattr(fan.globals, 'face_detector_model', 'retinaface')
+	monkeypatch.setattr(fan.globals, 'face_detector_size', '320x320')
+	monkeypatch.setattr(fan.globals, 'face_detector_score', 0.5)
+	monkeypatch.setattr(fan.globals, 'face_detector_adaptive', False)
+	monkeypatch.setattr(fan.face_analyser, 'get_face_analyser', lambda: { 'face_detector': single_detector })
+	single_faces = [ extract_faces(frame) for frame in frames ]
+	monkeypatch.setattr(fan.face_analyser, 'get_face_analyser', lambda: { 'face_detector': batch_detector })
+	many_faces = extract_many_faces(frames)
+
+	assert single_detector.batch_sizes == [ 1, 1, 1 ]
+	assert batch_detector.batch_sizes == [ 3 ]
+	assert all(faces for faces in many_faces)
+	for faces, other_faces in zip(single_faces, many_faces):
+		assert [ face.score for face in faces ] == [ face.score for face in other_faces ]
+		assert numpy.allclose(numpy.array([ face.bbox for face in faces ]), numpy.array([ face.bbox for face in other_faces ]))
+		assert numpy.allclose(numpy.array([ face.kps for face in faces ]), numpy.array([ face.kps for face in other_faces ]))
+
+
+def test_get_many_faces_with_face_cache(tmp_path : Path, monkeypatch : pytest.MonkeyPatch) -> None:
+	extract_frames : List[Frame] = []
+
+	def extract_faces(frame : Frame) -> List[Face]:
+		extract_frames.append(frame)
+		return create_tracker_faces(frame)
+
+	target_path = os.path.join(tmp_path, 'target.mp4')
+	with open(target_path, 'wb') as target_file:
+		target_file.write(b'target')
+	monkeypatch.setattr(fan.globals, 'target_path', target_path)
+	monkeypatch.setattr(fan.globals, 'face_analyser_cache', True)
+	monkeypatch.setattr(fan.globals, 'face_tracker_interval', 1)
+	monkeypatch.setattr(fan.face_cache, 'FACE_CACHE', None)
+	monkeypatch.setattr(fan.face_cache, 'FACE_CACHE_DIRECTORY_PATH', os.path.join(tmp_path, 'face_cache'))
+	monkeypatch.setattr(fan.face_analyser, 'extract_faces', extract_faces)
+	clear_static_faces()
+	frames = [ create_tracker_frame(seed) for seed in range(4) ]
+
+	set_video_frame(frames[0], 5)
+	get_many_faces(frames[0])
+	set_video_frame(frames[1], 6, False)
+	get_many_faces(frames[1])
+	set_video_frame(None, None)
+	get_many_faces(frames[2])
+
+	assert list(get_face_cache().get('pending')) == [ 5 ]
+
+	set_video_frame(frames[3], 5)
+	faces = get_many_faces(frames[3])
+	set_video_frame(None, None)
+
+	assert len(extract_frames) == 3
+	assert numpy.array_equal(faces[0].bbox, create_tracker_faces(frames[3])[0].bbox)
+	clear_static_faces()
+
+
+def test_get_many_faces_with_completion(monkeypatch : pytest.MonkeyPatch) -> None:
+	def calc_embeddings(frame : Frame, kps_list : List[Any]) -> Any:
+		return [ numpy.ones(512) for _ in kps_list ], [ numpy.ones(512) / numpy.sqrt(512) for _ in kps_list ]
+
+	monkeypatch.setattr(fan.globals, 'face_analyser_cache', False)
+	monkeypatch.setattr(fan.globals, 'face_selector_mode', 'one')
+	monkeypatch.setattr(frame_processors_globals, 'face_swapper_mapping', [ (0, 0) ])
+	monkeypatch.setattr(fan.face_analyser, 'calc_embeddings', calc_embeddings)
+	clear_static_faces()
+	frame = create_tracker_frame(0)
+	static_faces = create_tracker_faces(frame)
+	set_static_faces(frame, static_faces)
+	faces = get_many_faces(frame)
+
+	assert faces[0].normed_embedding is not None
+	assert static_faces[0].normed_embedding is None
+	assert get_static_faces(frame)[0].normed_embedding is not None
+	assert get_many_faces(frame)[0] is get_static_faces(frame)[0]
+	clear_static_faces()
@@ -0,0 +1,87 @@
+import os
+from pathlib import Path
+import numpy
+import pytest
+
+import fan.globals
+import fan.face_cache
+from fan.face_cache import get_cached_faces, set_cached_faces, clear_face_cache, flush_face_cache, get_face_cache, get_face_cache_directory_path, write_face_cache_shard
+from fan.typing import Face
+
+
+@pytest.fixture(scope = 'function', autouse = True)
+def before_each(tmp_path : Path, monkeypatch : pytest.MonkeyPatch) -> None:
+	target_path = os.path.join(tmp_path, 'target.mp4')
+	with open(target_path, 'wb') as target_file:
+		target_file.write(b'target')
+	monkeypatch.setattr(fan.globals, 'target_path', target_path)
+	monkeypatch.setattr(fan.globals, 'face_analyser_cache', True)
+	monkeypatch.setattr(fan.globals, 'video_pipeline', 'pipe')
+	monkeypatch.setattr(fan.face_cache, 'FACE_CACHE', None)
+	monkeypatch.setattr(fan.face_cache, 'FACE_CACHE_DIRECTORY_PATH', os.path.join(tmp_path, 'face_cache'))
+
+
+def create_face(seed : int) -> Face:
+	embedding = numpy.random.default_rng(seed).random(512).astype(numpy.float32)
+	return Face(bbox = numpy.array([ 1.5, 2, 30, seed ]), kps = numpy.arange(10, dtype = numpy.float64).reshape(5, 2), score = 0.9, embedding = embedding, normed_embedding = embedding / numpy.linalg.norm(embedding), gender = None, age = None)
+
+
+def test_set_cached_faces() -> None:
+	face = create_face(1)
+
+	assert get_cached_faces(1) is None
+
+	set_cached_faces(1, [ face ])
+	flush_face_cache()
+	clear_face_cache()
+	cached_faces = get_cached_faces(1)
+
+	assert len(cached_faces) == 1
+	assert numpy.array_equal(cached_faces[0].bbox, face.bbox)
+	assert numpy.array_equal(cached_faces[0].kps, face.kps)
+	assert numpy.array_equal(cached_faces[0].embedding, face.embedding)
+	assert cached_faces[0].gender is None
+
+
+def test_merge_face_cache(monkeypatch : pytest.MonkeyPatch) -> None:
+	monkeypatch.setattr(fan.face_cache, 'FACE_CACHE_SHARD_LIMIT', 2)
+	for seed in range(2):
+		set_cached_faces(seed, [ create_face(seed) ])
+		flush_face_cache()
+	face_cache_directory_path = get_face_cache_directory_path(get_face_cache().get('key'))
+	write_face_cache_shard(os.path.join(face_cache_directory_path, '0-writer'), { 9: [ create_face(9) ] })
+	set_cached_faces(2, [ create_face(2) ])
+	flush_face_cache()
+
+	assert len(get_face_cache().get('shards')) == 2
+	assert os.path.isfile(os.path.join(face_cache_directory_path, '0-writer.frames.npy'))
+	assert os.path.isfile(os.path.join(face_cache_directory_path, '0-writer.faces.npy'))
+
+	clear_face_cache()
+
+	assert len(get_face_cache().get('shards')) == 2
+	assert 9 in get_face_cache().get('frames')
+	for seed in range(3):
+		assert get_cached_faces(seed)[0].bbox[3] == seed
+
+
+def test_invalidate_face_cache(monkeypatch : pytest.MonkeyPatch) -> None:
+	set_cached_faces(1, [ create_face(0) ])
+	flush_face_cache()
+
+	monkeypatch.setattr(fan.globals, 'video_pipeline', 'disk')
+
+	assert get_cached_faces(1) is None
+
+	monkeypatch.setattr(fan.globals, 'video_pipeline', 'pipe')
+
+	assert get_cached_faces(1) is not None
+
+	monkeypatch.setattr(fan.globals, 'trim_frame_start', 10)
+
+	assert get_cached_faces(1) is None
+
+	monkeypatch.setattr(fan.globals, 'trim_frame_start', None)
+	os.utime(fan.globals.target_path, ns = (0, 0))
+
+	assert get_cached_faces(1) is None
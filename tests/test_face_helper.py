@@ -0,0 +1,41 @@
+import cv2
+import numpy
+
+from fan.face_helper import TEMPLATES, warp_face, paste_back, estimate_matrix_by_kps, apply_nms
+
+
+def test_paste_back() -> None:
+	temp_frame = cv2.GaussianBlur(numpy.random.default_rng(0).integers(0, 255, (480, 640, 3), dtype = numpy.uint8), (0, 0), 4)
+	kps = numpy.array([ [ 300, 200 ], [ 360, 202 ], [ 330, 240 ], [ 305, 270 ], [ 355, 272 ] ], dtype = numpy.float64)
+	crop_frame, affine_matrix = warp_face(temp_frame, kps, 'arcface_128_v2', (128, 128))
+	crop_frame = 255 - crop_frame
+	crop_mask = numpy.random.default_rng(1).random((128, 128))
+	inverse_matrix = cv2.invertAffineTransform(affine_matrix)
+	inverse_crop_mask = cv2.warpAffine(crop_mask, inverse_matrix, (640, 480)).clip(0, 1)[:, :, numpy.newaxis]
+	inverse_crop_frame = cv2.warpAffine(crop_frame, inverse_matrix, (640, 480), borderMode = cv2.BORDER_REPLICATE)
+	expect_frame = inverse_crop_mask * inverse_crop_frame + (1 - inverse_crop_mask) * temp_frame
+	paste_frame = paste_back(temp_frame, crop_frame, crop_mask, affine_matrix)
+
+	assert numpy.abs(paste_frame - expect_frame).max() <= 2
+	assert numpy.array_equal(paste_frame[:100], temp_frame[:100])
+	assert not numpy.array_equal(paste_frame, temp_frame)
+
+
+def test_estimate_matrix_by_kps() -> None:
+	kps = numpy.array([ [ 300, 200 ], [ 360, 202 ], [ 330, 240 ], [ 305, 270 ], [ 355, 272 ] ], dtype = numpy.float64)
+	normed_template = TEMPLATES.get('arcface_128_v2') * 512 / 128
+	expect_matrix = cv2.estimateAffinePartial2D(kps, normed_template, method = cv2.LMEDS)[0]
+	affine_matrix = estimate_matrix_by_kps(kps, 'arcface_128_v2', (128, 512))
+
+	assert numpy.allclose(affine_matrix, expect_matrix, atol = 1e-3)
+	assert estimate_matrix_by_kps(kps.copy(), 'arcface_128_v2', (128, 512)) is affine_matrix
+	assert affine_matrix.flags.writeable is False
+
+
+def test_apply_nms() -> None:
+	bboxes = numpy.array([ [ 0, 0, 100, 100 ], [ 5, 5, 100, 100 ], [ 200, 200, 300, 300 ] ], dtype = numpy.float64)
+	scores = numpy.array([ 0.8, 0.9, 0.7 ])
+
+	assert apply_nms(bboxes, scores, 0.4).tolist() == [ 1, 2 ]
+	assert apply_nms(numpy.concatenate([ bboxes, bboxes ]), numpy.concatenate([ scores, scores ]), 0.4, numpy.array([ 0, 0, 0, 1, 1, 1 ])).tolist() == [ 1, 4, 2, 5 ]
+	assert apply_nms(numpy.zeros((0, 4)), numpy.zeros(0), 0.4).tolist() == []
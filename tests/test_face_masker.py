@@ -0,0 +1,37 @@
+from typing import List
+import cv2
+import numpy
+
+from fan.face_masker import get_cached_masks, warp_mask, open_mask_cache, close_mask_cache
+from fan.typing import Frame, Mask
+
+
+def create_frame_mask() -> Mask:
+	frame_mask = numpy.zeros((256, 256), dtype = numpy.float32)
+	cv2.circle(frame_mask, (128, 128), 60, 1.0, -1)
+	return cv2.GaussianBlur(frame_mask, (0, 0), 8)
+
+
+def test_get_cached_masks() -> None:
+	frame_mask = create_frame_mask()
+	kps = numpy.array([ [ 100, 110 ], [ 156, 110 ], [ 128, 140 ], [ 108, 165 ], [ 148, 165 ] ], dtype = numpy.float64)
+	source_matrix = numpy.array([ [ 0.5, 0, 0 ], [ 0, 0.5, 0 ] ], dtype = numpy.float64)
+	target_matrix = numpy.array([ [ 0.9, 0.1, -50 ], [ -0.1, 0.9, -40 ] ], dtype = numpy.float64)
+	create_calls : List[int] = []
+
+	def create_masks(crop_frames : List[Frame]) -> List[Mask]:
+		create_calls.append(len(crop_frames))
+		return [ cv2.warpAffine(frame_mask, source_matrix, (128, 128)) for _ in crop_frames ]
+
+	open_mask_cache()
+	try:
+		source_mask = get_cached_masks('test', [ numpy.zeros((128, 128, 3), dtype = numpy.uint8) ], [ kps ], [ source_matrix ], create_masks)[0]
+		target_mask = get_cached_masks('test', [ numpy.zeros((160, 160, 3), dtype = numpy.uint8) ], [ kps ], [ target_matrix ], create_masks)[0]
+	finally:
+		close_mask_cache()
+	fresh_mask = cv2.warpAffine(frame_mask, target_matrix, (160, 160))
+
+	assert create_calls == [ 1 ]
+	assert warp_mask(source_mask, source_matrix, source_matrix, (128, 128)) is source_mask
+	assert target_mask.shape == (160, 160)
+	assert numpy.abs(target_mask - fresh_mask).mean() < 0.01
@@ -0,0 +1,57 @@
+import numpy
+import pytest
+
+import fan.face_store
+from fan.face_store import get_static_faces, set_static_faces, clear_static_faces, create_frame_hash, get_face_store_statistics
+from fan.typing import Face
+
+
+@pytest.fixture(scope = 'function', autouse = True)
+def before_each() -> None:
+	clear_static_faces()
+
+
+def create_face() -> Face:
+	return Face(
+		bbox = numpy.zeros(4),
+		kps = numpy.zeros((5, 2)),
+		score = 1.0,
+		embedding = None,
+		normed_embedding = None,
+		gender = None,
+		age = None
+	)
+
+
+def test_create_frame_hash() -> None:
+	frame = numpy.full((64, 64, 3), 10, dtype = numpy.uint8)
+
+	assert create_frame_hash(frame) == create_frame_hash(frame.copy())
+	assert create_frame_hash(frame) != create_frame_hash(frame + 1)
+	assert create_frame_hash(frame) != create_frame_hash(numpy.full((32, 128, 3), 10, dtype = numpy.uint8))
+	assert create_frame_hash(numpy.zeros((64, 64, 3), dtype = numpy.uint8)) is None
+
+
+def test_set_static_faces_with_eviction(monkeypatch : pytest.MonkeyPatch) -> None:
+	frames = [ numpy.full((64, 64, 3), index + 1, dtype = numpy.uint8) for index in range(4) ]
+	evictions = get_face_store_statistics().get('evictions')
+	monkeypatch.setattr(fan.face_store, 'STATIC_FACES_MEMORY_LIMIT', 3 * fan.face_store.estimate_faces_memory([ create_face() ]))
+	for frame in frames:
+		set_static_faces(frame, [ create_face() ])
+
+	assert get_static_faces(frames[0]) is None
+	assert get_static_faces(frames[1]) is not None
+	assert get_static_faces(frames[3]) is not None
+	assert get_face_store_statistics().get('evictions') == evictions + 1
+
+
+def test_set_static_faces_with_lru_order(monkeypatch : pytest.MonkeyPatch) -> None:
+	frames = [ numpy.full((64, 64, 3), index + 1, dtype = numpy.uint8) for index in range(3) ]
+	monkeypatch.setattr(fan.face_store, 'STATIC_FACES_MEMORY_LIMIT', 2 * fan.face_store.estimate_faces_memory([ create_face() ]))
+	set_static_faces(frames[0], [ create_face() ])
+	set_static_faces(frames[1], [ create_face() ])
+	get_static_faces(frames[0])
+	set_static_faces(frames[2], [ create_face() ])
+
+	assert get_static_faces(frames[0]) is not None
+	assert get_static_faces(frames[1]) is None
@@ -0,0 +1,77 @@
+from typing import Any, List
+import numpy
+import pytest
+
+import fan.globals
+import fan.processors.frame.modules.face_swapper
+from fan.face_analyser import clear_face_analyser
+from fan.processors.frame.modules.face_swapper import create_mapping_table, parse_face_swapper_mapping, swap_mapped_faces
+from fan.typing import Face, Frame
+
+
+def create_face(index : int, normed_embedding : Any = None) -> Face:
+	return Face(bbox = numpy.array([ index, index, index + 10, index + 10 ]), kps = numpy.zeros((5, 2)), score = 1.0, embedding = normed_embedding, normed_embedding = normed_embedding, gender = None, age = None)
+
+
+def test_parse_face_swapper_mapping() -> None:
+	assert parse_face_swapper_mapping('0:1') == (0, 1)
+	assert parse_face_swapper_mapping('2:0') == (2, 0)
+	with pytest.raises(ValueError):
+		parse_face_swapper_mapping('0')
+	with pytest.raises(ValueError):
+		parse_face_swapper_mapping('a:b')
+
+
+def test_create_mapping_table(monkeypatch : pytest.MonkeyPatch) -> None:
+	reference_faces = [ create_face(0), create_face(1) ]
+
+	def prepare_source_input(source_path : str, source_face : Face) -> Any:
+		return numpy.full((1, 4), int(source_path.split('.')[0]))
+
+	def get_many_faces(frame : Frame) -> List[Face]:
+		return reference_faces
+
+	monkeypatch.setattr(fan.processors.frame.modules.face_swapper, 'read_mapping_frame', lambda: numpy.zeros((64, 64, 3), dtype = numpy.uint8))
+	monkeypatch.setattr(fan.processors.frame.modules.face_swapper, 'read_static_image', lambda image_path: None)
+	monkeypatch.setattr(fan.processors.frame.modules.face_swapper, 'get_many_faces', get_many_faces)
+	monkeypatch.setattr(fan.processors.frame.modules.face_swapper, 'get_average_face', lambda frames: create_face(2))
+	monkeypatch.setattr(fan.processors.frame.modules.face_swapper, 'prepare_source_input', prepare_source_input)
+	mapping_table = create_mapping_table([ '0.jpg', '1.jpg' ], [ (1, 0), (0, 1), (0, 2), (1, -1) ])
+
+	assert list(mapping_table.get('reference_faces')) == [ '0', '1' ]
+	assert mapping_table.get('reference_faces').get('0')[0] is reference_faces[0]
+	assert mapping_table.get('reference_faces').get('1')[0] is reference_faces[1]
+	assert mapping_table.get('source_inputs')[:, 0].tolist() == [ 1, 0 ]
+
+
+def test_swap_mapped_faces(monkeypatch : pytest.MonkeyPatch) -> None:
+	normed_embeddings = numpy.eye(2, 512)
+	target_faces = [ create_face(0, normed_embeddings[1]), create_face(1, normed_embeddings[0]) ]
+	swaps : List[Any] = []
+
+	def apply_swaps(source_inputs : List[Any], faces : List[Face], temp_frame : Frame) -> Frame:
+		swaps.extend(zip(source_inputs, faces))
+		return temp_frame
+
+	def get_many_faces(frame : Frame) -> List[Face]:
+		return target_faces
+
+	mapping_table =\
+	{
+		'reference_faces':
+		{
+			'0': [ create_face(2) ],
+			'1': [ create_face(3, normed_embeddings[1]) ]
+		},
+		'source_inputs': numpy.array([ [ 0 ], [ 1 ] ])
+	}
+	monkeypatch.setattr(fan.globals, 'reference_face_distance', 0.6)
+	monkeypatch.setattr(fan.processors.frame.modules.face_swapper, 'get_mapping_table', lambda: mapping_table)
+	monkeypatch.setattr(fan.processors.frame.modules.face_swapper, 'get_many_faces', get_many_faces)
+	monkeypatch.setattr(fan.processors.frame.modules.face_swapper, 'apply_swaps', apply_swaps)
+	clear_face_analyser()
+	swap_mapped_faces(numpy.zeros((64, 64, 3), dtype = numpy.uint8))
+
+	assert len(swaps) == 1
+	assert swaps[0][0].tolist() == [ [ 1 ] ]
+	assert swaps[0][1] is target_faces[0]
@@ -0,0 +1,13 @@
+import numpy
+
+from fan.processors.frame.modules.frame_enhancer import create_tile_frames, merge_tile_frames
+
+
+def test_merge_tile_frames() -> None:
+	temp_frame = numpy.random.default_rng(0).integers(0, 255, (150, 250, 3), dtype = numpy.uint8)
+	tile_frames = create_tile_frames(temp_frame, 128, 16)
+	tile_frames = tile_frames.repeat(2, axis = 1).repeat(2, axis = 2)
+	merge_frame = merge_tile_frames(tile_frames, temp_frame.shape[:2], 256, 32, 2)
+
+	assert create_tile_frames(temp_frame, 128, 16).shape == (6, 128, 128, 3)
+	assert numpy.array_equal(merge_frame, temp_frame.repeat(2, axis = 0).repeat(2, axis = 1))
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+import numpy
+
+from fan.frame_ring import create_frame_ring, attach_frame_ring, acquire_frame_slot, release_frame_slot, close_frame_ring
+
+
+def test_acquire_and_release_frame_slot() -> None:
+	frame_ring = create_frame_ring((4, 2), 2)
+
+	assert acquire_frame_slot(frame_ring) == 0
+	assert acquire_frame_slot(frame_ring) == 1
+	with ThreadPoolExecutor(max_workers = 1) as executor:
+		acquire_future = executor.submit(acquire_frame_slot, frame_ring)
+		time.sleep(0.3)
+		assert acquire_future.done() is False
+		release_frame_slot(frame_ring, 1)
+		assert acquire_future.result(timeout = 1) == 1
+	close_frame_ring(frame_ring, True)
+
+
+def test_close_frame_ring_unblocks_acquire() -> None:
+	frame_ring = create_frame_ring((4, 2), 1)
+
+	assert acquire_frame_slot(frame_ring) == 0
+	with ThreadPoolExecutor(max_workers = 1) as executor:
+		acquire_future = executor.submit(acquire_frame_slot, frame_ring)
+		time.sleep(0.3)
+		frame_ring.get('closed').set()
+		assert acquire_future.result(timeout = 1) is None
+	close_frame_ring(frame_ring, True)
+
+
+def test_attach_frame_ring() -> None:
+	frame_ring = create_frame_ring((4, 2), 3)
+	attached_frame_ring = attach_frame_ring(frame_ring.get('shared_memory').name, (4, 2), 3)
+
+	frame_ring.get('frames')[1] = 255
+	assert numpy.all(attached_frame_ring.get('frames')[1] == 255)
+	attached_frame_ring.get('frames')[2] = 128
+	assert numpy.all(frame_ring.get('frames')[2] == 128)
+	assert numpy.all(frame_ring.get('frames')[0] == 0)
+	close_frame_ring(attached_frame_ring, False)
+	close_frame_ring(frame_ring, True)
@@ -0,0 +1,45 @@
+from typing import Iterator
+from pathlib import Path
+import os
+import numpy
+import onnx
+import pytest
+from onnx import helper, TensorProto
+
+import fan.globals
+import fan.inference_manager
+from fan.inference_manager import get_inference_session, run_inference_session, clear_inference_sessions, get_inference_session_statistics, get_optimized_model_path
+
+
+@pytest.fixture(scope = 'function', autouse = True)
+def before_each(tmp_path : Path, monkeypatch : pytest.MonkeyPatch) -> Iterator[None]:
+	monkeypatch.setattr(fan.globals, 'execution_providers', [ 'CPUExecutionProvider' ])
+	monkeypatch.setattr(fan.globals, 'execution_thread_count', 4)
+	monkeypatch.setattr(fan.inference_manager, 'OPTIMIZED_MODEL_DIRECTORY_PATH', str(tmp_path / 'optimized'))
+	clear_inference_sessions()
+	yield
+	clear_inference_sessions()
+
+
+@pytest.fixture(scope = 'module')
+def model_path(tmp_path_factory : pytest.TempPathFactory) -> str:
+	model_path = str(tmp_path_factory.mktemp('models') / 'relu.onnx')
+	graph = helper.make_graph(
+		[ helper.make_node('Relu', [ 'input' ], [ 'output' ]) ],
+		'relu',
+		[ helper.make_tensor_value_info('input', TensorProto.FLOAT, [ 'batch', 4 ]) ],
+		[ helper.make_tensor_value_info('output', TensorProto.FLOAT, [ 'batch', 4 ]) ]
+	)
+	onnx.save(helper.make_model(graph, opset_imports = [ helper.make_opsetid('', 13) ], ir_version = 8), model_path)
+	return model_path
+
+
+def test_get_inference_session(model_path : str) -> None:
+	inference_session = get_inference_session(model_path)
+	input_frame = numpy.array([ [ -1, 0, 1, 2 ] ], dtype = numpy.float32)
+
+	assert numpy.array_equal(run_inference_session(inference_session, { 'input': input_frame })[0], numpy.maximum(input_frame, 0))
+	assert get_inference_session(model_path) is inference_session
+	assert get_inference_session_statistics()[0].get('reuse_total') == 1
+	assert get_inference_session_statistics()[0].get('concurrency') == 4
+	assert os.path.isfile(get_optimized_model_path(model_path))
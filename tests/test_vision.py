@@ -0,0 +1,38 @@
+import subprocess
+
+from fan.vision import detect_video_metadata, detect_fps, count_video_frame_total, detect_video_resolution, parse_frame_rate
+from fan.filesystem import is_video
+
+
+def test_detect_video_metadata(video_path : str) -> None:
+	video_metadata = detect_video_metadata(video_path)
+
+	assert video_metadata.get('fps') == 25.0
+	assert video_metadata.get('frame_total') == 100
+	assert video_metadata.get('resolution') == (160, 120)
+	assert video_metadata.get('codec') in [ 'h264', 'avc1' ]
+	assert video_metadata.get('rotation') == 0
+	assert video_metadata.get('audio_streams') in [ [], None ]
+	assert detect_video_metadata(video_path) is video_metadata
+	assert detect_fps(video_path) == 25.0
+	assert count_video_frame_total(video_path) == 100
+	assert detect_video_resolution(video_path) == (160, 120)
+	assert is_video(video_path) is True
+	assert is_video(__file__) is False
+	assert detect_video_metadata('invalid') is None
+
+
+def test_detect_rotated_video_metadata(video_path : str) -> None:
+	rotated_video_path = video_path.replace('target.mp4', 'target-rotated.mp4')
+	subprocess.run([ 'ffmpeg', '-hide_banner', '-loglevel', 'error', '-display_rotation', '90', '-i', video_path, '-c', 'copy', '-y', rotated_video_path ], check = True)
+	video_metadata = detect_video_metadata(rotated_video_path)
+
+	assert video_metadata.get('rotation') == 270
+	assert video_metadata.get('resolution') == (120, 160)
+
+
+def test_parse_frame_rate() -> None:
+	assert parse_frame_rate('25/1') == 25.0
+	assert parse_frame_rate('30000/1001') == 30000 / 1001
+	assert parse_frame_rate('0/0') == 0.0
+	assert parse_frame_rate(None) == 0.0